@@ -0,0 +1,116 @@
+import argparse
+import time
+import numpy as np
+
+from src.account_activity_check import AccountActivityCheck, get_activity_features_batch
+
+
+"""Times re-featurizing stored profiles with the activity features, one user at a time and as one batch
+
+Every run first checks that both paths give exactly the values of the pure Python loops the features were
+first written with (reference_features below).
+
+Run from the repository root:
+    python -m benchmarks.activity_benchmark --profiles 200000
+"""
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+def reference_features(comment_karma, link_karma, activity, oldest_timestamp, account_timestamp, now) -> dict:
+    """The original list based AccountActivityCheck, kept to check the vectorized versions against"""
+    total_karma = link_karma + comment_karma
+    karma_ratio = 0.0 if total_karma == 0 else link_karma / total_karma
+
+    active_karma_rate = 0.0
+    if activity:
+        start_of_window = now - 30 * SECONDS_PER_DAY
+        total_recent_karma = 0.0
+        oldest_recent_timestamp = None
+        for timestamp, karma in activity:
+            if timestamp < start_of_window:
+                break
+            total_recent_karma += karma
+            oldest_recent_timestamp = timestamp
+        if oldest_recent_timestamp is not None:
+            active_karma_rate = total_recent_karma / max((now - oldest_recent_timestamp) / SECONDS_PER_DAY, 1)
+
+    timestamps = [item[0] for item in activity]
+    gaps = [t1 - t2 for t1, t2 in zip(timestamps, timestamps[1:])]
+    biggest_timestamp = max(gaps) if len(timestamps) >= 2 else 0
+    burst_activity_ratio = sum(1 for gap in gaps if gap <= 65) / (len(activity) - 1) if len(activity) >= 2 else 0.0
+
+    first_activity_delay = 0
+    if oldest_timestamp != -1 and oldest_timestamp - account_timestamp >= 0:
+        first_activity_delay = (oldest_timestamp - account_timestamp) / SECONDS_PER_DAY
+
+    return {
+        "karma_ratio": karma_ratio,
+        "active_karma_rate": active_karma_rate,
+        "age_days": (now - account_timestamp) / SECONDS_PER_DAY,
+        "biggest_timestamp": biggest_timestamp,
+        "burst_activity_ratio": burst_activity_ratio,
+        "first_activity_delay": first_activity_delay
+    }
+
+
+def synthetic_profiles(profile_count: int, max_items: int, now: float, seed: int = 0):
+    """Returns flat activity arrays with offsets plus per user karma and timestamps, in the layout the batch API takes"""
+    rng = np.random.default_rng(seed)
+    counts = rng.integers(0, max_items + 1, profile_count)
+    offsets = np.concatenate(([0], np.cumsum(counts)))
+    #gaps between activities, mostly minutes to days with some bursts under a minute
+    gaps = np.where(rng.random(offsets[-1]) < 0.1, rng.uniform(1, 60, offsets[-1]), rng.exponential(2 * SECONDS_PER_DAY, offsets[-1]))
+    timestamps = np.empty(offsets[-1])
+    for user in range(profile_count):
+        start, end = offsets[user], offsets[user + 1]
+        timestamps[start:end] = now - rng.uniform(0, 5 * SECONDS_PER_DAY) - np.cumsum(gaps[start:end])
+    karma = rng.integers(-10, 2000, offsets[-1]).astype(np.float64)
+    account_timestamps = now - rng.uniform(1, 4000, profile_count) * SECONDS_PER_DAY
+    oldest_timestamps = np.where(rng.random(profile_count) < 0.1, -1, account_timestamps + rng.uniform(-10, 400, profile_count) * SECONDS_PER_DAY)
+    comment_karma = rng.integers(0, 100000, profile_count)
+    link_karma = rng.integers(0, 100000, profile_count)
+    return timestamps, karma, offsets, comment_karma, link_karma, oldest_timestamps, account_timestamps
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the activity features over many stored profiles")
+    parser.add_argument("--profiles", type=int, default=200000, help="stored profiles to re-featurize")
+    parser.add_argument("--max-items", type=int, default=900, help="most activities per profile")
+    parser.add_argument("--reference-sample", type=int, default=2000, help="profiles timed and checked with the pure Python loops")
+    args = parser.parse_args()
+
+    now = time.time()
+    timestamps, karma, offsets, comment_karma, link_karma, oldest, created = synthetic_profiles(args.profiles, args.max_items, now)
+    activity = [list(zip(timestamps[offsets[user]:offsets[user + 1]].tolist(), karma[offsets[user]:offsets[user + 1]].tolist()))
+                for user in range(min(args.reference_sample, args.profiles))]
+    sample = len(activity)
+
+    started = time.perf_counter()
+    expected = [reference_features(int(comment_karma[user]), int(link_karma[user]), activity[user], float(oldest[user]), float(created[user]), now)
+                for user in range(sample)]
+    reference_seconds = (time.perf_counter() - started) / sample
+
+    started = time.perf_counter()
+    per_user = [AccountActivityCheck(int(comment_karma[user]), int(link_karma[user]), activity[user], float(oldest[user]), float(created[user]), now=now).get_features()
+                for user in range(sample)]
+    per_user_seconds = (time.perf_counter() - started) / sample
+
+    started = time.perf_counter()
+    batch = get_activity_features_batch(timestamps, karma, offsets, comment_karma, link_karma, oldest, created, now=now)
+    batch_seconds = time.perf_counter() - started
+
+    for user in range(sample):
+        for name, value in expected[user].items():
+            assert per_user[user][name] == value, f"{name} differs for user {user}: {per_user[user][name]} != {value}"
+            assert batch[name][user] == value, f"batch {name} differs for user {user}: {batch[name][user]} != {value}"
+
+    print(f"Profiles: {args.profiles}, activities: {offsets[-1]}")
+    print(f"Checked {sample} profiles: per user and batch values match the pure Python loops exactly")
+    print(f"Pure Python loops: {reference_seconds * args.profiles:.2f} s ({reference_seconds * 1e6:.1f} us per profile, extrapolated)")
+    print(f"AccountActivityCheck per user: {per_user_seconds * args.profiles:.2f} s ({per_user_seconds * 1e6:.1f} us per profile, extrapolated)")
+    print(f"get_activity_features_batch: {batch_seconds:.2f} s ({batch_seconds / args.profiles * 1e6:.2f} us per profile)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+"""A local HTTP server answering Arctic Shift searches for generated accounts, so ArcticShiftClient can be run offline
+
+It serves GET /api/{comments,submissions}/search?author=...&sort=asc&limit=1 like Arctic Shift does, with the first
+comment or submission of the author, after latency seconds. Every response has X-Ratelimit-Remaining and
+X-Ratelimit-Reset headers for a budget of rate_limit requests per window seconds, and requests over it get a 429
+with Retry-After, so the client's RateLimiter and retries run as they would against the real API.
+
+Point a client at it with ArcticShiftClient(url=stub.url).
+"""
+
+KINDS = {"comments": "t1", "submissions": "t3"}
+
+
+class ArcticShiftStubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" #keep-alive, like the pooled session the client sends through
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        stub = self.server.stub
+        url = urlparse(self.path)
+        parts = url.path.strip("/").split("/")
+        if len(parts) != 3 or parts[0] != "api" or parts[1] not in KINDS or parts[2] != "search":
+            self.__send__(404, {"error": f"no route for {url.path}"}, {})
+            return
+        allowed, headers = stub.take()
+        time.sleep(stub.latency)
+        if not allowed:
+            self.__send__(429, {"error": "Too many requests"}, headers)
+            return
+        author = (parse_qs(url.query).get("author") or [""])[0]
+        oldest = stub.oldest_utc(author, KINDS[parts[1]])
+        self.__send__(200, {"data": [] if oldest is None else [{"author": author, "created_utc": int(oldest)}]}, headers)
+
+    def __send__(self, status: int, payload: dict, headers: dict):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for header, value in headers.items():
+            self.send_header(header, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class ArcticShiftStub:
+    """This class runs the stub server in a background thread
+
+        Attributes:
+            accounts (dict): The SyntheticAccount of each lowercase name, other authors have no activity
+            latency (float): Seconds every search takes
+            rate_limit (int): Searches allowed per window
+            window (float): Seconds a rate limit window lasts
+            stats (dict): Counts of requests and throttled (429) requests
+    """
+    def __init__(self, accounts: list = None, latency: float = 0.0, rate_limit: int = 1000, window: float = 60):
+        self.accounts = {account.name.lower(): account for account in accounts or []}
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.window = window
+        self.stats = {"requests": 0, "throttled": 0}
+        self.lock = threading.Lock()
+        self.window_start = time.monotonic()
+        self.used = 0
+        self.server = None
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        """The search URL for ArcticShiftClient(url=...), with {} where the kind goes"""
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/api/{{}}/search"
+
+    def oldest_utc(self, author: str, kind: str):
+        account = self.accounts.get(author.lower())
+        return account.oldest_utc(kind) if account is not None else None
+
+    def take(self) -> (bool, dict):
+        """Spends one request of the budget, returns if it was allowed and the rate limit headers to answer with"""
+        with self.lock:
+            now = time.monotonic()
+            if now - self.window_start >= self.window:
+                self.window_start, self.used = now, 0
+            self.stats["requests"] += 1
+            reset = max(self.window_start + self.window - now, 0)
+            if self.used >= self.rate_limit:
+                self.stats["throttled"] += 1
+                return False, {"Retry-After": f"{reset:.0f}", "X-Ratelimit-Remaining": "0", "X-Ratelimit-Reset": f"{reset:.0f}"}
+            self.used += 1
+            return True, {"X-Ratelimit-Remaining": str(self.rate_limit - self.used), "X-Ratelimit-Reset": f"{reset:.0f}"}
+
+    def start(self) -> "ArcticShiftStub":
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), ArcticShiftStubHandler)
+        self.server.daemon_threads = True
+        self.server.stub = self
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.thread.join()
+            self.server.server_close()
+            self.server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exception_type, exception, traceback):
+        self.stop()
+        return False
@@ -0,0 +1,66 @@
+import argparse
+import random
+import time
+
+from src.copy_index import CopyIndex
+
+
+"""Times filling a CopyIndex and looking comments up in it, and checks how many edited copies it finds
+
+Comments are made of words drawn with Zipf-like frequencies. Every copy query is an indexed comment with one
+character changed and punctuation added, every unrelated query a new comment.
+
+Run from the repository root:
+    python -m benchmarks.copy_index_benchmark --comments 100000
+"""
+
+
+def synthetic_comments(rng: random.Random, count: int) -> list[str]:
+    words = ["".join(rng.choices("abcdefghijklmnopqrstuvwxyz", k=rng.randint(2, 9))) for _ in range(5000)]
+    weights = [1 / (rank + 1) for rank in range(len(words))]
+    return [" ".join(rng.choices(words, weights=weights, k=rng.randint(5, 30))) for _ in range(count)]
+
+
+def edited_copy(rng: random.Random, comment: str) -> str:
+    characters = list(comment)
+    characters[rng.randrange(len(characters))] = "x"
+    return "".join(characters) + "!"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the CopyIndex")
+    parser.add_argument("--comments", type=int, default=20000, help="comments added to the index, 50 per author")
+    parser.add_argument("--queries", type=int, default=1000, help="copied and unrelated comments looked up, each")
+    parser.add_argument("--path", default=":memory:", help="SQLite file of the index")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    comments = synthetic_comments(rng, args.comments + args.queries)
+    indexed, unrelated = comments[:args.comments], comments[args.comments:]
+    copies = [edited_copy(rng, rng.choice(indexed)) for _ in range(args.queries)]
+
+    index = CopyIndex(args.path)
+    started = time.perf_counter()
+    for start in range(0, len(indexed), 50):
+        index.add_comments(f"author{start // 50}", indexed[start:start + 50])
+    add_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    found = sum(1 for comment in copies if index.find_copies(comment, exclude_author="checked_user"))
+    false_positives = sum(1 for comment in unrelated if index.find_copies(comment, exclude_author="checked_user"))
+    query_seconds = (time.perf_counter() - started) / (len(copies) + len(unrelated))
+
+    started = time.perf_counter()
+    index.find_copies_batch(copies + unrelated, exclude_author="checked_user")
+    batch_seconds = (time.perf_counter() - started) / (len(copies) + len(unrelated))
+
+    print(f"Indexed comments: {len(index)}")
+    print(f"Adding: {add_seconds / len(indexed) * 1e6:.0f} us per comment")
+    print(f"find_copies: {query_seconds * 1e6:.0f} us per comment")
+    print(f"find_copies_batch: {batch_seconds * 1e6:.0f} us per comment")
+    print(f"Edited copies found: {found / len(copies):.1%}, unrelated comments matched: {false_positives / len(unrelated):.1%}")
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
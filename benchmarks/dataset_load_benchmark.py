@@ -0,0 +1,72 @@
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+
+from src.dataset_store import DatasetStore
+from src.feature_schema import FEATURE_COLUMNS, CSV_HEADER
+
+
+"""Compares loading the training data from training_data.csv with pandas and from a memory mapped DatasetStore
+
+Run from the repository root:
+    python -m benchmarks.dataset_load_benchmark --rows 1000000
+"""
+
+
+def synthetic_rows(row_count: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    data = {"username": [f"User{index}" for index in range(row_count)], "is_bot": rng.integers(0, 2, row_count)}
+    for column in FEATURE_COLUMNS:
+        if column in ("verified_email", "name_pattern", "icon_default"):
+            data[column] = rng.random(row_count) < 0.5
+        else:
+            data[column] = rng.random(row_count) * 1000
+    return pd.DataFrame(data, columns=CSV_HEADER)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark loading the training data from CSV and from a DatasetStore")
+    parser.add_argument("--rows", type=int, default=1000000, help="users in the dataset")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        csv_file = os.path.join(directory, "training_data.csv")
+        synthetic_rows(args.rows).to_csv(csv_file, index=False)
+        store = DatasetStore(os.path.join(directory, "training_data"), FEATURE_COLUMNS)
+        started = time.perf_counter()
+        store.import_csv(csv_file)
+        import_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        data = pd.read_csv(csv_file, float_precision="round_trip") #exact, like the store's float()
+        csv_X = data[FEATURE_COLUMNS].values.astype(np.float64)
+        csv_y = data["is_bot"].values
+        csv_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        reopened = DatasetStore(os.path.join(directory, "training_data"), FEATURE_COLUMNS)
+        X = reopened.features()
+        y = reopened.labels()
+        open_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        column_sums = X.sum(axis=0) #touches every value, as training would
+        scan_seconds = time.perf_counter() - started
+
+        assert np.array_equal(X, csv_X) and np.array_equal(y, csv_y)
+        assert np.allclose(column_sums, csv_X.sum(axis=0))
+        print(f"Rows: {args.rows}, columns: {len(FEATURE_COLUMNS)}")
+        print(f"Checked: the store's X and y equal the CSV's")
+        print(f"pandas read_csv + float conversion: {csv_seconds:.2f} s")
+        print(f"DatasetStore open + memory map: {open_seconds * 1000:.1f} ms (first full scan {scan_seconds:.2f} s)")
+        print(f"One-off import_csv: {import_seconds:.2f} s")
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
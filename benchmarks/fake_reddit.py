@@ -0,0 +1,335 @@
+import random
+import threading
+import time
+import zlib
+from types import SimpleNamespace
+from typing import TYPE_CHECKING
+from prawcore.exceptions import NotFound, Forbidden
+
+if TYPE_CHECKING:
+    from benchmarks.synthetic_accounts import SyntheticAccount
+
+
+"""Stand-ins for the praw objects UserDataFetcher reads, with an injected latency per API request"""
+
+PAGE_SIZE = 100 #praw pages listings 100 items per request
+ACCOUNT_IDS_PER_REQUEST = 100 #account ids partial_redditors looks up per request
+FOUND = "found"
+SUSPENDED = "suspended"
+NOT_FOUND = "not_found"
+
+
+def account_id(name: str) -> str:
+    """The fake account id (t2_...) of a name, the same every run"""
+    return f"t2_{zlib.crc32(name.lower().encode()):x}"
+
+
+class FakeResponse:
+    """The part of a requests.Response prawcore's exceptions read"""
+    def __init__(self, status_code: int):
+        self.status_code = status_code
+
+
+class FakeSubreddit:
+    def __init__(self, display_name: str):
+        self.display_name = display_name
+
+
+class FakeItem:
+    """A comment (kind t1, has a body) or a submission (kind t3)"""
+    def __init__(self, kind: str, item_id: int, created_utc: float, score: int, subreddit: str, body: str = None):
+        self.fullname = f"{kind}_{item_id:x}"
+        self.created_utc = created_utc
+        self.score = score
+        self.subreddit = FakeSubreddit(subreddit)
+        if body is not None:
+            self.body = body
+
+
+class FakeRateLimitExceeded(Exception):
+    """Raised by a request over the budget of a FakeRateLimit that raises, like the 429 Reddit answers with"""
+
+
+class FakeRateLimit:
+    """A budget of requests per window shared by every fake object given it, like Reddit's per client rate limit
+
+    Once the window's budget is spent, a request either waits for the next window (what a client that follows the
+    rate limit headers ends up doing) or, with raise_when_exceeded, raises FakeRateLimitExceeded.
+
+    Attributes:
+        requests (int): Requests allowed per window
+        window (float): Seconds a window lasts
+        raise_when_exceeded (bool): If requests over the budget raise instead of waiting
+        stats (dict): Counts of requests, throttled requests and the waited_seconds
+    """
+    def __init__(self, requests: int = 100, window: float = 60, raise_when_exceeded: bool = False):
+        self.requests = requests
+        self.window = window
+        self.raise_when_exceeded = raise_when_exceeded
+        self.stats = {"requests": 0, "throttled": 0, "waited_seconds": 0.0}
+        self.lock = threading.Lock()
+        self.window_start = time.monotonic()
+        self.used = 0
+
+    def take(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now - self.window_start >= self.window:
+                    self.window_start, self.used = now, 0
+                if self.used < self.requests:
+                    self.used += 1
+                    self.stats["requests"] += 1
+                    return
+                self.stats["throttled"] += 1
+                wait = self.window_start + self.window - now
+                if self.raise_when_exceeded:
+                    raise FakeRateLimitExceeded(f"over {self.requests} requests in {self.window}s, retry in {wait:.1f}s")
+                self.stats["waited_seconds"] += wait
+            time.sleep(wait)
+
+
+def simulate_request(latency: float, rate_limit: FakeRateLimit = None):
+    if rate_limit is not None:
+        rate_limit.take()
+    time.sleep(latency)
+
+
+class FakeListing:
+    """Yields items newest first and sleeps latency seconds for every page, like a praw ListingGenerator
+
+    With error, the first page raises it instead, like the listings of a suspended or deleted account.
+    """
+    def __init__(self, items: list[FakeItem], latency: float, rate_limit: FakeRateLimit = None, error: Exception = None):
+        self.items = items
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.error = error
+        self.requests = 0
+
+    def new(self, limit: int = 100, params: dict = None):
+        if self.error is not None:
+            self.requests += 1
+            simulate_request(self.latency, self.rate_limit)
+            raise self.error
+        items = self.items
+        after = (params or {}).get("after")
+        if after is not None:
+            fullnames = [item.fullname for item in items]
+            items = items[fullnames.index(after) + 1:] if after in fullnames else []
+        for index, item in enumerate(items[:limit]):
+            if index % PAGE_SIZE == 0:
+                self.requests += 1
+                simulate_request(self.latency, self.rate_limit)
+            yield item
+
+
+class FakeRedditor:
+    """A lazily loaded redditor: the about fields cost one request on first access, every listing page and trophies() cost one more
+
+    The account is random, or the given SyntheticAccount (see benchmarks/synthetic_accounts.py).
+
+    Attributes:
+        name (str): The user name of the account
+        latency (float): Seconds every simulated request takes
+        comment_count (int): How many comments the account has
+        submission_count (int): How many submissions the account has
+        account (SyntheticAccount): The account served, None for a random one
+        rate_limit (FakeRateLimit): The budget every request is taken from, None for no limit
+        status (str): FOUND, SUSPENDED (the about page only has is_suspended) or NOT_FOUND (every request raises NotFound)
+    """
+    def __init__(self, name: str, latency: float = 0.1, comment_count: int = 600, submission_count: int = 300, seed: int = 0, now: float = None,
+                 account: "SyntheticAccount" = None, rate_limit: FakeRateLimit = None, status: str = FOUND):
+        self.name = name
+        self.fullname = account_id(name)
+        self.status = status
+        self.latency = latency
+        self.account = account
+        self.rate_limit = rate_limit
+        self._about = None
+        self._about_lock = threading.Lock()
+        self.about_requests = 0
+        self.trophy_requests = 0
+
+        if account is not None:
+            items = [FakeItem(kind, index, created_utc, score, subreddit, body)
+                     for index, (kind, created_utc, score, subreddit, body) in enumerate(account.items)]
+            self.created = account.created_utc
+        else:
+            rng = random.Random(seed)
+            now = time.time() if now is None else now
+            subreddits = ["askreddit", "funny", "pics", "python", "cryptocurrency", "gaming", "news", "aww"]
+            items = []
+            for index in range(comment_count + submission_count):
+                kind = "t1" if index < comment_count else "t3"
+                body = " ".join(rng.choice(["nice", "post", "this", "is", "great", "lol", "agreed", "thanks"]) for _ in range(rng.randint(1, 12))) if kind == "t1" else None
+                items.append(FakeItem(kind, index, now - rng.uniform(0, 3 * 365 * 24 * 60 * 60), rng.randint(-5, 500), rng.choice(subreddits), body))
+            items.sort(key=lambda item: item.created_utc, reverse=True)
+            self.created = now - 4 * 365 * 24 * 60 * 60
+        self.error = {FOUND: None, SUSPENDED: Forbidden(FakeResponse(403)), NOT_FOUND: NotFound(FakeResponse(404))}[status]
+        self.overview = FakeListing(items, latency, rate_limit, self.error)
+        self.comments = FakeListing([item for item in items if item.fullname.startswith("t1_")], latency, rate_limit, self.error)
+        self.submissions = FakeListing([item for item in items if item.fullname.startswith("t3_")], latency, rate_limit, self.error)
+
+    def about_values(self) -> dict:
+        """The about page of the account, without a request"""
+        if self.status == SUSPENDED:
+            return {"is_suspended": True}
+        if self.account is not None:
+            return {
+                "created_utc": self.account.created_utc,
+                "comment_karma": self.account.comment_karma,
+                "link_karma": self.account.link_karma,
+                "has_verified_email": self.account.has_verified_email,
+                "icon_img": self.account.icon_img
+            }
+        return {
+            "created_utc": self.created,
+            "comment_karma": 1200,
+            "link_karma": 300,
+            "has_verified_email": True,
+            "icon_img": "https://www.redditstatic.com/avatars/defaults/v2/avatar_default_1.png"
+        }
+
+    def __fetch_about__(self):
+        with self._about_lock:
+            if self._about is None:
+                self.about_requests += 1
+                simulate_request(self.latency, self.rate_limit)
+                if self.status == NOT_FOUND:
+                    raise self.error
+                self._about = self.about_values()
+        return self._about
+
+    def __getattr__(self, attribute):
+        if attribute.startswith("_"):
+            raise AttributeError(attribute)
+        about = self.__fetch_about__()
+        if attribute not in about:
+            raise AttributeError(attribute)
+        return about[attribute]
+
+    def new(self, limit: int = 100, params: dict = None):
+        return self.overview.new(limit=limit, params=params)
+
+    def trophies(self):
+        self.trophy_requests += 1
+        simulate_request(self.latency, self.rate_limit)
+        if self.error is not None:
+            raise self.error
+        if self.account is not None:
+            return list(self.account.trophies)
+        return ["Verified Email", "Three-Year Club"]
+
+    def request_count(self) -> int:
+        return self.about_requests + self.trophy_requests + self.overview.requests + self.comments.requests + self.submissions.requests
+
+
+class FakeRedditors:
+    """Stands in for praw.Reddit.redditors, the bulk lookup of accounts by id"""
+    def __init__(self, reddit: "FakeReddit"):
+        self.reddit = reddit
+        self.requests = 0
+
+    def partial_redditors(self, ids):
+        """Yields what /api/user_data_by_account_ids answers for every known account in ids, one request per 100 ids
+
+        Like the real endpoint there is no verified email, and unknown ids and not found accounts are left out.
+        Suspended accounts are answered with only their name and is_suspended.
+        """
+        ids = list(ids)
+        for start in range(0, len(ids), ACCOUNT_IDS_PER_REQUEST):
+            self.requests += 1
+            simulate_request(self.reddit.latency, self.reddit.rate_limit)
+            for fullname in ids[start:start + ACCOUNT_IDS_PER_REQUEST]:
+                name = self.reddit.names.get(fullname.lower())
+                if name is None or name.lower() in self.reddit.missing:
+                    continue
+                about = self.reddit.redditor(name).about_values()
+                if about.get("is_suspended"):
+                    yield SimpleNamespace(fullname=fullname, name=name, is_suspended=True)
+                else:
+                    yield SimpleNamespace(fullname=fullname, name=name, created_utc=about["created_utc"], link_karma=about["link_karma"],
+                                          comment_karma=about["comment_karma"], profile_img=about["icon_img"], profile_color="",
+                                          profile_over_18=False)
+
+
+class FakeReddit:
+    """Stands in for praw.Reddit: redditor(name) returns a FakeRedditor, the same one every time for the same name
+
+    Names of the given accounts get that account, any other name a random one. Names in suspended or missing get
+    a suspended or not found account instead, and redditors.partial_redditors looks accounts up by account_id().
+
+    Attributes:
+        latency (float): Seconds every simulated request takes
+        comment_count (int): How many comments every random account has
+        submission_count (int): How many submissions every random account has
+        accounts (dict): The SyntheticAccount of each lowercase name
+        rate_limit (FakeRateLimit): The budget shared by every request, None for no limit
+        suspended (set[str]): Lowercase names of the suspended accounts
+        missing (set[str]): Lowercase names of the accounts that do not exist
+        redditors (FakeRedditors): The bulk lookup
+    """
+    def __init__(self, latency: float = 0.1, comment_count: int = 600, submission_count: int = 300, accounts: list = None,
+                 rate_limit: FakeRateLimit = None, suspended: list[str] = None, missing: list[str] = None):
+        self.latency = latency
+        self.comment_count = comment_count
+        self.submission_count = submission_count
+        self.accounts = {account.name.lower(): account for account in accounts or []}
+        self.rate_limit = rate_limit
+        self.suspended = {name.lower() for name in suspended or []}
+        self.missing = {name.lower() for name in missing or []}
+        self.names = {account_id(name): account.name for name, account in self.accounts.items()} #account id -> name
+        self.names.update({account_id(name): name for name in self.suspended | self.missing})
+        self.redditors = FakeRedditors(self)
+        self.loaded = {}
+        self.lock = threading.Lock()
+
+    def account_id(self, name: str) -> str:
+        """The account id of name, which partial_redditors answers from now on"""
+        with self.lock:
+            self.names.setdefault(account_id(name), name)
+        return account_id(name)
+
+    def redditor(self, name: str) -> FakeRedditor:
+        with self.lock:
+            if name.lower() not in self.loaded:
+                status = SUSPENDED if name.lower() in self.suspended else NOT_FOUND if name.lower() in self.missing else FOUND
+                self.loaded[name.lower()] = FakeRedditor(name, latency=self.latency, comment_count=self.comment_count,
+                                                         submission_count=self.submission_count, seed=len(self.loaded),
+                                                         account=self.accounts.get(name.lower()), rate_limit=self.rate_limit,
+                                                         status=status)
+            return self.loaded[name.lower()]
+
+    def request_count(self) -> int:
+        with self.lock:
+            return self.redditors.requests + sum(redditor.request_count() for redditor in self.loaded.values())
+
+
+class FakeArcticShiftResponse:
+    def __init__(self, data: list):
+        self.data = data
+        self.headers = {}
+        self.status_code = 200
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {"data": self.data}
+
+
+class FakeArcticShiftSession:
+    """Stands in for the requests.Session of an ArcticShiftClient, answering every search after latency seconds"""
+    def __init__(self, latency: float, oldest_utc: float = 1.5e9):
+        self.latency = latency
+        self.oldest_utc = oldest_utc
+        self.requests = 0
+
+    def get(self, url, params=None, timeout=None, **kwargs):
+        self.requests += 1
+        time.sleep(self.latency)
+        return FakeArcticShiftResponse([{"created_utc": self.oldest_utc}])
+
+    def close(self):
+        pass
@@ -0,0 +1,47 @@
+import argparse
+import time
+
+from benchmarks.fake_reddit import FakeRedditor, FakeArcticShiftSession
+from src.arctic_shift_client import ArcticShiftClient
+from src.user_data_fetcher import UserDataFetcher
+
+
+"""Compares the wall-clock time of fetching one user sequentially and concurrently
+
+Run from the repository root:
+    python -m benchmarks.fetch_benchmark --latency 0.2 --workers 8
+"""
+
+
+def time_fetch(max_workers: int, latency: float, users: int) -> (float, float):
+    """Returns the average seconds and Reddit requests it took to build a UserProfile for one fake user"""
+    requests = 0
+    started = time.perf_counter()
+    arctic_shift = ArcticShiftClient(session=FakeArcticShiftSession(latency))
+    for index in range(users):
+        reddit_user = FakeRedditor(f"FakeUser{index}", latency=latency, seed=index)
+        fetcher = UserDataFetcher(reddit_user, max_workers=max_workers, arctic_shift=arctic_shift)
+        fetcher.get_data()
+        requests += reddit_user.request_count()
+    arctic_shift.close()
+    return (time.perf_counter() - started) / users, requests / users
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sequential vs concurrent UserDataFetcher.get_data")
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds every fake API request takes")
+    parser.add_argument("--workers", type=int, default=8, help="concurrency cap for the concurrent run")
+    parser.add_argument("--users", type=int, default=3, help="fake users fetched per mode")
+    args = parser.parse_args()
+
+    sequential, requests = time_fetch(1, args.latency, args.users)
+    concurrent, _ = time_fetch(args.workers, args.latency, args.users)
+    print(f"Latency per request: {args.latency * 1000:.0f} ms")
+    print(f"Reddit requests: {requests:.0f} per user")
+    print(f"Sequential: {sequential:.2f} s per user")
+    print(f"Concurrent ({args.workers} workers): {concurrent:.2f} s per user")
+    print(f"Speedup: {sequential / concurrent:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
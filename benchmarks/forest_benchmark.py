@@ -0,0 +1,74 @@
+import argparse
+import time
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+
+from src.feature_schema import FEATURE_COLUMNS
+from src.forest_engine import compile_forest, COMPILED_MAX_ROWS
+
+
+"""Times scoring with the RandomForestClassifier's predict_proba against the CompiledForest, and checks they agree
+
+The forest is fitted on random rows with nan values mixed in, single rows are scored one by one as check_user
+does, batches the way check_users does. The compiled forest is far ahead on single rows and small batches and
+falls behind sklearn's compiled loops once batches reach about a hundred rows: the run reports the first batch
+size where it does, which COMPILED_MAX_ROWS is set from. "dispatched" is the forest load_model returns, which
+keeps the sklearn forest for the larger batches.
+
+Run from the repository root:
+    python -m benchmarks.forest_benchmark --trees 200 --max-depth 10
+"""
+
+
+def time_per_call(function, calls: int) -> float:
+    """Returns the median seconds of one call"""
+    times = []
+    for _ in range(calls):
+        started = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - started)
+    return float(np.median(times))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the compiled forest against sklearn")
+    parser.add_argument("--trees", type=int, default=200)
+    parser.add_argument("--max-depth", type=int, default=None, help="deepest tree level, unlimited by default")
+    parser.add_argument("--rows", type=int, default=5000, help="training rows")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32, 64, 128, 256, 512, 1024, 4096], help="rows scored per call")
+    parser.add_argument("--calls", type=int, default=500, help="timed calls for one row, fewer for bigger batches")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    X = rng.random((args.rows, len(FEATURE_COLUMNS)))
+    X[rng.random(X.shape) < 0.05] = np.nan
+    y = (np.nan_to_num(X[:, 0]) + np.nan_to_num(X[:, 1]) + rng.normal(0, 0.4, args.rows) > 1).astype(int)
+    model = RandomForestClassifier(n_estimators=args.trees, max_depth=args.max_depth, random_state=42).fit(X, y)
+    started = time.perf_counter()
+    compiled = compile_forest(model)
+    dispatched = compile_forest(model, keep_estimator=True)
+    print(f"Compiled {args.trees} trees, {len(compiled.feature)} nodes, depth {compiled.depth} in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    queries = rng.random((max(max(args.batch_sizes), 1000), len(FEATURE_COLUMNS)))
+    queries[rng.random(queries.shape) < 0.05] = np.nan
+    difference = np.abs(model.predict_proba(queries) - compiled.predict_proba(queries)).max()
+    print(f"Largest predict_proba difference: {difference:.2e}")
+
+    crossover = None
+    for size in args.batch_sizes:
+        batch = queries[:size]
+        calls = max(args.calls // size, 5)
+        sklearn_time = time_per_call(lambda: model.predict_proba(batch), calls)
+        compiled_time = time_per_call(lambda: compiled.predict_proba(batch), calls)
+        dispatched_time = time_per_call(lambda: dispatched.predict_proba(batch), calls)
+        if crossover is None and compiled_time > sklearn_time:
+            crossover = size
+        print(f"{size} rows: sklearn {sklearn_time * 1000:.3f} ms, compiled {compiled_time * 1000:.3f} ms ({sklearn_time / compiled_time:.1f}x), "
+              f"dispatched {dispatched_time * 1000:.3f} ms")
+    if crossover is None:
+        print(f"The compiled forest was faster at every batch size, COMPILED_MAX_ROWS is {COMPILED_MAX_ROWS}")
+    else:
+        print(f"sklearn is faster from {crossover} rows, COMPILED_MAX_ROWS is {COMPILED_MAX_ROWS}")
+
+if __name__ == "__main__":
+    main()
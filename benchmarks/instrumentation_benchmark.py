@@ -0,0 +1,81 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from benchmarks.fake_reddit import FakeReddit, FakeArcticShiftSession
+from benchmarks.startup_benchmark import train_model
+from src.arctic_shift_client import ArcticShiftClient
+from src.bot_detector import BotDetector
+from src.copy_index import CopyIndex
+from src.instrumentation import get_instrumentation
+
+
+"""Measures what the instrumentation costs, disabled and enabled, and prints a trace and the Prometheus export
+
+Run from the repository root:
+    python -m benchmarks.instrumentation_benchmark --users 20
+"""
+
+
+def time_stage_calls(calls: int) -> float:
+    """Returns the nanoseconds of one `with instrumentation.stage(...)` block, minus the loop"""
+    instrumentation = get_instrumentation()
+    started = time.perf_counter()
+    for _ in range(calls):
+        pass
+    loop = time.perf_counter() - started
+    started = time.perf_counter()
+    for _ in range(calls):
+        with instrumentation.stage("benchmark"):
+            pass
+    return (time.perf_counter() - started - loop) / calls * 1e9
+
+
+def time_check_users(detector: BotDetector, usernames: list[str], rounds: int) -> float:
+    """Returns the best seconds of check_users over rounds"""
+    best = float("inf")
+    for _ in range(rounds):
+        started = time.perf_counter()
+        detector.check_users(usernames)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the instrumentation overhead")
+    parser.add_argument("--users", type=int, default=20, help="fake users scored per round")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--calls", type=int, default=1000000, help="stage() blocks timed")
+    args = parser.parse_args()
+
+    instrumentation = get_instrumentation()
+    with tempfile.TemporaryDirectory() as directory:
+        model_path = os.path.join(directory, "bot_detector_model.pkl")
+        train_model(model_path, 100)
+        arctic_shift = ArcticShiftClient(session=FakeArcticShiftSession(0))
+        detector = BotDetector(FakeReddit(latency=0, comment_count=300, submission_count=100), copy_index=CopyIndex(),
+                               model_path=model_path, arctic_shift=arctic_shift)
+        usernames = [f"FakeUser{index}" for index in range(args.users)]
+        detector.check_users(usernames) #loads the model and warms up
+
+        instrumentation.enabled = False
+        disabled_stage = time_stage_calls(args.calls)
+        disabled = time_check_users(detector, usernames, args.rounds)
+        instrumentation.enabled = True
+        enabled_stage = time_stage_calls(args.calls)
+        instrumentation.reset()
+        enabled = time_check_users(detector, usernames, args.rounds)
+        result = detector.check_users(usernames[:1])[0]
+        arctic_shift.close()
+
+    print(f"stage() block: {disabled_stage:.0f} ns disabled, {enabled_stage:.0f} ns enabled")
+    print(f"check_users of {args.users} users: {disabled * 1000:.1f} ms disabled, {enabled * 1000:.1f} ms enabled "
+          f"({(enabled / disabled - 1) * 100:+.1f}%)")
+    print(f"Trace of {result.username}: {json.dumps(result.trace.to_dict(), indent=2)}")
+    print(instrumentation.prometheus_text())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import argparse
+import gc
+import json
+import random
+import time
+import tracemalloc
+
+from src.user_data_fetcher import UserProfile
+from src.compact_user_profile import CompactUserProfile
+from src.account_activity_check import AccountActivityCheck
+from src.account_content_check import AccountContentCheck
+from src.copy_index import CopyIndex
+from src.profile_features import get_profile_features
+
+
+"""Compares the memory of keeping many profiles as UserProfile and as CompactUserProfile
+
+Run from the repository root:
+    python -m benchmarks.profile_memory_benchmark --profiles 5000
+"""
+
+WORDS = ["the", "bot", "karma", "post", "this", "is", "great", "agreed", "thanks", "lol", "crypto", "free", "reddit", "comment"]
+SUBREDDITS = [f"subreddit{index}" for index in range(3000)]
+
+
+def synthetic_profile(rng: random.Random, now: float) -> UserProfile:
+    """A full sized profile: 900 activities, 500 comments and 60 subreddits"""
+    timestamp = now
+    activity = []
+    for _ in range(900):
+        timestamp -= rng.expovariate(1 / 20000)
+        activity.append((timestamp, float(rng.randint(-5, 300))))
+    comments = [" ".join(rng.choices(WORDS, k=rng.randint(1, 40))) for _ in range(500)]
+    subreddits = list({rng.choice(SUBREDDITS) for _ in range(60)})
+    return UserProfile(f"User{rng.randint(0, 10**9)}", now - 1e8, activity, now - 9e7, comments, subreddits,
+                       rng.randint(0, 10**5), rng.randint(0, 10**5), True, 3, "https://www.redditstatic.com/avatars/defaults/v2/avatar_default_1.png")
+
+
+def measure(build) -> (float, list):
+    """Returns the bytes allocated by build() that are still held by what it returns"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    held = build()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before, held
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the memory of UserProfile vs CompactUserProfile")
+    parser.add_argument("--profiles", type=int, default=2000, help="profiles kept in memory")
+    args = parser.parse_args()
+
+    now = time.time()
+    #every layout is loaded from the same serialized profiles, so like API responses nothing is shared between profiles
+    serialized = [json.dumps(synthetic_profile(random.Random(index), now).to_dict()) for index in range(args.profiles)]
+    plain_bytes, plain = measure(lambda: [UserProfile.from_dict(json.loads(blob)) for blob in serialized])
+    compact_bytes, compact = measure(lambda: [CompactUserProfile.from_profile(UserProfile.from_dict(json.loads(blob))) for blob in serialized])
+    trimmed_bytes, trimmed = measure(lambda: [CompactUserProfile.from_profile(UserProfile.from_dict(json.loads(blob)), trim_comments=True)
+                                              for blob in serialized])
+
+    copy_index = CopyIndex()
+    for original, compact_profile, trimmed_profile in zip(plain[:200], compact[:200], trimmed[:200]):
+        for profile in (compact_profile, trimmed_profile):
+            activity = AccountActivityCheck(profile.comment_karma, profile.link_karma, profile.timestamps_and_karma, profile.oldest_timestamp, profile.account_timestamp, now=now)
+            expected = AccountActivityCheck(original.comment_karma, original.link_karma, original.timestamps_and_karma, original.oldest_timestamp, original.account_timestamp, now=now)
+            assert activity.get_features() == expected.get_features()
+            content = AccountContentCheck(profile.account_name, profile.comments, profile.comments, None)
+            expected = AccountContentCheck(original.account_name, original.comments, original.comments, None)
+            assert content.get_features() == expected.get_features()
+        if trimmed_profile.comments_trimmed:
+            try:
+                get_profile_features(trimmed_profile, copy_index=copy_index, features=["copy_count"])
+            except ValueError:
+                pass
+            else:
+                raise AssertionError("copy_count of a trimmed profile was computed")
+
+    print(f"Profiles: {args.profiles} (900 activities, 500 comments, ~60 subreddits each)")
+    print(f"Checked 200 profiles: activity and content features are the same for every layout, copy_count of trimmed profiles raises")
+    print(f"UserProfile: {plain_bytes / args.profiles / 1024:.1f} KB per profile")
+    print(f"CompactUserProfile: {compact_bytes / args.profiles / 1024:.1f} KB per profile")
+    print(f"CompactUserProfile, trim_comments: {trimmed_bytes / args.profiles / 1024:.1f} KB per profile")
+    del plain, compact, trimmed
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import argparse
+import time
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import GridSearchCV
+
+from src.feature_schema import FEATURE_COLUMNS
+from src.model_search import HalvingForestSearch, cross_validation_splits, FACTOR
+
+
+"""Times the hyperparameter search of train_model.py, GridSearchCV against HalvingForestSearch, on synthetic rows
+
+Both search train_model.py's grid over the same folds. Every score the halving search computed is checked against
+the grid's score for the same parameters, they should be equal.
+
+Run from the repository root:
+    python -m benchmarks.search_benchmark --rows 20000
+"""
+
+PARAM_GRID = {
+    "n_estimators": [50, 100, 150, 200],
+    "max_depth": [None, 5, 10, 15],
+    "min_samples_leaf": [1, 2, 4]
+}
+
+
+def synthetic_dataset(rows: int, seed: int = 0) -> (np.ndarray, np.ndarray):
+    """Returns rows with a few informative features, label noise and missing values"""
+    rng = np.random.default_rng(seed)
+    X = rng.random((rows, len(FEATURE_COLUMNS)))
+    signal = X[:, 0] + 0.5 * X[:, 1] * X[:, 2] - 0.3 * X[:, 3]
+    y = (signal + rng.normal(0, 0.25, rows) > np.median(signal)).astype(np.int8)
+    X[rng.random(X.shape) < 0.03] = np.nan
+    return X, y
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark GridSearchCV against HalvingForestSearch")
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--folds", type=int, default=10)
+    parser.add_argument("--factor", type=int, default=FACTOR)
+    parser.add_argument("--screening-trees", type=int, default=None, help="trees of the screening round, 0 skips it")
+    parser.add_argument("--skip-grid", action="store_true", help="only run the halving search")
+    args = parser.parse_args()
+
+    X, y = synthetic_dataset(args.rows)
+    splits = cross_validation_splits(len(y), n_splits=args.folds, random_state=42)
+
+    started = time.perf_counter()
+    halving = HalvingForestSearch(PARAM_GRID, splits, factor=args.factor, screening_trees=args.screening_trees, random_state=42, verbose=False).fit(X, y)
+    halving_seconds = time.perf_counter() - started
+    print(f"Halving: {halving_seconds:.1f}s, {len(halving.results_)} scores, best {halving.best_score_ * 100:.2f}% with {halving.best_params_}")
+    if args.skip_grid:
+        return
+
+    started = time.perf_counter()
+    grid = GridSearchCV(RandomForestClassifier(random_state=42), PARAM_GRID, cv=splits, scoring="accuracy", n_jobs=-1).fit(X, y)
+    grid_seconds = time.perf_counter() - started
+    print(f"Grid: {grid_seconds:.1f}s, {len(grid.cv_results_['params'])} scores, best {grid.best_score_ * 100:.2f}% with {grid.best_params_}")
+    print(f"Speedup: {grid_seconds / halving_seconds:.1f}x, best score difference {(grid.best_score_ - halving.best_score_) * 100:.2f} points")
+
+    grid_scores = {tuple(sorted(params.items(), key=str)): score for params, score in zip(grid.cv_results_["params"], grid.cv_results_["mean_test_score"])}
+    differences = [abs(grid_scores[tuple(sorted(result["params"].items(), key=str))] - result["mean_test_score"]) for result in halving.results_]
+    print(f"Largest difference between the halving and grid score of the same parameters: {max(differences):.2e}")
+
+
+if __name__ == "__main__":
+    main()
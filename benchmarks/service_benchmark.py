@@ -0,0 +1,121 @@
+import argparse
+import http.client
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from benchmarks.fake_reddit import FakeReddit, FakeArcticShiftSession
+from benchmarks.startup_benchmark import train_model
+from src.arctic_shift_client import ArcticShiftClient
+from src.bot_detector import BotDetector
+from src.copy_index import CopyIndex
+from src.feature_schema import FEATURE_COLUMNS
+from src.scoring_service import ScoringService, ScoringServer, MAX_BATCH, MAX_WAIT
+
+
+"""Runs the scoring service on a fake Reddit and fires concurrent requests at it, no network needed
+
+The user phase asks for users drawn from a small pool, so many requests for the same user overlap and share one
+fetch. The features phase posts precomputed rows, once with micro-batching and once with batches of one row.
+
+Run from the repository root:
+    python -m benchmarks.service_benchmark --clients 32 --requests 2000
+"""
+
+
+def start_server(detector: BotDetector, max_batch: int, max_wait: float) -> (ScoringServer, threading.Thread):
+    server = ScoringServer(("127.0.0.1", 0), ScoringService(detector, max_batch=max_batch, max_wait=max_wait))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, thread
+
+
+def stop_server(server: ScoringServer, thread: threading.Thread):
+    server.shutdown()
+    thread.join()
+    server.server_close()
+    server.service.close()
+
+
+def fire(port: int, clients: int, requests: list) -> (list[float], float):
+    """Sends the (method, path, body) requests over clients keep-alive connections, returns the latencies and wall clock"""
+    def run(chunk):
+        connection = http.client.HTTPConnection("127.0.0.1", port)
+        latencies = []
+        for method, path, body in chunk:
+            started = time.perf_counter()
+            connection.request(method, path, body=body, headers={"Content-Type": "application/json"})
+            response = connection.getresponse()
+            payload = json.loads(response.read())
+            if response.status != 200 or payload.get("error"):
+                raise RuntimeError(f"{method} {path} failed with {response.status}: {payload}")
+            latencies.append(time.perf_counter() - started)
+        connection.close()
+        return latencies
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        latencies = [latency for chunk in executor.map(run, [requests[index::clients] for index in range(clients)]) for latency in chunk]
+    return latencies, time.perf_counter() - started
+
+
+def summary(latencies: list[float], seconds: float) -> str:
+    milliseconds = np.array(latencies) * 1000
+    return (f"{len(latencies) / seconds:.0f} requests/s, p50 {np.percentile(milliseconds, 50):.2f} ms, "
+            f"p90 {np.percentile(milliseconds, 90):.2f} ms, p99 {np.percentile(milliseconds, 99):.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the scoring service against a fake Reddit")
+    parser.add_argument("--clients", type=int, default=32, help="concurrent connections")
+    parser.add_argument("--requests", type=int, default=2000, help="precomputed feature requests")
+    parser.add_argument("--user-requests", type=int, default=200, help="score by username requests")
+    parser.add_argument("--users", type=int, default=20, help="distinct users the username requests are drawn from")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds every fake API request takes")
+    parser.add_argument("--trees", type=int, default=200, help="trees in the benchmark model")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    parser.add_argument("--max-wait-ms", type=float, default=MAX_WAIT * 1000)
+    parser.add_argument("--sklearn", action="store_true", help="score with sklearn's predict_proba instead of the compiled forest")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as directory:
+        model_path = os.path.join(directory, "bot_detector_model.pkl")
+        train_model(model_path, args.trees)
+        reddit = FakeReddit(latency=args.latency, comment_count=200, submission_count=100)
+        arctic_shift = ArcticShiftClient(session=FakeArcticShiftSession(args.latency))
+        detector = BotDetector(reddit, copy_index=CopyIndex(), model_path=model_path, compiled=not args.sklearn,
+                               arctic_shift=arctic_shift)
+
+        server, thread = start_server(detector, args.max_batch, args.max_wait_ms / 1000)
+        port = server.server_address[1]
+        usernames = [f"FakeUser{rng.randrange(args.users)}" for _ in range(args.user_requests)]
+        latencies, seconds = fire(port, args.clients, [("GET", f"/score/{username}", None) for username in usernames])
+        metrics = server.service.metrics()
+        print(f"Score by username ({args.user_requests} requests, {len(set(usernames))} users): {summary(latencies, seconds)}")
+        print(f"  Fetches run: {metrics['user_fetches']['runs']}, shared with a running fetch: {metrics['user_fetches']['shared']}, "
+              f"fake Reddit requests: {reddit.request_count()}")
+
+        rows = [json.dumps({"features": {column: rng.random() for column in FEATURE_COLUMNS}}) for _ in range(args.requests)]
+        requests = [("POST", "/score", row) for row in rows]
+        before = dict(server.service.batcher.stats)
+        latencies, seconds = fire(port, args.clients, requests)
+        batches = server.service.batcher.stats["batches"] - before["batches"]
+        print(f"Precomputed features, micro-batched: {summary(latencies, seconds)}, {args.requests / batches:.1f} rows per batch")
+        print(f"Server side latency: {json.dumps(server.service.metrics()['latency'])}")
+        stop_server(server, thread)
+
+        server, thread = start_server(detector, 1, 0)
+        latencies, seconds = fire(server.server_address[1], args.clients, requests)
+        print(f"Precomputed features, one row per batch: {summary(latencies, seconds)}")
+        stop_server(server, thread)
+        arctic_shift.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+
+"""Times a cold start of the detector: importing src.bot_detector, and importing it then scoring one profile
+
+Every run is a fresh interpreter, as a CLI call or a serverless invocation would be. The first score includes
+loading the model and the lazily imported dependencies. Each result can be appended to a JSON lines history
+file, to track startup over time.
+
+Run from the repository root:
+    python -m benchmarks.startup_benchmark --runs 5 --history benchmarks/startup_history.jsonl
+"""
+
+FIRST_SCORE = """
+import time
+started = time.perf_counter()
+import src.bot_detector as bot_detector
+imported = time.perf_counter()
+from benchmarks.profile_memory_benchmark import synthetic_profile
+import random
+profile = synthetic_profile(random.Random(0), time.time())
+prepared = time.perf_counter()
+detector = bot_detector.BotDetector(None, model_path={model_path!r}, mmap_mode={mmap_mode!r})
+vector = bot_detector.to_feature_vector(detector.get_all_features(None, profile))
+detector.model.predict_proba([vector])
+scored = time.perf_counter()
+detector.model.predict_proba([bot_detector.to_feature_vector(detector.get_all_features(None, profile))])
+rescored = time.perf_counter()
+print({{"import_ms": (imported - started) * 1000, "first_score_ms": (scored - prepared) * 1000, "second_score_ms": (rescored - scored) * 1000}})
+"""
+
+
+def train_model(path: str, trees: int, rows: int = 2000):
+    """Saves a RandomForest of the shape train_model.py builds, fitted on random data"""
+    import joblib
+    from sklearn.ensemble import RandomForestClassifier
+    from src.feature_schema import FEATURE_COLUMNS
+    rng = np.random.default_rng(0)
+    X = rng.random((rows, len(FEATURE_COLUMNS)))
+    y = (X[:, 0] + rng.normal(0, 0.3, rows) > 0.5).astype(int)
+    joblib.dump(RandomForestClassifier(n_estimators=trees, random_state=42).fit(X, y), path)
+
+
+def run(code: str) -> float:
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, env={**os.environ, "PYTHONPATH": os.getcwd()})
+    return (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the cold start of the detector")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per measurement")
+    parser.add_argument("--trees", type=int, default=200, help="trees in the benchmark model")
+    parser.add_argument("--mmap-mode", default=None, help="mmap_mode the model is loaded with, e.g. r")
+    parser.add_argument("--history", default=None, help="JSON lines file the results are appended to")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        model_path = os.path.join(directory, "bot_detector_model.pkl")
+        train_model(model_path, args.trees)
+        interpreter = statistics.median(run("pass") for _ in range(args.runs))
+        import_wall = statistics.median(run("import src.bot_detector") for _ in range(args.runs))
+        inside = []
+        for _ in range(args.runs):
+            output = subprocess.run([sys.executable, "-c", FIRST_SCORE.format(model_path=model_path, mmap_mode=args.mmap_mode)],
+                                    check=True, capture_output=True, text=True, env={**os.environ, "PYTHONPATH": os.getcwd()}).stdout
+            inside.append(eval(output.strip().splitlines()[-1]))
+
+    result = {
+        "interpreter_ms": round(interpreter, 1),
+        "import_wall_ms": round(import_wall, 1),
+        "import_ms": round(statistics.median(run["import_ms"] for run in inside), 1),
+        "first_score_ms": round(statistics.median(run["first_score_ms"] for run in inside), 1),
+        "second_score_ms": round(statistics.median(run["second_score_ms"] for run in inside), 1),
+        "trees": args.trees,
+        "mmap_mode": args.mmap_mode
+    }
+    print(f"Python start: {result['interpreter_ms']} ms")
+    print(f"import src.bot_detector: {result['import_ms']} ms ({result['import_wall_ms']} ms wall with Python start)")
+    print(f"First score (model load + lazy imports + features + predict): {result['first_score_ms']} ms")
+    print(f"Second score: {result['second_score_ms']} ms")
+
+    if args.history:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+        with open(args.history, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"timestamp": time.time(), "commit": commit or None, "python": platform.python_version(), **result}) + "\n")
+        print(f"Appended to {args.history}")
+
+
+if __name__ == "__main__":
+    main()
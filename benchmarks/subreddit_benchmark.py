@@ -0,0 +1,60 @@
+import argparse
+import random
+import string
+import time
+
+from src.account_subbreddit_content_check import (AccountSubbredditContentCheck, BOT_FREQUENTED_SUBREDDITS, compile_keyword_matcher,
+                                                  get_subreddit_features_batch, get_subreddit_flags)
+
+
+"""Times the subreddit features over many users, and the keyword matcher against the nested substring loop
+
+Run from the repository root:
+    python -m benchmarks.subreddit_benchmark --users 50000 --keywords 3000
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the subreddit keyword matcher and features")
+    parser.add_argument("--users", type=int, default=20000, help="users whose subreddit lists are scored")
+    parser.add_argument("--keywords", type=int, default=3000, help="size of the grown keyword list matched against")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    names = ["".join(rng.choices(string.ascii_lowercase + "_", k=rng.randint(3, 21))) for _ in range(20000)] + sorted(BOT_FREQUENTED_SUBREDDITS)
+    keywords = {"".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 9))) for _ in range(args.keywords)}
+
+    started = time.perf_counter()
+    expected = [any(keyword in name for keyword in keywords) for name in names]
+    loop_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    matcher = compile_keyword_matcher(keywords)
+    compile_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    found = [matcher.search(name) is not None for name in names]
+    matcher_seconds = time.perf_counter() - started
+    assert found == expected
+
+    subreddit_lists = [rng.sample(names, rng.randint(5, 80)) for _ in range(args.users)]
+    get_subreddit_flags.cache_clear()
+    started = time.perf_counter()
+    per_user = [AccountSubbredditContentCheck(subreddits).get_features() for subreddits in subreddit_lists]
+    per_user_seconds = time.perf_counter() - started
+    get_subreddit_flags.cache_clear()
+    started = time.perf_counter()
+    batch = get_subreddit_features_batch(subreddit_lists)
+    batch_seconds = time.perf_counter() - started
+    for user, features in enumerate(per_user):
+        for name, value in features.items():
+            assert batch[name][user] == value
+
+    print(f"{len(names)} subreddit names against {len(keywords)} keywords:")
+    print(f"  nested substring loop: {loop_seconds * 1e6 / len(names):.1f} us per name")
+    print(f"  compiled matcher: {matcher_seconds * 1e6 / len(names):.2f} us per name (compiled once in {compile_seconds * 1000:.0f} ms)")
+    print(f"{args.users} users, features match between both paths:")
+    print(f"  AccountSubbredditContentCheck per user: {per_user_seconds * 1e6 / args.users:.1f} us per user")
+    print(f"  get_subreddit_features_batch: {batch_seconds * 1e6 / args.users:.1f} us per user")
+
+
+if __name__ == "__main__":
+    main()
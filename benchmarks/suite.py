@@ -0,0 +1,384 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import joblib
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+
+from benchmarks.synthetic_accounts import generate_accounts
+from benchmarks.fake_reddit import FakeReddit, FakeRateLimit
+from benchmarks.arctic_shift_stub import ArcticShiftStub
+from src.arctic_shift_client import ArcticShiftClient
+from src.rate_limiter import RateLimiter
+from src.user_data_fetcher import UserDataFetcher
+from src.profile_cache import ProfileCache, CachedUserDataFetcher
+from src.profile_features import get_profile_features, required_fields
+from src.copy_index import CopyIndex
+from src.snapshot_store import SnapshotStore
+from src.dataset_journal import DatasetJournal
+from src.dataset_store import DatasetStore
+from src.feature_schema import FEATURE_COLUMNS, to_feature_vector
+from src.forest_engine import compile_forest
+from src.model_search import HalvingForestSearch, cross_validation_splits
+from src.instrumentation import get_instrumentation
+from src.bot_detector import BotDetector
+from src.cascade_detector import CascadeDetector, STAGE_ONE_FEATURES, UNCERTAINTY_BAND
+from src.account_headers import AccountHeaderFetcher, BULK_ATTRIBUTES, ABOUT_FIELDS, FOUND, SUSPENDED, NOT_FOUND
+
+
+"""Runs the whole pipeline offline on generated accounts and writes the timings as JSON, to catch regressions
+
+The accounts come from benchmarks/synthetic_accounts.py, Reddit is a FakeReddit serving them and Arctic Shift a
+local ArcticShiftStub, both with the given latency and rate limits. The scenarios:
+
+    fetch       UserDataFetcher on every account, workers users at a time, only the fields of --features if given
+    features    each detection rule's features on every account's profile
+    inference   the CompiledForest and sklearn's predict_proba on one row and on batches
+    build       the dataset build of scripts/build_dataset.py: fetch, snapshot, copy index, features, journal, store
+    training    HalvingForestSearch on the generated accounts' features
+    cascade     BotDetector.check_users against CascadeDetector with --band: requests, throughput and accuracy
+    headers     AccountHeaderFetcher in bulk by account id and one about page at a time, with --gone-share of the
+                accounts suspended or deleted
+
+With --compare, every metric is checked against an earlier --output file: metrics ending in _ms, _us or _seconds
+must not grow, and metrics ending in _per_second, _per_minute or accuracy must not shrink, by more than --tolerance.
+Any that do are listed and the exit status is 1, so the suite can gate a CI job.
+
+Run from the repository root:
+    python -m benchmarks.suite --accounts 200 --output benchmarks/results.json
+    python -m benchmarks.suite --accounts 200 --compare benchmarks/results.json
+"""
+
+SCENARIOS = ["fetch", "features", "inference", "build", "training", "cascade", "headers"]
+LOWER_IS_BETTER = ("_ms", "_us", "_seconds")
+HIGHER_IS_BETTER = ("_per_second", "_per_minute", "accuracy")
+TRAINING_GRID = {"n_estimators": [25, 50, 100], "max_depth": [None, 10], "min_samples_leaf": [1, 4]}
+BATCH_SIZE = 256
+
+
+def percentiles(seconds: list[float], unit: str = "ms") -> dict:
+    """p50, p95 and max of durations in seconds, in milliseconds or (unit "us") microseconds"""
+    scale = 1000 if unit == "ms" else 1000000
+    values = np.array(seconds) * scale
+    return {f"p50_{unit}": round(float(np.percentile(values, 50)), 3), f"p95_{unit}": round(float(np.percentile(values, 95)), 3),
+            f"max_{unit}": round(float(values.max()), 3)}
+
+
+def arctic_shift_client(stub: ArcticShiftStub) -> ArcticShiftClient:
+    """A client with a cold cache and its own rate limiter, pointed at the stub"""
+    return ArcticShiftClient(url=stub.url, rate_limiter=RateLimiter())
+
+
+class Suite:
+    """This class runs the scenarios on one set of generated accounts, sharing what several scenarios need
+
+        Attributes:
+            args (argparse.Namespace): The command line options
+            accounts (list[SyntheticAccount]): The generated accounts
+            now (float): The time the accounts were generated at, features are computed at it
+            stub (ArcticShiftStub): The running Arctic Shift stub
+            results (dict): The metrics of each scenario run
+    """
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.now = time.time()
+        self.accounts = generate_accounts(args.accounts, bot_share=args.bot_share, seed=args.seed, now=self.now)
+        self.stub = ArcticShiftStub(self.accounts, latency=args.latency, rate_limit=args.arctic_shift_rate_limit,
+                                    window=args.rate_window).start()
+        self.results = {}
+        self.feature_rows = None
+
+    def fake_reddit(self, **kwargs) -> FakeReddit:
+        """A FakeReddit with nothing loaded yet, sharing one rate limit if --reddit-rate-limit is set, kwargs go to FakeReddit"""
+        rate_limit = None
+        if self.args.reddit_rate_limit:
+            rate_limit = FakeRateLimit(self.args.reddit_rate_limit, self.args.rate_window, raise_when_exceeded=self.args.raise_on_limit)
+        return FakeReddit(latency=self.args.latency, accounts=self.accounts, rate_limit=rate_limit, **kwargs)
+
+    def features(self) -> (np.ndarray, np.ndarray):
+        """The feature matrix and labels of every account, computed once from the accounts' profiles"""
+        if self.feature_rows is None:
+            copy_index = CopyIndex()
+            for account in self.accounts:
+                copy_index.add_comments(account.name, account.to_profile().comments)
+            rows = [to_feature_vector({column: None for column in FEATURE_COLUMNS}
+                                      | get_profile_features(account.to_profile(), copy_index=copy_index, now=self.now))
+                    for account in self.accounts]
+            self.feature_rows = (np.array(rows, dtype=np.float64), np.array([int(account.is_bot) for account in self.accounts]))
+            copy_index.close()
+        return self.feature_rows
+
+    def run_fetch(self) -> dict:
+        reddit = self.fake_reddit()
+        client = arctic_shift_client(self.stub)
+        requests_before, throttled_before = self.stub.stats["requests"], self.stub.stats["throttled"]
+        fields = required_fields(self.args.features) if self.args.features else None
+
+        def fetch(account) -> (float, str):
+            started = time.perf_counter()
+            try:
+                UserDataFetcher(reddit.redditor(account.name), max_workers=self.args.fetch_workers, arctic_shift=client).get_data(fields)
+                error = None
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            return time.perf_counter() - started, error
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.args.workers) as executor:
+            outcomes = list(executor.map(fetch, self.accounts))
+        seconds = time.perf_counter() - started
+        client.close()
+
+        result = {"users_per_second": round(len(self.accounts) / seconds, 3), "seconds": round(seconds, 3),
+                  **percentiles([duration for duration, _ in outcomes]),
+                  "failed": sum(error is not None for _, error in outcomes),
+                  "reddit_requests_per_user": round(reddit.request_count() / len(self.accounts), 3),
+                  "arctic_shift_requests": self.stub.stats["requests"] - requests_before,
+                  "arctic_shift_throttled": self.stub.stats["throttled"] - throttled_before}
+        if reddit.rate_limit is not None:
+            result["reddit_throttled"] = reddit.rate_limit.stats["throttled"]
+            result["reddit_waited_seconds"] = round(reddit.rate_limit.stats["waited_seconds"], 3)
+        return result
+
+    def run_features(self) -> dict:
+        profiles = [account.to_profile() for account in self.accounts]
+        copy_index = CopyIndex()
+        for profile in profiles:
+            copy_index.add_comments(profile.account_name, profile.comments)
+
+        #the stage timers get_profile_features already has time every rule, a trace per profile keeps each run
+        instrumentation = get_instrumentation()
+        enabled = instrumentation.enabled
+        instrumentation.enabled = True
+        traces = []
+        try:
+            for profile in profiles:
+                with instrumentation.trace(profile.account_name) as trace:
+                    get_profile_features(profile, copy_index=copy_index, now=self.now)
+                traces.append(trace.to_dict())
+        finally:
+            instrumentation.enabled = enabled
+            copy_index.close()
+
+        stage_seconds = {}
+        for trace in traces:
+            for stage in trace["stages"]:
+                stage_seconds.setdefault(stage["stage"].removeprefix("features."), []).append(stage["ms"] / 1000)
+        total = sum(trace["total_ms"] for trace in traces) / 1000
+        result = {"profiles_per_second": round(len(traces) / total, 3), **percentiles([trace["total_ms"] / 1000 for trace in traces])}
+        for rule, seconds in stage_seconds.items():
+            result.update({f"{rule}_{key}": value for key, value in percentiles(seconds, "us").items()})
+        return result
+
+    def run_inference(self) -> dict:
+        X, y = self.features()
+        model = RandomForestClassifier(n_estimators=self.args.trees, random_state=0).fit(X, y)
+        forest = compile_forest(model)
+        batch = np.resize(X, (BATCH_SIZE, X.shape[1])) #the accounts' rows repeated up to a full batch
+        result = {}
+        for name, scorer, repeats in (("compiled", forest, 500), ("sklearn", model, 50)):
+            single = []
+            for index in range(repeats):
+                started = time.perf_counter()
+                scorer.predict_proba(X[index % len(X)].reshape(1, -1))
+                single.append(time.perf_counter() - started)
+            result.update({f"{name}_single_{key}": value for key, value in percentiles(single, "us").items() if not key.startswith("max")})
+            started = time.perf_counter()
+            for _ in range(10):
+                scorer.predict_proba(batch)
+            result[f"{name}_batch_rows_per_second"] = round(10 * BATCH_SIZE / (time.perf_counter() - started), 1)
+        return result
+
+    def run_build(self) -> dict:
+        reddit = self.fake_reddit()
+        client = arctic_shift_client(self.stub)
+        with tempfile.TemporaryDirectory() as directory:
+            profile_cache = ProfileCache(os.path.join(directory, "profile_cache.sqlite"))
+            copy_index = CopyIndex(os.path.join(directory, "copy_index.sqlite"))
+            snapshots = SnapshotStore(os.path.join(directory, "snapshots"))
+            journal = DatasetJournal(os.path.join(directory, "build_journal.sqlite"))
+            store = DatasetStore(os.path.join(directory, "training_data"), FEATURE_COLUMNS)
+
+            def build_user_features(account) -> dict:
+                features = {key: None for key in FEATURE_COLUMNS}
+                user_info = CachedUserDataFetcher(reddit.redditor(account.name), profile_cache, arctic_shift=client).get_data()
+                fetched_at = time.time()
+                snapshots.append(account.name, user_info, int(account.is_bot), fetched_at)
+                copy_index.add_comments(user_info.account_name, user_info.comments)
+                features.update(get_profile_features(user_info, reddit, now=fetched_at))
+                return features
+
+            #the workers only fetch and the main thread writes, as build_dataset.py does
+            started = time.perf_counter()
+            failed = 0
+            with ThreadPoolExecutor(max_workers=self.args.workers) as executor:
+                futures = {executor.submit(build_user_features, account): account for account in self.accounts}
+                for future in as_completed(futures):
+                    account = futures[future]
+                    try:
+                        features = future.result()
+                    except Exception as e:
+                        journal.record_failed(account.name, int(account.is_bot), f"{type(e).__name__}: {e}")
+                        failed += 1
+                        continue
+                    journal.record_done(account.name, int(account.is_bot), features)
+                    store.append([(account.name, int(account.is_bot), features)])
+            seconds = time.perf_counter() - started
+
+            snapshot_bytes = sum(os.path.getsize(segment) for segment in snapshots.segments())
+            for closable in (profile_cache, copy_index, journal, client):
+                closable.close()
+        return {"users_per_minute": round(len(self.accounts) / seconds * 60, 1), "seconds": round(seconds, 3), "failed": failed,
+                "snapshot_bytes_per_user": round(snapshot_bytes / len(self.accounts))}
+
+    def run_training(self) -> dict:
+        X, y = self.features()
+        splits = cross_validation_splits(len(y), n_splits=self.args.folds)
+        started = time.perf_counter()
+        search = HalvingForestSearch(TRAINING_GRID, splits, verbose=False).fit(X, y)
+        seconds = time.perf_counter() - started
+        return {"search_seconds": round(search.search_seconds_, 3), "refit_seconds": round(seconds - search.search_seconds_, 3),
+                "fits": len(search.results_) * len(splits), "best_accuracy": round(search.best_score_, 4), "best_params": search.best_params_}
+
+    def run_cascade(self) -> dict:
+        X, y = self.features()
+        stage_one_columns = [FEATURE_COLUMNS.index(column) for column in STAGE_ONE_FEATURES]
+        is_bot = {account.name: account.is_bot for account in self.accounts}
+        result = {}
+        with tempfile.TemporaryDirectory() as directory:
+            #both models are fitted on every account, so accuracy here only compares the two ways of scoring them
+            model_path = os.path.join(directory, "model.pkl")
+            stage_one_path = os.path.join(directory, "stage_one.pkl")
+            joblib.dump(compile_forest(RandomForestClassifier(n_estimators=self.args.trees, random_state=0).fit(X, y)), model_path)
+            joblib.dump(compile_forest(RandomForestClassifier(n_estimators=self.args.trees, random_state=0).fit(X[:, stage_one_columns], y)),
+                        stage_one_path)
+
+            for name in ("full", "cascade"):
+                reddit = self.fake_reddit()
+                client = arctic_shift_client(self.stub)
+                requests_before = self.stub.stats["requests"]
+                detector = BotDetector(reddit, fetch_workers=self.args.fetch_workers, model_path=model_path, arctic_shift=client)
+                if name == "cascade":
+                    detector = CascadeDetector(detector, stage_one_path, band=tuple(self.args.band))
+                started = time.perf_counter()
+                results = detector.check_users([account.name for account in self.accounts], max_workers=self.args.workers)
+                seconds = time.perf_counter() - started
+                client.close()
+                scored = [detection for detection in results if detection.error is None]
+                result.update({f"{name}_users_per_second": round(len(results) / seconds, 3),
+                               f"{name}_reddit_requests_per_user": round(reddit.request_count() / len(results), 3),
+                               f"{name}_arctic_shift_requests": self.stub.stats["requests"] - requests_before,
+                               f"{name}_failed": len(results) - len(scored),
+                               f"{name}_accuracy": round(float(np.mean([detection.is_suspicious == is_bot[detection.username] for detection in scored])), 4)
+                               if scored else 0.0})
+            stats = detector.cascade_stats()
+        result.update({"exit_rate": stats["exit_rate"], "min_requests_saved": stats["min_requests_saved"]})
+        return result
+
+    def run_headers(self) -> dict:
+        names = [account.name for account in self.accounts]
+        gone = names[:round(len(names) * self.args.gone_share)]
+        result = {}
+        for name, fields in (("bulk", list(BULK_ATTRIBUTES)), ("about", ABOUT_FIELDS)):
+            reddit = self.fake_reddit(suspended=gone[::2], missing=gone[1::2])
+            fetcher = AccountHeaderFetcher(reddit, max_workers=self.args.workers)
+            started = time.perf_counter()
+            headers = fetcher.get_headers(names, {username: reddit.account_id(username) for username in names}, fields)
+            seconds = time.perf_counter() - started
+            statuses = [header.status for header in headers.values()]
+            result.update({f"{name}_users_per_second": round(len(names) / seconds, 3),
+                           f"{name}_requests_per_user": round(reddit.request_count() / len(names), 3),
+                           f"{name}_flagged": statuses.count(SUSPENDED) + statuses.count(NOT_FOUND),
+                           f"{name}_failed": len(statuses) - statuses.count(FOUND) - statuses.count(SUSPENDED) - statuses.count(NOT_FOUND)})
+        return result
+
+    def run(self, scenarios: list[str]) -> dict:
+        try:
+            for scenario in scenarios:
+                started = time.perf_counter()
+                self.results[scenario] = getattr(self, f"run_{scenario}")()
+                print(f"{scenario} ({time.perf_counter() - started:.1f}s)")
+                for metric, value in self.results[scenario].items():
+                    print(f"  {metric}: {value}")
+        finally:
+            self.stub.stop()
+        return self.results
+
+
+def direction(metric: str) -> int:
+    """1 if a bigger value of metric is better, -1 if a smaller one is, 0 if it is only informational"""
+    if metric.endswith(HIGHER_IS_BETTER):
+        return 1
+    if metric.endswith(LOWER_IS_BETTER):
+        return -1
+    return 0
+
+
+def regressions(results: dict, baseline: dict, tolerance: float) -> list[dict]:
+    """Every metric of results that is worse than the same metric of baseline by more than tolerance (a fraction)"""
+    found = []
+    for scenario, metrics in results.items():
+        for metric, value in metrics.items():
+            before = baseline.get(scenario, {}).get(metric)
+            better = direction(metric)
+            if not better or not isinstance(value, (int, float)) or not isinstance(before, (int, float)) or before == 0:
+                continue
+            change = (value - before) / abs(before)
+            if change * better < -tolerance:
+                found.append({"scenario": scenario, "metric": metric, "baseline": before, "value": value, "change": round(change, 4)})
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the offline end-to-end benchmark suite on generated accounts")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--accounts", type=int, default=100, help="accounts generated")
+    parser.add_argument("--bot-share", type=float, default=0.5, help="share of the accounts that are bots")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the generated accounts")
+    parser.add_argument("--latency", type=float, default=0.01, help="seconds every fake Reddit request and Arctic Shift search takes")
+    parser.add_argument("--reddit-rate-limit", type=int, default=0, help="fake Reddit requests per window, 0 for no limit")
+    parser.add_argument("--arctic-shift-rate-limit", type=int, default=1000, help="Arctic Shift stub searches per window")
+    parser.add_argument("--rate-window", type=float, default=60, help="seconds a rate limit window lasts")
+    parser.add_argument("--raise-on-limit", action="store_true", help="fake Reddit requests over the limit raise instead of waiting")
+    parser.add_argument("--features", nargs="+", choices=FEATURE_COLUMNS, default=None, help="features the fetch scenario fetches the fields of")
+    parser.add_argument("--workers", type=int, default=8, help="users fetched at the same time")
+    parser.add_argument("--fetch-workers", type=int, default=8, help="requests sent at the same time while fetching one user")
+    parser.add_argument("--trees", type=int, default=200, help="trees of the inference model")
+    parser.add_argument("--band", nargs=2, type=float, default=list(UNCERTAINTY_BAND), metavar=("LOW", "HIGH"),
+                        help="uncertainty band of the cascade scenario")
+    parser.add_argument("--gone-share", type=float, default=0.05, help="share of the accounts suspended or deleted in the headers scenario")
+    parser.add_argument("--folds", type=int, default=5, help="cross validation folds of the training scenario")
+    parser.add_argument("--output", default=None, help="JSON file the results are written to")
+    parser.add_argument("--compare", default=None, help="an earlier --output file to check the results against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="largest relative slowdown not reported as a regression")
+    args = parser.parse_args()
+
+    print(f"Generating {args.accounts} accounts...")
+    results = Suite(args).run(args.scenarios)
+    commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    report = {"timestamp": time.time(), "commit": commit or None, "python": platform.python_version(),
+              "platform": platform.platform(), "options": vars(args), "scenarios": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        found = regressions(results, baseline["scenarios"], args.tolerance)
+        print(f"Compared with {args.compare} (commit {baseline.get('commit')}): {len(found)} regressions over {args.tolerance:.0%}")
+        for regression in found:
+            print(f"  {regression['scenario']}.{regression['metric']}: {regression['baseline']} -> {regression['value']} ({regression['change']:+.1%})")
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
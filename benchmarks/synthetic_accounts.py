@@ -0,0 +1,224 @@
+import random
+import time
+
+from src.user_data_fetcher import UserProfile
+from src.listing_harvester import ACTIVITY_LIMIT, COMMENT_LIMIT, SUBREDDIT_LIMIT
+from src.account_subbreddit_content_check import BOT_FREQUENTED_SUBREDDITS, BOT_TYPICAL_TOPICS
+
+
+"""Generates labeled synthetic Reddit accounts, bots and humans, for the offline benchmarks
+
+Humans post in sessions at the hours of their own day, with irregular gaps of hours to weeks, in a long tail of
+subreddits, and write comments of any length from a wide vocabulary. Bots are often old accounts that stayed
+dormant until recently, then most post in bursts of seconds apart on a fixed schedule, mostly in karma farming and
+scam subreddits, with short template comments or comments copied from the humans. Their about fields lean the
+same way: default avatars and generated names for bots, verified emails and trophies for humans, but only lean,
+plenty of humans keep the name and avatar Reddit gave them, so the classes overlap like real ones do.
+
+The same seed always gives the same accounts, so the results of different runs can be compared.
+"""
+
+SECONDS_PER_DAY = 24 * 60 * 60
+DEFAULT_ICON = "https://www.redditstatic.com/avatars/defaults/v2/avatar_default_{}.png"
+CUSTOM_ICON = "https://styles.redditmedia.com/t5_{:x}/styles/profileIcon_{:x}.png"
+TROPHIES = ["Verified Email", "One-Year Club", "Two-Year Club", "Three-Year Club", "Five-Year Club", "Place '22",
+            "Well-rounded", "Gilding I", "Inciteful Comment", "Best Comment"]
+
+WORDS = (
+    "the a to and of it is that in i you for was this but on my with not have be just they so are like what if at "
+    "about as all think one would people can more when get there out do or me really time how good know because "
+    "your some only he them been then no than she even much also actually pretty make game thing way well first "
+    "still new after back most work year use never want their other any could same those day going right see "
+    "over source article code bug version release driver battery engine recipe garden season episode character "
+    "plot league match player coach trade budget rent landlord commute train bike route weather winter summer "
+    "camera lens photo paint guitar song album tour ticket museum history language grammar teacher student exam"
+).split()
+SUBREDDITS = ["python", "learnprogramming", "linux", "homelab", "cooking", "gardening", "bicycling", "photography",
+              "guitar", "books", "history", "askhistorians", "personalfinance", "cars", "mechanicadvice", "diy",
+              "woodworking", "boardgames", "running", "fitness", "nba", "soccer", "formula1", "movies", "television",
+              "music", "science", "space", "dataisbeautiful", "worldnews", "news", "gaming", "pcgaming", "buildapc",
+              "languagelearning", "travel", "solotravel", "baking", "coffee", "aquariums", "houseplants", "cats",
+              "dogs", "3dprinting", "electronics", "askscience", "explainlikeimfive", "writingprompts", "chess"]
+SUBREDDITS += [f"{subreddit}{suffix}" for subreddit in SUBREDDITS[:30] for suffix in ("help", "circlejerk", "2")] #the long tail
+FARMING_SUBREDDITS = sorted(BOT_FREQUENTED_SUBREDDITS)
+SCAM_SUBREDDITS = [f"{topic}{suffix}" for topic in sorted(BOT_TYPICAL_TOPICS) for suffix in ("", "deals", "signals")]
+TEMPLATE_COMMENTS = ["So cute!", "This is amazing", "Great post!", "Wow", "Love this", "Totally agree", "So true",
+                     "Beautiful", "Made my day", "This is the way", "Nice one", "Underrated post", "Who else?",
+                     "lol same", "Thanks for sharing"]
+NAME_WORDS = ["Angry", "Dog", "Happy", "Cat", "Silver", "Fox", "Quiet", "River", "Brave", "Moon", "Lucky", "Bear",
+              "Sweet", "Pepper", "Clever", "Owl", "Wild", "Storm", "Gentle", "Tiger", "Pale", "Sun"]
+
+
+class SyntheticAccount:
+    """This class holds everything the fake backends serve for one generated account
+
+    Attributes:
+        name (str): The user name of the account
+        is_bot (bool): The label, if the account was generated as a bot
+        created_utc (float): Unix timestamp the account was created at
+        comment_karma (int): Karma from comments, the sum of the comment scores
+        link_karma (int): Karma from posts, the sum of the submission scores
+        has_verified_email (bool): If the email is verified
+        icon_img (str): The link of the profile picture, a default avatar or a custom one
+        trophies (list[str]): The names of the trophies the account has earned
+        items (list[(str,float,int,str,str)]): (kind, created_utc, score, subreddit, body) of every comment (kind t1)
+                                               and submission (kind t3, body None), newest first
+    """
+    def __init__(self, name: str, is_bot: bool, created_utc: float, comment_karma: int, link_karma: int, has_verified_email: bool,
+                 icon_img: str, trophies: list[str], items: list):
+        self.name = name
+        self.is_bot = is_bot
+        self.created_utc = created_utc
+        self.comment_karma = comment_karma
+        self.link_karma = link_karma
+        self.has_verified_email = has_verified_email
+        self.icon_img = icon_img
+        self.trophies = trophies
+        self.items = items
+
+    def oldest_utc(self, kind: str = None) -> float:
+        """The timestamp of the first comment (kind t1), submission (kind t3) or either, None if there is none"""
+        timestamps = [item[1] for item in self.items if kind is None or item[0] == kind]
+        return min(timestamps) if timestamps else None
+
+    def to_profile(self) -> UserProfile:
+        """The UserProfile a full fetch of the account returns, without going through any fetcher"""
+        activity = [(created_utc, float(score)) for _, created_utc, score, _, _ in self.items[:ACTIVITY_LIMIT]]
+        comments = [item for item in self.items if item[0] == "t1"]
+        submissions = [item for item in self.items if item[0] == "t3"]
+        subreddits = {item[3] for item in comments[:SUBREDDIT_LIMIT] + submissions[:SUBREDDIT_LIMIT]}
+        oldest = self.oldest_utc()
+        return UserProfile(self.name, self.created_utc, activity, -1 if oldest is None else int(oldest),
+                           [item[4] for item in comments[:COMMENT_LIMIT]], sorted(subreddits), self.comment_karma,
+                           self.link_karma, self.has_verified_email, len(self.trophies), self.icon_img)
+
+
+def pattern_name(rng: random.Random) -> str:
+    """A name like the ones Reddit suggests at sign up, Angry_Dog1495 or HappyCat22"""
+    first, second = rng.sample(NAME_WORDS, 2)
+    separator = rng.choice(["_", "-", ""])
+    return f"{first}{separator}{second}{rng.randint(10, 9999)}"
+
+
+def chosen_name(rng: random.Random) -> str:
+    words = rng.sample(WORDS, 2)
+    return rng.choice([f"{words[0]}_{words[1]}", f"the{words[0]}{words[1]}", f"{words[0]}{rng.randint(1, 99)}", words[0] + words[1]])
+
+
+def human_comment(rng: random.Random) -> str:
+    length = max(1, int(rng.lognormvariate(2.4, 0.9)))
+    return " ".join(rng.choices(WORDS, k=length)).capitalize() + rng.choice([".", "", "?", "!"])
+
+
+def human_timestamps(rng: random.Random, start: float, now: float, count: int) -> list[float]:
+    """Sessions of a few items each, at the hours the user is awake, with gaps of hours to weeks between them"""
+    timestamps = []
+    awake_from = rng.randint(6, 12) #hour of the day, UTC, the user's day starts at
+    session_start = now
+    while len(timestamps) < count and session_start > start:
+        day = session_start - session_start % SECONDS_PER_DAY
+        hour = (awake_from + rng.triangular(0, 16, 12)) % 24
+        timestamp = min(day + hour * 3600, session_start)
+        for _ in range(rng.randint(1, 6)):
+            if len(timestamps) == count:
+                break
+            timestamps.append(timestamp)
+            timestamp -= rng.expovariate(1 / 600) + 20 #minutes apart, the time it takes to read and write
+        session_start = timestamp - rng.paretovariate(1.2) * 6 * 3600
+    return timestamps
+
+
+def bot_timestamps(rng: random.Random, start: float, now: float, count: int) -> list[float]:
+    """Bursts of items seconds apart, on a schedule of one burst every few hours with little jitter"""
+    timestamps = []
+    interval = rng.choice([1, 2, 3, 4, 6]) * 3600
+    burst_start = now - rng.uniform(0, interval)
+    while len(timestamps) < count and burst_start > start:
+        timestamp = burst_start
+        for _ in range(rng.randint(3, 12)):
+            if len(timestamps) == count:
+                break
+            timestamps.append(timestamp)
+            timestamp -= rng.uniform(4, 60)
+        burst_start -= interval + rng.gauss(0, 120)
+    return timestamps
+
+
+def generate_human(rng: random.Random, now: float) -> SyntheticAccount:
+    created_utc = now - rng.uniform(180, 12 * 365) * SECONDS_PER_DAY
+    first_activity = created_utc + rng.expovariate(1 / 5) * SECONDS_PER_DAY
+    count = min(int(rng.lognormvariate(5.5, 1.0)) + 5, ACTIVITY_LIMIT + 300)
+    home = rng.sample(SUBREDDITS, rng.randint(3, 25))
+    weights = [1 / (rank + 1) for rank in range(len(home))] #a few subreddits get most of the activity
+    items = []
+    for created in human_timestamps(rng, first_activity, now, count):
+        subreddit = rng.choice(FARMING_SUBREDDITS) if rng.random() < 0.1 else rng.choices(home, weights)[0]
+        if rng.random() < 0.85:
+            items.append(("t1", created, int(rng.paretovariate(1.5)) - rng.randint(0, 2), subreddit, human_comment(rng)))
+        else:
+            items.append(("t3", created, int(rng.paretovariate(1.1) * 3), subreddit, None))
+    comment_karma = sum(item[2] for item in items if item[0] == "t1")
+    link_karma = sum(item[2] for item in items if item[0] == "t3")
+    return SyntheticAccount(
+        name=pattern_name(rng) if rng.random() < 0.4 else chosen_name(rng), #many keep the name Reddit suggested
+        is_bot=False,
+        created_utc=created_utc,
+        comment_karma=max(comment_karma, 0),
+        link_karma=max(link_karma, 1),
+        has_verified_email=rng.random() < 0.75,
+        icon_img=DEFAULT_ICON.format(rng.randint(0, 7)) if rng.random() < 0.5 else CUSTOM_ICON.format(rng.getrandbits(24), rng.getrandbits(32)),
+        trophies=rng.sample(TROPHIES, rng.randint(1, 6)),
+        items=items
+    )
+
+
+def generate_bot(rng: random.Random, now: float, copy_pool: list[str]) -> SyntheticAccount:
+    created_utc = now - rng.uniform(20, 8 * 365) * SECONDS_PER_DAY
+    #aged accounts are bought or farmed, and only start posting weeks before they are caught
+    first_activity = max(created_utc, now - rng.uniform(7, 120) * SECONDS_PER_DAY)
+    count = rng.randint(20, 600)
+    copy_share = rng.choice([0.0, 0.5, 0.9]) if copy_pool else 0.0
+    #some bots are run by a person or a scheduler that mimics one, with human timing
+    timestamps = human_timestamps if rng.random() < 0.25 else bot_timestamps
+    items = []
+    for created in timestamps(rng, first_activity, now, count):
+        roll = rng.random()
+        subreddit = rng.choice(FARMING_SUBREDDITS) if roll < 0.7 else rng.choice(SCAM_SUBREDDITS) if roll < 0.85 else rng.choice(SUBREDDITS)
+        if rng.random() < 0.7:
+            body = rng.choice(copy_pool) if rng.random() < copy_share else rng.choice(TEMPLATE_COMMENTS)
+            items.append(("t1", created, rng.randint(-2, 8), subreddit, body))
+        else:
+            items.append(("t3", created, int(rng.paretovariate(0.9) * 20), subreddit, None)) #reposts of popular posts
+    return SyntheticAccount(
+        name=pattern_name(rng) if rng.random() < 0.8 else chosen_name(rng),
+        is_bot=True,
+        created_utc=created_utc,
+        comment_karma=max(sum(item[2] for item in items if item[0] == "t1"), 0),
+        link_karma=max(sum(item[2] for item in items if item[0] == "t3"), 1),
+        has_verified_email=rng.random() < 0.2,
+        icon_img=DEFAULT_ICON.format(rng.randint(0, 7)) if rng.random() < 0.85 else CUSTOM_ICON.format(rng.getrandbits(24), rng.getrandbits(32)),
+        trophies=rng.sample(TROPHIES[:2], rng.randint(0, 1)),
+        items=items
+    )
+
+
+def generate_accounts(count: int, bot_share: float = 0.5, seed: int = 0, now: float = None) -> list[SyntheticAccount]:
+    """Returns count accounts, bot_share of them bots, in a shuffled order
+
+    The humans are generated first, and the bots copy their comments from them, so a copy index filled with every
+    account's comments finds the bots' copies like it would on Reddit.
+    """
+    rng = random.Random(seed)
+    now = time.time() if now is None else now
+    bots = round(count * bot_share)
+    accounts = [generate_human(rng, now) for _ in range(count - bots)]
+    copy_pool = [item[4] for account in accounts for item in account.items[:50] if item[0] == "t1" and len(item[4]) > 40]
+    accounts += [generate_bot(rng, now, copy_pool) for _ in range(bots)]
+
+    names = set()
+    for index, account in enumerate(accounts):
+        if account.name.lower() in names: #names are unique on Reddit, case insensitively
+            account.name = f"{account.name}_{index}"
+        names.add(account.name.lower())
+    rng.shuffle(accounts)
+    return accounts
@@ -1,16 +1,22 @@
 import praw
 from dotenv import load_dotenv
 import os
-import csv
+import argparse
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from praw.exceptions import PRAWException
 from prawcore.exceptions import NotFound, Forbidden
 
-from src.user_data_fetcher import UserDataFetcher
-from src.account_activity_check import AccountActivityCheck
-from src.account_content_check import AccountContentCheck
-from src.account_subbreddit_content_check import AccountSubbredditContentCheck
-from src.account_general_search import AccountGeneralSearch
+from src.profile_cache import ProfileCache, CachedUserDataFetcher
+from src.account_headers import AccountHeaderFetcher, AccountHeader, ABOUT_FIELDS
+from src.copy_index import CopyIndex
+from src.rate_limiter import get_default_limiter
+from src.reddit_requestor import RateLimitedRequestor
+from src.dataset_journal import DatasetJournal, DONE, FAILED, NOT_FOUND, STATUSES
+from src.dataset_store import DatasetStore
+from src.feature_schema import FEATURE_COLUMNS, CSV_HEADER
+from src.snapshot_store import SnapshotStore
+from src.profile_features import get_profile_features
 from data.known_bots import KNOWN_BOTS
 from data.known_humans import KNOWN_HUMANS
 
@@ -22,133 +28,141 @@ username = os.getenv("REDDIT_USERNAME")
 password = os.getenv("REDDIT_PASSWORD")
 
 
+#every request waits its turn in the shared rate limiter, set RATE_LIMIT_FILE to share it with other processes
+rate_limiter = get_default_limiter()
 reddit = praw.Reddit(client_id=client_id,
                      client_secret=client_secret,
                      username=username,
                      password=password,
-                     user_agent=user_agent)
-
-OUTPUT_FILE = "training_data.csv"
-
-
-FEATURE_COLUMNS = [
-    "karma_ratio", #returns float of the ratio of post karma to comment karma
-    "active_karma_rate", #returns float of the avg karma per day in the last 30 days or less of activity
-    "age_days", #returns int of the age of the account in days
-    "biggest_timestamp", #returns float the largest time between activity in Unix
-    "burst_activity_ratio", #returns float of the ratio of activity that takes place within 65 seconds
-    "first_activity_delay", #returns int of the days of how long it took from account creation to first activity
-    "short_comment_ratio", #returns float of the ratio of comments under 20 characters
-    "avg_comment_similarity", #returns float in the pairwise similarity score of the last 10 comments
-    "verified_email", #returns a boolean of if the account has a verified email
-    "trophy_count", #returns int of how many trophies an account has
-    "name_pattern", #returns boolean if an account has a Word-Word-Num regex name pattern
-    "icon_default", #returns boolean of if the account has the default icon
-    "popular_subreddits_ratio", #returns the ratio of activity of common karma farming subreddits given a list of subs
-    "scammy_subreddits_ratio" #returns the ratio of activity of scam/spam/selling subs given a list of keywords
-]
-# The full CSV header
-CSV_HEADER = ["username", "is_bot"] + FEATURE_COLUMNS
-
-
-def get_processed_users(filename: str) -> set:
-    """Reads the CSV file to see which users we've already processed."""
-    processed = set()
-    try:
-        with open(filename, 'r', newline='', encoding='utf-8') as f:
-            reader = csv.reader(f)
-            next(reader) # Skip header
-            for row in reader:
-                processed.add(row[0]) # Add username
-    except FileNotFoundError:
-        pass # File doesn't exist yet, that's fine
-    return processed
-
-def initialize_csv(filename: str):
-    """Creates the CSV file with the header if it doesn't exist."""
-    if not os.path.exists(filename):
-        with open(filename, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=CSV_HEADER)
-            writer.writeheader()
-
-def process_user(username: str, is_bot_label: int, writer: csv.DictWriter):
-    """Fetches all data for a single user and writes it to the CSV."""
-    print(f"Processing user: {username} (Label: {is_bot_label})")
+                     user_agent=user_agent,
+                     requestor_class=RateLimitedRequestor,
+                     requestor_kwargs={"rate_limiter": rate_limiter})
+
+OUTPUT_FILE = "training_data.csv" #exported from the journal at the end of every run
+DATASET_DIR = "training_data" #the binary DatasetStore train_model.py maps, appended to as users finish
+JOURNAL_FILE = "build_journal.sqlite" #every processed user with their status, failure reason and features
+BUILD_WORKERS = 8
+PROFILE_CACHE_FILE = "profile_cache.sqlite"
+profile_cache = ProfileCache(PROFILE_CACHE_FILE)
+COPY_INDEX_FILE = "copy_index.sqlite" #every fetched comment goes in, so the detector can find copies of it later
+copy_index = CopyIndex(COPY_INDEX_FILE)
+SNAPSHOT_DIR = "snapshots" #every fetched profile, replayed by scripts/recompute_features.py
+snapshots = SnapshotStore(SNAPSHOT_DIR)
+header_fetcher = AccountHeaderFetcher(reddit, max_workers=1) #the workers already look users up concurrently
+
+
+def build_user_features(username: str, label: int, header: AccountHeader = None) -> dict:
+    """Fetches all data for a single user, keeps a snapshot of it and returns their features, raises if the user could not be fetched"""
     all_features = {key: None for key in FEATURE_COLUMNS}
-    
+
+    # 1. Get PRAW user object, the one the header's about page was read from if there is one
+    reddit_user = header.redditor if header is not None and header.redditor is not None else reddit.redditor(username)
+
+    # 2. Fetch basic data, and keep it so features can be recomputed later without fetching again
+    fetcher = CachedUserDataFetcher(reddit_user, profile_cache, about=header.values if header is not None else None)
+    user_info = fetcher.get_data()
+    fetched_at = time.time()
+    snapshots.append(username, user_info, label, fetched_at)
+    copy_index.add_comments(user_info.account_name, user_info.comments)
+
+    # 3. Run all checks and get features
+    all_features.update(get_profile_features(user_info, reddit, now=fetched_at))
+    return all_features
+
+
+def process_user(username: str, label: int) -> (str, dict, str):
+    """Runs in a worker, returns (status, features, reason) for the single writer to record"""
     try:
-        # 1. Get PRAW user object
-        reddit_user = reddit.redditor(username)
-        
-        # 2. Fetch basic data
-        fetcher = UserDataFetcher(reddit_user)
-        user_info = fetcher.get_data()
-        
-        # 3. Run all checks and get features
-        activity_check = AccountActivityCheck(user_info.comment_karma, user_info.link_karma, user_info.timestamps_and_karma, user_info.oldest_timestamp, user_info.account_timestamp)
-        all_features.update(activity_check.get_features())
-        
-        subreddit_check = AccountSubbredditContentCheck(user_info.subreddits)
-        all_features.update(subreddit_check.get_features())
-        
-        general_check = AccountGeneralSearch(user_info.verified_email, user_info.trophy_count, user_info.account_name, user_info.profile_picture)
-        all_features.update(general_check.get_features())
-
-        content_check = AccountContentCheck(user_info.account_name, user_info.comments, user_info.comments, reddit)
-        all_features.update(content_check.get_features())
-
-        # 5. Add username and label
-        all_features["username"] = username
-        all_features["is_bot"] = is_bot_label
-        
-        # 6. Write to CSV
-        writer.writerow(all_features)
-        print(f"  ... Successfully processed and saved {username}.")
-
-    except (NotFound, Forbidden):
-        print(f"  ... FAILED: User {username} not found or is suspended. Skipping.")
+        #the about page comes first, so suspended and deleted accounts are recorded before any listing is paged
+        header = None if profile_cache.is_fresh(username, ABOUT_FIELDS) else header_fetcher.get_header(username)
+        if header is not None and not header.exists:
+            return NOT_FOUND, None, header.status
+        return DONE, build_user_features(username, label, header), None
+    except (NotFound, Forbidden) as e:
+        return NOT_FOUND, None, f"{type(e).__name__}: {e}"
+    except AttributeError as e:
+        #suspended accounts only have a name and is_suspended, reading any other about field fails
+        if getattr(reddit.redditor(username), "is_suspended", False):
+            return NOT_FOUND, None, "suspended"
+        return FAILED, None, f"{type(e).__name__}: {e}"
     except PRAWException as e:
-        print(f"  ... FAILED: A PRAW error occurred for {username}: {e}. Skipping.")
+        return FAILED, None, f"A PRAW error occurred: {type(e).__name__}: {e}"
     except Exception as e:
         # This catches Google API errors, rate limits, etc.
-        print(f"  ... FAILED: An unexpected error occurred for {username}: {e}. Skipping.")
+        return FAILED, None, f"{type(e).__name__}: {e}"
+
+
+def print_progress(counts: dict, finished: int, total: int, started: float):
+    elapsed = time.perf_counter() - started
+    rate = finished / elapsed if elapsed > 0 else 0.0
+    eta = (total - finished) / rate if rate > 0 else float("inf")
+    print(f"  [{finished}/{total}] done {counts[DONE]}, failed {counts[FAILED]}, not found {counts[NOT_FOUND]} | "
+          f"{rate * 60:.1f} users/min, ETA {eta / 60:.1f} min")
 
 
 # --- Main Script ---
 
 def main():
-    initialize_csv(OUTPUT_FILE)
-    processed_users = get_processed_users(OUTPUT_FILE)
-    print(f"Found {len(processed_users)} users already in CSV.")
+    parser = argparse.ArgumentParser(description="Fetch the labeled users and build the training dataset")
+    parser.add_argument("--workers", type=int, default=BUILD_WORKERS, help="users fetched at the same time")
+    parser.add_argument("--skip-failed", action="store_true", help="do not retry users that failed on an earlier run")
+    parser.add_argument("--progress-every", type=int, default=25, help="users between progress reports")
+    args = parser.parse_args()
+
+    journal = DatasetJournal(JOURNAL_FILE)
+    imported = journal.import_csv(OUTPUT_FILE)
+    if imported:
+        print(f"Imported {imported} users from an earlier {OUTPUT_FILE}.")
+    # Rows a crash recorded in the journal but not in the store yet are appended first
+    store = DatasetStore(DATASET_DIR, FEATURE_COLUMNS)
+    stored = set(store.usernames())
+    store.append([row for row in journal.rows() if row[0] not in stored])
 
     # Combine all users into a list of (username, label) tuples
     users_to_process = []
     users_to_process.extend([(user, 1) for user in KNOWN_BOTS])   # Label 1 for bots
     users_to_process.extend([(user, 0) for user in KNOWN_HUMANS]) # Label 0 for humans
 
-    # Open the file in append mode to add new users
-    with open(OUTPUT_FILE, 'a', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=CSV_HEADER)
-        
-        total_new = 0
-        for username, label in users_to_process:
-            if username in processed_users:
-                continue # Skip users we already have
-            
-            # Process the new user
-            process_user(username, label, writer)
-            total_new += 1
-            
-            # IMPORTANT: Polite sleep to not hammer Reddit's API
-            time.sleep(2) 
-            
-            # You might still hit your Google API limit here and see an error.
-            # If that happens, just re-run this script tomorrow.
-            # It will skip all the users you've already done.
+    # Done and not found users are final, failed ones are retried unless --skip-failed
+    final_statuses = {DONE, NOT_FOUND, FAILED} if args.skip_failed else {DONE, NOT_FOUND}
+    statuses = journal.statuses()
+    pending = [(user, label) for user, label in users_to_process if statuses.get(user) not in final_statuses]
+    print(f"Found {len(users_to_process) - len(pending)} users already in the journal, {len(pending)} to process with {args.workers} workers.")
+
+    # Workers only fetch, this thread is the single writer recording each user as it finishes
+    counts = {status: 0 for status in STATUSES}
+    started = time.perf_counter()
+    executor = ThreadPoolExecutor(max_workers=args.workers)
+    try:
+        futures = {executor.submit(process_user, user, label): (user, label) for user, label in pending}
+        for finished, future in enumerate(as_completed(futures), start=1):
+            user, label = futures[future]
+            status, features, reason = future.result()
+            if status == DONE:
+                journal.record_done(user, label, features)
+                store.append([(user, label, features)])
+            elif status == NOT_FOUND:
+                journal.record_not_found(user, label, reason)
+                print(f"  ... {user} not found or is suspended: {reason}")
+            else:
+                journal.record_failed(user, label, reason)
+                print(f"  ... FAILED {user}: {reason}")
+            counts[status] += 1
+            if finished % args.progress_every == 0 or finished == len(pending):
+                print_progress(counts, finished, len(pending), started)
+    except KeyboardInterrupt:
+        print("Interrupted, every user recorded so far is kept. Rerun to continue.")
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        journal.export_csv(OUTPUT_FILE, CSV_HEADER)
 
     print(f"\n--- Data Collection Complete ---")
-    print(f"Processed {total_new} new users.")
-    print(f"Total users in {OUTPUT_FILE}: {len(get_processed_users(OUTPUT_FILE))}")
+    print(f"Processed {sum(counts.values())} users this run: {counts}")
+    print(f"Journal: {journal.counts()}")
+    print(f"Profile cache: {profile_cache.stats}")
+    print(f"Copy index: {len(copy_index)} comments")
+    print(f"Rate limiter: {rate_limiter.stats}")
+    print(f"Total users in {OUTPUT_FILE} and {DATASET_DIR}/: {len(store)}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,105 @@
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import time
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics.pairwise import cosine_similarity
+
+from src.account_content_check import SIMILARITY_COMMENT_LIMIT
+from src.comment_similarity import get_mean_pairwise_similarity, get_mean_pairwise_similarity_batch
+
+
+"""Checks that avg_comment_similarity from src/comment_similarity.py still equals the per user TfidfVectorizer values
+the model was trained on
+
+Reads the comments of every user in the profile cache (profile_cache.sqlite) when it exists, otherwise of generated
+users. Exits with status 1 if any value is off by more than --tolerance.
+
+Run from the repository root:
+    python -m scripts.check_similarity_fidelity
+"""
+
+PROFILE_CACHE_FILE = "profile_cache.sqlite"
+WORDS = ["crypto", "moon", "great", "post", "agree", "thanks", "bitcoin", "free", "money", "reddit", "cat", "dog", "game",
+         "the", "is", "this", "a", "lol", "love", "hate", "check", "link", "profile", "nice", "wow", "amazing"]
+
+
+def sklearn_similarity(comments: list[str]) -> float:
+    """The original per user computation"""
+    if len(comments) < 2:
+        return 0.0
+    vectorizer = TfidfVectorizer(stop_words='english')
+    tfidf_matrix = vectorizer.fit_transform(comments)
+    cosine_sim_matrix = cosine_similarity(tfidf_matrix)
+    pairwise_similarity_scores = cosine_sim_matrix[np.triu_indices(len(comments), k=1)]
+    if pairwise_similarity_scores.size == 0:
+        return 0.0
+    return pairwise_similarity_scores.mean()
+
+
+def cached_comment_lists(path: str) -> list:
+    connection = sqlite3.connect(path)
+    rows = connection.execute("SELECT fields FROM profiles").fetchall()
+    connection.close()
+    return [json.loads(row[0]).get("comments", [])[:SIMILARITY_COMMENT_LIMIT] for row in rows]
+
+
+def generated_comment_lists(user_count: int) -> list:
+    rng = random.Random(0)
+    comment_lists = []
+    for _ in range(user_count):
+        repeated = " ".join(rng.choices(WORDS, k=rng.randint(3, 15)))
+        comment_lists.append([repeated if rng.random() < 0.3 else " ".join(rng.choices(WORDS, k=rng.randint(1, 30)))
+                              for _ in range(rng.randint(0, SIMILARITY_COMMENT_LIMIT))])
+    return comment_lists
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare avg_comment_similarity against the per user TfidfVectorizer")
+    parser.add_argument("--users", type=int, default=2000, help="generated users when there is no profile cache")
+    parser.add_argument("--tolerance", type=float, default=1e-9)
+    args = parser.parse_args()
+
+    if os.path.exists(PROFILE_CACHE_FILE):
+        comment_lists = cached_comment_lists(PROFILE_CACHE_FILE)
+        print(f"Comparing {len(comment_lists)} users from {PROFILE_CACHE_FILE}")
+    else:
+        comment_lists = generated_comment_lists(args.users)
+        print(f"Comparing {len(comment_lists)} generated users")
+
+    expected, skipped = [], 0
+    started = time.perf_counter()
+    for comments in comment_lists:
+        try:
+            expected.append(sklearn_similarity(comments))
+        except ValueError: #empty vocabulary, these users never got features before
+            expected.append(None)
+            skipped += 1
+    sklearn_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    per_user = [get_mean_pairwise_similarity(comments) for comments in comment_lists]
+    per_user_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    batch = get_mean_pairwise_similarity_batch(comment_lists)
+    batch_seconds = time.perf_counter() - started
+
+    differences = [max(abs(value - per_user[user]), abs(value - batch[user])) for user, value in enumerate(expected) if value is not None]
+    worst = max(differences, default=0.0)
+    users = max(len(comment_lists), 1)
+    print(f"Largest difference: {worst:.3g} (tolerance {args.tolerance:g}), {skipped} users had an empty vocabulary")
+    print(f"Per user TfidfVectorizer: {sklearn_seconds / users * 1e6:.0f} us per user")
+    print(f"get_mean_pairwise_similarity: {per_user_seconds / users * 1e6:.0f} us per user")
+    print(f"get_mean_pairwise_similarity_batch: {batch_seconds / users * 1e6:.0f} us per user")
+    if worst > args.tolerance:
+        print("FAILED: avg_comment_similarity no longer matches the values the model was trained on")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import argparse
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from src.snapshot_store import SnapshotStore
+from src.dataset_store import DatasetStore
+from src.feature_schema import FEATURE_COLUMNS
+from src.profile_features import get_profile_features
+
+
+"""Recomputes the features of every stored profile snapshot, without fetching anything from Reddit
+
+Every IDecetionRule check is replayed on the snapshots that scripts/build_dataset.py kept, spread over all CPU cores,
+and the rows go into a new DatasetStore. Time based features are computed at each snapshot's fetch time, so unchanged
+features come out as they were built. When a user was fetched more than once, their newest snapshot is used.
+
+Run from the repository root after adding or changing a feature:
+    python -m scripts.recompute_features --output training_data_v2
+"""
+
+SNAPSHOT_DIR = "snapshots"
+
+
+def recompute_part(snapshot_dir: str, segment: str, part: int, parts: int) -> (list, int):
+    """Runs in a worker process, returns ((username, label, fetched_at, features) rows, failed snapshots) of one part of a segment"""
+    rows, failed = [], 0
+    for snapshot in SnapshotStore(snapshot_dir).read_segment(segment, part, parts):
+        try:
+            features = {key: None for key in FEATURE_COLUMNS}
+            features.update(get_profile_features(snapshot.profile, now=snapshot.fetched_at))
+            rows.append((snapshot.username, snapshot.label, snapshot.fetched_at, features))
+        except Exception as e:
+            print(f"  ... FAILED: could not recompute {snapshot.username}: {type(e).__name__}: {e}")
+            failed += 1
+    return rows, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute the features of every stored profile snapshot")
+    parser.add_argument("--snapshots", default=SNAPSHOT_DIR, help="directory of the SnapshotStore")
+    parser.add_argument("--output", required=True, help="directory of the new DatasetStore, must not hold rows yet")
+    parser.add_argument("--csv", default=None, help="also export the rows to this CSV")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="processes the snapshots are spread over")
+    args = parser.parse_args()
+
+    store = DatasetStore(args.output, FEATURE_COLUMNS)
+    if len(store) > 0:
+        parser.error(f"{args.output} already holds {len(store)} rows, pick a new directory")
+
+    segments = SnapshotStore(args.snapshots).segments()
+    parts = max(1, math.ceil(args.workers / max(len(segments), 1))) #split segments so every worker gets work
+    tasks = [(segment, part) for segment in segments for part in range(parts)]
+    print(f"Recomputing {len(segments)} segments as {len(tasks)} tasks over {args.workers} processes")
+
+    started = time.perf_counter()
+    newest, computed, failed = {}, 0, 0
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = [executor.submit(recompute_part, args.snapshots, segment, part, parts) for segment, part in tasks]
+        for future in futures:
+            rows, part_failed = future.result()
+            failed += part_failed
+            computed += len(rows)
+            for username, label, fetched_at, features in rows:
+                if username not in newest or fetched_at >= newest[username][1]:
+                    newest[username] = (label, fetched_at, features)
+
+    labeled = [(username, label, features) for username, (label, _, features) in newest.items() if label is not None]
+    store.append(labeled)
+    if args.csv:
+        store.export_csv(args.csv)
+    elapsed = time.perf_counter() - started
+    print(f"Recomputed {computed} snapshots ({failed} failed) in {elapsed:.1f} s, {computed / max(elapsed, 1e-9):.0f} per second")
+    print(f"Wrote {len(labeled)} labeled users to {args.output}/" + (f" and {args.csv}" if args.csv else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,70 @@
-import pandas as pd
-from sklearn.model_selection import KFold, GridSearchCV
+import argparse
+import os
+import shutil
+import time
+from sklearn.model_selection import GridSearchCV, cross_val_predict
 from sklearn.ensemble import RandomForestClassifier
 import joblib # For saving the model
 import numpy as np
 
-# 1. Load and prepare data
-data = pd.read_csv("training_data.csv")
+from src.dataset_store import DatasetStore
+from src.feature_schema import FEATURE_COLUMNS
+from src.forest_engine import compile_forest
+from src.model_search import HalvingForestSearch, cross_validation_splits, FACTOR
+from src.cascade_detector import STAGE_ONE_FEATURES, UNCERTAINTY_BAND, evaluate_cascade
+
+DATASET_DIR = "training_data"
+CSV_FILE = "training_data.csv"
+MODEL_FILE = "bot_detector_model.pkl"
+COMPILED_MODEL_FILE = "bot_detector_forest.pkl"
+STAGE_ONE_MODEL_FILE = "bot_detector_stage_one.pkl"
+CASCADE_BANDS = [(0.05, 0.95), UNCERTAINTY_BAND, (0.2, 0.8), (0.3, 0.7)]
+
+parser = argparse.ArgumentParser(description="Tune and train the bot detector's RandomForest")
+parser.add_argument("--search", choices=["halving", "grid"], default="halving",
+                    help="halving grows warm started forests and drops the worst configurations each round, grid fits every combination")
+parser.add_argument("--factor", type=int, default=FACTOR, help="halving keeps the best 1/factor of the configurations each round")
+parser.add_argument("--screening-trees", type=int, default=None, help="trees of the first halving round, which only screens configurations, 0 skips it")
+parser.add_argument("--features", nargs="+", choices=FEATURE_COLUMNS, default=FEATURE_COLUMNS,
+                    help="train on these columns only, score with BOT_DETECTOR_FEATURES set to the same list")
+parser.add_argument("--cascade", action="store_true",
+                    help="also train the about only stage one model of CascadeDetector and report the exit rate and accuracy of several bands")
+parser.add_argument("--import-csv", action="store_true",
+                    help=f"rebuild {DATASET_DIR}/ from {CSV_FILE}, after editing the CSV (it is only imported on its own into an empty store)")
+args = parser.parse_args()
 
-# Define your feature columns
-feature_cols = [
-    "karma_ratio", #returns float of the ratio of post karma to comment karma
-    "active_karma_rate", #returns float of the avg karma per day in the last 30 days or less of activity
-    "age_days", #returns int of the age of the account in days
-    "biggest_timestamp", #returns float the largest time between activity in Unix
-    "burst_activity_ratio", #returns float of the ratio of activity that takes place within 65 seconds
-    "first_activity_delay", #returns int of the days of how long it took from account creation to first activity
-    "short_comment_ratio", #returns float of the ratio of comments under 20 characters
-    "avg_comment_similarity", #returns float in the pairwise similarity score of the last 10 comments
-    "verified_email", #returns a boolean of if the account has a verified email
-    "trophy_count", #returns int of how many trophies an account has
-    "name_pattern", #returns boolean if an account has a Word-Word-Num regex name pattern
-    "icon_default", #returns boolean of if the account has the default icon
-    "popular_subreddits_ratio", #returns the ratio of activity of common karma farming subreddits given a list of subs
-    "scammy_subreddits_ratio" #returns the ratio of activity of scam/spam/selling subs given a list of keywords
-]
+# 1. Load and prepare data
+# The store is memory mapped, so X is used in place instead of being parsed and converted
+# With --import-csv the CSV is imported into a new store that then replaces the old one, so a failed import leaves it as it was
+if args.import_csv:
+    if not os.path.exists(CSV_FILE):
+        raise SystemExit(f"--import-csv: {CSV_FILE} does not exist")
+    importing_dir = f"{DATASET_DIR}.importing"
+    shutil.rmtree(importing_dir, ignore_errors=True)
+    print(f"Rebuilding {DATASET_DIR}/ from {CSV_FILE} ...")
+    DatasetStore(importing_dir, FEATURE_COLUMNS).import_csv(CSV_FILE)
+    shutil.rmtree(DATASET_DIR, ignore_errors=True)
+    os.replace(importing_dir, DATASET_DIR)
+store = DatasetStore(DATASET_DIR, FEATURE_COLUMNS)
+if args.import_csv:
+    source = f"{CSV_FILE} (imported into {DATASET_DIR}/)"
+elif len(store) == 0 and os.path.exists(CSV_FILE):
+    print(f"Importing {CSV_FILE} into {DATASET_DIR}/ ...")
+    store.import_csv(CSV_FILE)
+    source = f"{CSV_FILE} (imported into the empty {DATASET_DIR}/)"
+else:
+    source = f"{DATASET_DIR}/"
+    #build_dataset.py appends to the store and exports the CSV from the same rows, so only a CSV edited by hand differs
+    if os.path.exists(CSV_FILE):
+        source += f" ({CSV_FILE} is not read, run with --import-csv to train on edits to it)"
 
-X = data[feature_cols].values
-y = data["is_bot"].values
+# A subset of the columns trains a model for a detector that only fetches what those features read
+feature_cols = args.features
+X = store.features(feature_cols)
+y = store.labels()
+print(f"Loaded {len(store)} users from {source}")
+if feature_cols != FEATURE_COLUMNS:
+    print(f"Training on {len(feature_cols)} of {len(FEATURE_COLUMNS)} features, score with BOT_DETECTOR_FEATURES={','.join(feature_cols)}")
 
 # 2. Define Model and Hyperparameter Grid
 # We're using RandomForest, which doesn't require feature scaling.
@@ -40,39 +78,58 @@ param_grid = {
     'min_samples_leaf': [1, 2, 4]
 }
 
-# 3. Set up Cross-Validation and Grid Search
+# 3. Set up Cross-Validation
 # Use K-Fold CV. With n_splits=10, we use 90 users for training
 # and 10 for testing, repeated 10 times.
-cv_strategy = KFold(n_splits=10, shuffle=True, random_state=42)
-
-# GridSearchCV will automatically test all parameter combinations
-# using our 10-fold cross-validation strategy.
-grid_search = GridSearchCV(
-    estimator=model,
-    param_grid=param_grid,
-    cv=cv_strategy,
-    scoring='accuracy',
-    n_jobs=-1 # Use all available CPU cores
-)
+# The folds are computed once and shared by every configuration.
+splits = cross_validation_splits(len(y), n_splits=10, random_state=42)
 
 # 4. Run the search
-# This fits the model, tunes parameters, and finds the best
-# cross-validated score all in one step.
-grid_search.fit(X, y)
+# Halving (the default) grows one warm started forest per configuration and fold through the
+# n_estimators values, and only keeps growing the best third of the configurations each round.
+# Every score it reports is one the grid search would have computed too, it just skips most of them.
+# GridSearchCV fits every combination from scratch, use --search grid to compare.
+started = time.perf_counter()
+if args.search == "halving":
+    print("Searching with successive halving over warm started forests:")
+    search = HalvingForestSearch(param_grid, splits, factor=args.factor, screening_trees=args.screening_trees, random_state=42)
+    search.fit(X, y)
+else:
+    search = GridSearchCV(
+        estimator=model,
+        param_grid=param_grid,
+        cv=splits,
+        scoring='accuracy',
+        n_jobs=-1 # Use all available CPU cores
+    )
+    search.fit(X, y)
+    for params, score, fit_time in zip(search.cv_results_["params"], search.cv_results_["mean_test_score"], search.cv_results_["mean_fit_time"]):
+        print(f"  {params} accuracy {score * 100:.2f}% ({fit_time * len(splits):.2f}s of fits)")
+print(f"Search took {time.perf_counter() - started:.1f}s")
 
 # 5. Check accuracy
 # This is now the *average* accuracy across all 10 folds,
 # which is much more reliable than your single-split score.
-print(f"Best Cross-Validated Accuracy: {grid_search.best_score_ * 100:.2f}%")
-print(f"Best Parameters Found: {grid_search.best_params_}")
+print(f"Best Cross-Validated Accuracy: {search.best_score_ * 100:.2f}%")
+print(f"Best Parameters Found: {search.best_params_}")
 
 # 6. Save your best trained model
-# GridSearchCV automatically retrains the best model on ALL data.
-final_model = grid_search.best_estimator_
-joblib.dump(final_model, "bot_detector_model.pkl")
+# Both searches retrain the best model on ALL data.
+final_model = search.best_estimator_
+joblib.dump(final_model, MODEL_FILE)
 # We no longer need to save the scaler.pkl
 
-# 7. Inspect feature importances
+# 7. Export the compiled forest
+# The same trees as flat arrays, scored with NumPy instead of sklearn (see src/forest_engine.py).
+# Saved uncompressed, so BotDetector can load it with mmap_mode="r".
+compiled_model = compile_forest(final_model)
+difference = np.abs(compiled_model.predict_proba(X) - final_model.predict_proba(X)).max()
+if difference > 1e-9:
+    raise RuntimeError(f"The compiled forest differs from the model by up to {difference}")
+joblib.dump(compiled_model, COMPILED_MODEL_FILE)
+print(f"Saved {MODEL_FILE} and {COMPILED_MODEL_FILE} (largest predict_proba difference: {difference:.2e})")
+
+# 8. Inspect feature importances
 # This replaces the "weights" from Logistic Regression.
 # It shows which features the model found most predictive.
 print("\nLearned Feature Importances:")
@@ -80,4 +137,20 @@ importances = final_model.feature_importances_
 sorted_indices = np.argsort(importances)[::-1]
 
 for i in sorted_indices:
-    print(f"  {feature_cols[i]}: {importances[i]:.4f}")
\ No newline at end of file
+    print(f"  {feature_cols[i]}: {importances[i]:.4f}")
+# 9. Train the cascade's stage one model
+# The same parameters on the about only columns, so CascadeDetector can score most users from one request.
+# Out of fold probabilities of both models show what each band would cost in accuracy and save in fetches.
+if args.cascade:
+    X_stage_one = store.features(STAGE_ONE_FEATURES)
+    stage_one_model = RandomForestClassifier(random_state=42, **search.best_params_)
+    stage_one_proba = cross_val_predict(stage_one_model, X_stage_one, y, cv=splits, method="predict_proba")[:, 1]
+    full_proba = cross_val_predict(RandomForestClassifier(random_state=42, **search.best_params_), X, y, cv=splits, method="predict_proba")[:, 1]
+    print(f"\nCascade on {len(STAGE_ONE_FEATURES)} about only features ({', '.join(STAGE_ONE_FEATURES)}):")
+    for band in CASCADE_BANDS:
+        report = evaluate_cascade(stage_one_proba, full_proba, y, band)
+        print(f"  band {band}: exits {report['exit_rate']:.1%} at stage one, accuracy {report['cascade_accuracy'] * 100:.2f}% "
+              f"(full model {report['full_accuracy'] * 100:.2f}%)")
+    stage_one_model.fit(X_stage_one, y)
+    joblib.dump(compile_forest(stage_one_model), STAGE_ONE_MODEL_FILE)
+    print(f"Saved {STAGE_ONE_MODEL_FILE}, score with CascadeDetector (stream_watcher.py --cascade)")
@@ -1,10 +1,26 @@
 from src.i_detection_rule import IDecetionRule
 import time
 import datetime
+import itertools
+import numpy as np
 #from detection_result import DetectionResults archived
 
 """Add entropy of timestamps"""
 
+SECONDS_PER_DAY = 24 * 60 * 60
+ONE_MONTH_IN_SECONDS = 30 * SECONDS_PER_DAY
+BURST_THRESHOLD_SECONDS = 65
+
+
+def activity_matrix(timestamp_posts_comments_karma) -> np.ndarray:
+    """Turns (timestamp, karma) pairs into an n x 2 float array, an array that already is one is returned as it is
+    """
+    if isinstance(timestamp_posts_comments_karma, np.ndarray):
+        return timestamp_posts_comments_karma.astype(np.float64, copy=False).reshape(-1, 2)
+    flat = itertools.chain.from_iterable(timestamp_posts_comments_karma)
+    return np.fromiter(flat, dtype=np.float64, count=2 * len(timestamp_posts_comments_karma)).reshape(-1, 2)
+
+
 class AccountActivityCheck(IDecetionRule):
     """This class gets related information of a user relating with 
     time of posts and the account, and also the features of the user's karma
@@ -16,6 +32,7 @@ class AccountActivityCheck(IDecetionRule):
                                                                 is one post/comment and the pair stores (timestamp of the post/comment, karma of the post/comment)
         oldest_timestamp (float): The timestamp of the first (not deleted) activity on a account
         account_timestamp (float): The timestamp of when the account was created
+        now (float): The Unix timestamp the features are computed at, the current time if not given
 
     Values the class finds:
         1. Post karma to total karma ratio
@@ -24,17 +41,33 @@ class AccountActivityCheck(IDecetionRule):
         4. The max gap in activity (spans only the most recent 900 posts/comments)
         5. The ratio of the amount of bursts of activity within 65 seconds (spans only the most recent 900 posts/comments)
         6. The time between the account was created, and the first activity on the account
+
+    The features are computed by get_activity_features_batch with the user as a batch of one, so both give the
+    same values. A list of pairs is converted to one n x 2 array first, an n x 2 array (like CompactUserProfile's)
+    is read without converting. Many stored profiles are much faster through get_activity_features_batch.
     """
-    def __init__(self, comment_karma: int, link_karma: int, timestamp_posts_comments_karma: list[(float,float)], oldest_timestamp: float, account_timestamp: float):
+    REQUIRED_FIELDS = {
+        "karma_ratio": ("comment_karma", "link_karma"),
+        "active_karma_rate": ("timestamps_and_karma",),
+        "age_days": ("account_timestamp",),
+        "biggest_timestamp": ("timestamps_and_karma",),
+        "burst_activity_ratio": ("timestamps_and_karma",),
+        "first_activity_delay": ("oldest_timestamp", "account_timestamp")
+    }
+
+    def __init__(self, comment_karma: int, link_karma: int, timestamp_posts_comments_karma: list[(float,float)], oldest_timestamp: float, account_timestamp: float,
+                 now: float = None):
         self.comment_karma = comment_karma
         self.post_karma = link_karma
-        self.timestamp_posts_comments_karma = timestamp_posts_comments_karma
+        #None when no feature asked for reads the activity, see REQUIRED_FIELDS
+        self.timestamp_posts_comments_karma = timestamp_posts_comments_karma if timestamp_posts_comments_karma is not None else []
         self.oldest_timestamp = oldest_timestamp
         self.account_timestamp = account_timestamp
+        self.now = now
 
         #constants
         self.HALF_A_YEAR_IN_SECONDS = 183 * 24 * 60 * 60
-        self.ONE_MONTH_IN_SECONDS = 30 * 24 * 60 * 60 
+        self.ONE_MONTH_IN_SECONDS = ONE_MONTH_IN_SECONDS
         self.ONE_YEAR_IN_SECONDS = 365 * 24 * 60 * 60
         
         #cut offs for hueristics 
@@ -43,86 +76,83 @@ class AccountActivityCheck(IDecetionRule):
         self.RATE_MAX_SCALE = 10000 
 
 
-    def __get_karma_ratio__(self):
-        total_karma = self.post_karma + self.comment_karma
-        if total_karma == 0:
-            return 0.0
-        return self.post_karma / total_karma
-    
-    
-    def __get_active_karma_rate__(self):
-        """Finds the average karma per day an account has earned in its recent 'active' window
-
-            An active window is now to the closest timestamp of activity account has to 30 days back
-        """
-        if not self.timestamp_posts_comments_karma:
-            return 0.0
-        now = time.time()
-        start_of_window = now - self.ONE_MONTH_IN_SECONDS
-        total_recent_karma = 0.0
-        oldest_recent_timestamp = None
-        for timestamp, karma in self.timestamp_posts_comments_karma:
-            if timestamp < start_of_window:
-                break
-            total_recent_karma += karma
-            oldest_recent_timestamp = timestamp 
-        if oldest_recent_timestamp is None:
-            return 0.0
-        active_period_seconds = now - oldest_recent_timestamp
-        active_period_days = max(active_period_seconds / (24 * 60 * 60), 1)
-        return total_recent_karma / active_period_days
-    
-    def __get_age_days__(self):
-        now = time.time()
-        age_seconds = now - self.account_timestamp
-        return age_seconds / (24 * 60 * 60)
-
-    def __get__max_timestamp__(self):
-        """Gets the largest period of inactivity of a account between its timestamps
-        """
-        timestamps = [item[0] for item in self.timestamp_posts_comments_karma]
-        if len(timestamps) < 2:
-            return 0 
-        consecutive_pairs = zip(timestamps, timestamps[1:])
-        gaps = [t1 - t2 for t1, t2 in consecutive_pairs]
-        return max(gaps) if gaps else 0
-    
-    def __get_burst_activity_ratio__(self):
-        """Finds the amount of activity sent within a 65 second window of the last activity
-        """
-        threshold_seconds = 65
-        activities = self.timestamp_posts_comments_karma
-        num_activities = len(activities)
-        if num_activities < 2:
-            return 0.0
-        burst_count = 0
-        for i in range(num_activities - 1):
-            time_gap = activities[i][0] - activities[i+1][0]
-            if time_gap <= threshold_seconds:
-                burst_count += 1
-        burst_ratio = burst_count / (num_activities - 1)
-        return burst_ratio
-    
-    def __get_first_activity_delay_days__(self):
-        oldest_activity_ts = self.oldest_timestamp
-        if oldest_activity_ts == -1:
-            return 0
-        account_creation_ts = self.account_timestamp 
-        difference_seconds = oldest_activity_ts - account_creation_ts
-        if difference_seconds < 0:
-            return 0
-        return difference_seconds / (24 * 60 * 60)
-    
-    def get_features(self) -> dict:
-        features = {
-            "karma_ratio": self.__get_karma_ratio__(),
-            "active_karma_rate": self.__get_active_karma_rate__(),
-            "age_days": self.__get_age_days__(),
-            "biggest_timestamp": self.__get__max_timestamp__(),
-            "burst_activity_ratio": self.__get_burst_activity_ratio__(),
-            "first_activity_delay": self.__get_first_activity_delay_days__()
-        }
-        return features
+    def __now__(self):
+        return time.time() if self.now is None else self.now
+
+    def get_features(self, features=None) -> dict:
+        #one user is a batch of one, so the features are computed by the same code either way
+        activity = activity_matrix(self.timestamp_posts_comments_karma)
+        values = get_activity_features_batch(activity[:, 0], activity[:, 1], [0, len(activity)], [self.comment_karma],
+                                             [self.post_karma], [self.oldest_timestamp], [self.account_timestamp],
+                                             now=self.__now__())
+        return {feature: float(column[0]) for feature, column in values.items() if features is None or feature in features}
+
+
+def get_activity_features_batch(timestamps: np.ndarray, karma: np.ndarray, offsets: np.ndarray, comment_karma: np.ndarray,
+                                link_karma: np.ndarray, oldest_timestamps: np.ndarray, account_timestamps: np.ndarray,
+                                now: float = None) -> dict:
+    """Computes the six AccountActivityCheck features for many users at once
+
+    The activity of every user is stored back to back in the flat timestamps and karma arrays (each user newest
+    first, as in AccountActivityCheck), and user i owns the items offsets[i]:offsets[i + 1]. The other arrays hold
+    one value per user. Returns a dict of feature name to an array with one value per user, equal to what
+    AccountActivityCheck(...).get_features() gives for each of them at the same now.
+    """
+    now = time.time() if now is None else now
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    karma = np.asarray(karma, dtype=np.float64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    comment_karma = np.asarray(comment_karma, dtype=np.float64)
+    link_karma = np.asarray(link_karma, dtype=np.float64)
+    oldest_timestamps = np.asarray(oldest_timestamps, dtype=np.float64)
+    account_timestamps = np.asarray(account_timestamps, dtype=np.float64)
+
+    user_count = offsets.size - 1
+    starts, ends = offsets[:-1], offsets[1:]
+    counts = ends - starts
+
+    #karma ratio
+    total_karma = link_karma + comment_karma
+    karma_ratio = np.divide(link_karma, total_karma, out=np.zeros(user_count), where=total_karma != 0)
+
+    #active karma rate, counting each user's activity up to their first one outside the window
+    outside_positions = np.flatnonzero(timestamps < now - ONE_MONTH_IN_SECONDS)
+    first_outside = np.append(outside_positions, timestamps.size)[np.searchsorted(outside_positions, starts)]
+    recent_counts = np.minimum(first_outside, ends) - starts
+    karma_so_far = np.concatenate(([0.0], np.cumsum(karma))) #karma are whole numbers, so these sums are exact
+    recent_karma = karma_so_far[starts + recent_counts] - karma_so_far[starts]
+    has_recent = recent_counts > 0
+    oldest_recent = timestamps[starts + recent_counts - 1] if timestamps.size else np.zeros(user_count)
+    oldest_recent = np.where(has_recent, oldest_recent, now)
+    active_period_days = np.maximum((now - oldest_recent) / SECONDS_PER_DAY, 1)
+    active_karma_rate = np.where(has_recent, recent_karma / active_period_days, 0.0)
+
+    #age
+    age_days = (now - account_timestamps) / SECONDS_PER_DAY
+
+    #gaps between consecutive activity, user i owns the gaps starts[i]:ends[i] - 1
+    gaps = np.append(timestamps[:-1] - timestamps[1:], 0.0)
+    has_gaps = counts >= 2
+    biggest_timestamp = np.zeros(user_count)
+    if has_gaps.any():
+        bounds = np.column_stack((starts[has_gaps], ends[has_gaps] - 1)).ravel()
+        biggest_timestamp[has_gaps] = np.maximum.reduceat(gaps, bounds)[::2]
+    bursts_so_far = np.concatenate(([0], np.cumsum(gaps <= BURST_THRESHOLD_SECONDS)))
+    burst_counts = bursts_so_far[np.maximum(ends - 1, starts)] - bursts_so_far[starts]
+    burst_activity_ratio = np.divide(burst_counts, counts - 1, out=np.zeros(user_count), where=has_gaps)
+
+    #first activity delay
+    delay_seconds = oldest_timestamps - account_timestamps
+    first_activity_delay = np.where((oldest_timestamps == -1) | (delay_seconds < 0), 0.0, delay_seconds / SECONDS_PER_DAY)
+
+    return {
+        "karma_ratio": karma_ratio,
+        "active_karma_rate": active_karma_rate,
+        "age_days": age_days,
+        "biggest_timestamp": biggest_timestamp,
+        "burst_activity_ratio": burst_activity_ratio,
+        "first_activity_delay": first_activity_delay
+    }
 
 
 
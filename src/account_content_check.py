@@ -1,26 +1,33 @@
 from src.i_detection_rule import IDecetionRule
 #from detection_result import DetectionResults archived
-import praw
-from thefuzz import fuzz
-from googleapiclient.discovery import build
 import os
-from time import sleep
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-import numpy as np
+import time
+from typing import TYPE_CHECKING
+from src.comment_similarity import get_mean_pairwise_similarity
+from src.copy_index import CopyIndex
+from src.rate_limiter import RateLimiter, GOOGLE_SEARCH, get_default_limiter
+from src.instrumentation import get_instrumentation
+
+if TYPE_CHECKING: #praw is only needed by whoever creates the Reddit instance
+    import praw
 
 """Add total amount of activity, and posts comments containing links"""
 
+SHORT_COMMENT_CUTOFF = 20 #comments shorter than this many characters count as short
+SIMILARITY_COMMENT_LIMIT = 15 #most recent comments compared with each other
+
 
 """To be refactored using ArcticShift Api"""
 class SearchReddit:
-    def __init__(self, reddit_name: str, comments: list[str], praw_instance: praw.Reddit):
+    def __init__(self, reddit_name: str, comments: list[str], praw_instance: "praw.Reddit", rate_limiter: RateLimiter = None):
         self.reddit_name = reddit_name
         self.comments = comments
         self.praw_instance = praw_instance
+        self.rate_limiter = rate_limiter if rate_limiter is not None else get_default_limiter()
         self.api_key = os.getenv("GOOGLE_API_KEY")
         self.cx = os.getenv("GOOGLE_SEARCH_ENGINE_ID")
         if self.api_key:
+            from googleapiclient.discovery import build
             self.service = build("customsearch", "v1", developerKey=self.api_key)
         else:
             self.service = None
@@ -28,15 +35,22 @@ class SearchReddit:
         if not self.service:
             print("Error: Google API key or Search Engine ID not found in .env file.")
             return {}
+        from thefuzz import fuzz
         copied_results = {}
         for comment in self.comments:
             if len(comment) < 20:
                 continue
             copied_results[comment] = [] 
             try:
-                sleep(1)
+                self.rate_limiter.acquire(GOOGLE_SEARCH)
                 query = f'site:reddit.com "{comment}"'
-                res = self.service.cse().list(q=query, cx=self.cx, num=2).execute()
+                started = time.perf_counter()
+                try:
+                    res = self.service.cse().list(q=query, cx=self.cx, num=2).execute()
+                except Exception as e:
+                    get_instrumentation().record_request(GOOGLE_SEARCH, time.perf_counter() - started, getattr(getattr(e, "resp", None), "status", None), error=e)
+                    raise
+                get_instrumentation().record_request(GOOGLE_SEARCH, time.perf_counter() - started, 200)
                 urls_from_google = []
                 if 'items' in res:
                     for item in res['items']:
@@ -62,9 +76,11 @@ class SearchReddit:
                                 break
                     except Exception as e:
                         print(f"Could not process URL {url}. Error: {e}")
+                        get_instrumentation().record_error("features.search_reddit", e)
             except Exception as e:
                 print(f"An API search error occurred for comment: '{comment[:50]}...'")
-                print(f"Error: {e}")     
+                print(f"Error: {e}")
+                get_instrumentation().record_error("features.search_reddit", e)
         return copied_results
     def execute_matches(self):
         return self.__match_copy__()
@@ -78,23 +94,32 @@ class AccountContentCheck(IDecetionRule):
         reddit_name (str): Returns the name of the user's account
         comments (list[str]): Returns the list of the accounts 50 most recent comments
         praw_instance (praw.Reddit): An authenticated PRAW Reddit instance
+        copy_index (CopyIndex): The index of already fetched comments copies are looked up in, None to skip copy_count
 
     Values the class finds:
         1. The ratio of comments under 20 characters to the total amount of comments
         2. The pairwise similarity score of the 10 most recent comments on a user's account
         3. Checks the 3 most recent comments to see if they had been plagiarized from another user
+        4. With a copy_index, how many of the comments near duplicate a comment of another user
     """
-    def __init__(self, reddit_name: str, comments: list[str], post_titles: list[str], praw_instance: praw.Reddit):
+    REQUIRED_FIELDS = {
+        "short_comment_ratio": ("comments",),
+        "avg_comment_similarity": ("comments",),
+        "copy_count": ("account_name", "comments")
+    }
+
+    def __init__(self, reddit_name: str, comments: list[str], post_titles: list[str], praw_instance: "praw.Reddit", copy_index: CopyIndex = None):
         self.reddit_name = reddit_name
         self.comments = comments
         self.post_titles = post_titles
         self.praw_instance = praw_instance
+        self.copy_index = copy_index
 
         #cut offs for hueristics  
         self.SHORT_COMMENT_RATIO = 0.2
 
     def __check_length_comments__(self):
-        SHORT_CUTOFF = 20
+        SHORT_CUTOFF = SHORT_COMMENT_CUTOFF
         if not self.comments:
             return 0
         short = 0
@@ -106,41 +131,51 @@ class AccountContentCheck(IDecetionRule):
     def __get_average_comment_similarity__(self):
         """Finds the linguistic similarity of a users most recent COMMENT_LIMIT comments
         """
-        COMMENT_LIMIT = 15
+        COMMENT_LIMIT = SIMILARITY_COMMENT_LIMIT
         if len(self.comments) < 2:
             return 0.0
         if(len(self.comments) >= COMMENT_LIMIT):
             first_x_comments = self.comments[:COMMENT_LIMIT]
         else:
             first_x_comments = self.comments
-        vectorizer = TfidfVectorizer(stop_words='english') #Uses Term Frequency and Inverse Document Frequency
-        tfidf_matrix = vectorizer.fit_transform(first_x_comments)
-        cosine_sim_matrix = cosine_similarity(tfidf_matrix) #Finds similarity between each comment
-        upper_triangle_indices = np.triu_indices(len(first_x_comments), k=1) #Uses upper triangle to avoid reduntant comparisons
-        pairwise_similarity_scores = cosine_sim_matrix[upper_triangle_indices]
-        if pairwise_similarity_scores.size == 0:
-            return 0.0
-        return pairwise_similarity_scores.mean() #returns average of the scores
+        #Term Frequency and Inverse Document Frequency fitted on these comments, averaged over every pair (upper triangle)
+        return get_mean_pairwise_similarity(first_x_comments)
     
     #returns the duplicated top comments based on the users recent X comments    
     def __check_repeated_comments__(self):
-        """Finds COMMENT_LIMIT comments that are plagiarized using the SearchReddit class
+        """Finds COMMENT_LIMIT comments that are plagiarized, in the copy_index or else using the SearchReddit class
         """
         COMMENT_LIMIT = 3
         if(len(self.comments) >= COMMENT_LIMIT):
             first_x_comments = self.comments[:COMMENT_LIMIT]
         else:
             first_x_comments = self.comments
-        searcher = SearchReddit(self.reddit_name, first_x_comments, self.praw_instance)
-        matches = searcher.execute_matches()
+        if self.copy_index is not None:
+            matches = dict(zip(first_x_comments, self.copy_index.find_copies_batch(first_x_comments, exclude_author=self.reddit_name)))
+        else:
+            searcher = SearchReddit(self.reddit_name, first_x_comments, self.praw_instance)
+            matches = searcher.execute_matches()
         return {k: v for k, v in matches.items() if v}
+
+    def __count_copied_comments__(self):
+        """Counts the comments that near duplicate a comment of another user in the copy_index
+        """
+        return self.copy_index.count_copied(self.reddit_name, self.comments)
     
-    def get_features(self) -> dict:
-        features = {
-            "short_comment_ratio": self.__check_length_comments__(),
-            "avg_comment_similarity": self.__get_average_comment_similarity__()
+    def get_features(self, features=None) -> dict:
+        """Returns the given features, every feature if None (copy_count only with a copy_index)
+
+        Raises ValueError if copy_count is asked for without a copy_index.
+        """
+        if features is not None and "copy_count" in features and self.copy_index is None:
+            raise ValueError("copy_count is looked up in a copy_index, pass one to score it")
+        getters = {
+            "short_comment_ratio": self.__check_length_comments__,
+            "avg_comment_similarity": self.__get_average_comment_similarity__
         }
-        return features
+        if self.copy_index is not None:
+            getters["copy_count"] = self.__count_copied_comments__
+        return {feature: getter() for feature, getter in getters.items() if features is None or feature in features}
     
 
 
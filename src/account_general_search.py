@@ -1,5 +1,4 @@
 from src.i_detection_rule import IDecetionRule
-import praw
 #from detection_result import DetectionResults archived
 import re
 
@@ -24,6 +23,13 @@ class AccountGeneralSearch(IDecetionRule):
         3. The boolean of if the name of the reddit user matches the regex pattern
         4. The boolean if a reddit user has a default profile picture
     """
+    REQUIRED_FIELDS = {
+        "verified_email": ("verified_email",),
+        "trophy_count": ("trophy_count",),
+        "name_pattern": ("account_name",),
+        "icon_default": ("profile_picture",)
+    }
+
     def __init__(self, verified_email: bool, trophy_count: int, reddit_name: str, profile_picture: str):
         self.verified_email = verified_email
         self.trophy_count = trophy_count
@@ -44,14 +50,14 @@ class AccountGeneralSearch(IDecetionRule):
         if not isinstance(self, AccountGeneralSearch):
             return False
         return "/avatars/defaults/" in self.profile_picture #link for the defualt reddit profile picture
-    def get_features(self) -> dict:
-        features = {
-            "verified_email": 1 if self.__check_verified__() else 0,
-            "trophy_count": self.__check_trophies__(),
-            "name_pattern": 1 if self.__check_name__() else 0,
-            "icon_default": 1 if self.__check_icon__() else 0
+    def get_features(self, features=None) -> dict:
+        getters = {
+            "verified_email": lambda: 1 if self.__check_verified__() else 0,
+            "trophy_count": self.__check_trophies__,
+            "name_pattern": lambda: 1 if self.__check_name__() else 0,
+            "icon_default": lambda: 1 if self.__check_icon__() else 0
         }
-        return features
+        return {feature: getter() for feature, getter in getters.items() if features is None or feature in features}
     
 
 
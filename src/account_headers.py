@@ -0,0 +1,156 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from src.user_data_fetcher import PROFILE_FIELDS, FIELD_SOURCES
+from src.instrumentation import get_instrumentation
+
+
+ACCOUNT_IDS_PER_REQUEST = 100 #most account ids /api/user_data_by_account_ids answers in one request
+HEADER_WORKERS = 4 #about pages fetched at the same time for the users that cannot be looked up in bulk
+FOUND = "found"
+SUSPENDED = "suspended"
+NOT_FOUND = "not_found"
+UNKNOWN = "unknown" #the lookup failed, the user is fetched as if it had not been tried
+ABOUT_FIELDS = [field for field in PROFILE_FIELDS if FIELD_SOURCES[field] == "about"]
+#the UserProfile field each attribute of a praw Redditor's about page is read into
+ABOUT_ATTRIBUTES = {
+    "account_name": "name",
+    "account_timestamp": "created_utc",
+    "comment_karma": "comment_karma",
+    "link_karma": "link_karma",
+    "verified_email": "has_verified_email",
+    "profile_picture": "icon_img"
+}
+#the same for a PartialRedditor of the bulk endpoint, which has no verified email
+BULK_ATTRIBUTES = {
+    "account_name": "name",
+    "account_timestamp": "created_utc",
+    "comment_karma": "comment_karma",
+    "link_karma": "link_karma",
+    "profile_picture": "profile_img"
+}
+
+
+class AccountHeader:
+    """ This class stores the about fields of one account, or why there are none
+
+    Attributes:
+        username (str): The name the account was looked up by
+        status (str): FOUND, SUSPENDED, NOT_FOUND, or UNKNOWN when the lookup itself failed
+        values (dict): The about fields (see ABOUT_FIELDS) that were looked up, keyed by field name
+        redditor (praw.Reddit.Redditor): The Redditor whose about page was fetched, None for a bulk lookup
+        error (str): Why the lookup failed, None unless the status is UNKNOWN
+    """
+    def __init__(self, username: str, status: str, values: dict = None, redditor=None, error: str = None):
+        self.username = username
+        self.status = status
+        self.values = values if values is not None else {}
+        self.redditor = redditor
+        self.error = error
+
+    @property
+    def exists(self) -> bool:
+        """If the account can be fetched, False only for suspended and not found accounts"""
+        return self.status in (FOUND, UNKNOWN)
+
+
+class AccountHeaderFetcher:
+    """This class looks up the about fields of many accounts before anything else of them is fetched
+
+    Accounts whose ids (t2_...) are known are looked up with praw's partial_redditors, up to 100 per request
+    instead of one about request each. Its answers have every about field but the verified email, so the bulk
+    lookup is only used when the fields asked for leave it out; otherwise, and for accounts without an id or
+    missing from the bulk answer, each account's own about page is fetched (max_workers at a time). That is the
+    request a UserDataFetcher would send first anyway, so passing header.values and header.redditor on to it
+    costs nothing more.
+
+    Suspended and not found accounts are flagged here, so none of their listings are ever paged.
+
+        Attributes:
+            praw_instance (praw.Reddit): An authenticated PRAW Reddit instance
+            max_workers (int): About pages fetched at the same time
+            batch_size (int): Account ids looked up per bulk request
+            stats (dict): Counts of bulk_requests, bulk_found, about_requests, and suspended, not_found and
+                          unknown accounts
+    """
+    def __init__(self, praw_instance, max_workers: int = HEADER_WORKERS, batch_size: int = ACCOUNT_IDS_PER_REQUEST):
+        self.praw_instance = praw_instance
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self.lock = threading.Lock()
+        self.stats = {"bulk_requests": 0, "bulk_found": 0, "about_requests": 0, SUSPENDED: 0, NOT_FOUND: 0, UNKNOWN: 0}
+
+    def __count__(self, stat: str, count: int = 1):
+        with self.lock:
+            self.stats[stat] += count
+
+    def __get_bulk__(self, account_ids: dict) -> dict:
+        """Looks up {username: account id} in bulk, returns the headers of the accounts in the answers"""
+        usernames = {account_id.lower(): username for username, account_id in account_ids.items()}
+        ids = list(usernames)
+        headers = {}
+        for start in range(0, len(ids), self.batch_size):
+            self.__count__("bulk_requests")
+            try:
+                with get_instrumentation().stage("fetch.bulk_about"):
+                    partials = list(self.praw_instance.redditors.partial_redditors(ids[start:start + self.batch_size]))
+            except Exception as e:
+                #the accounts of a failed request fall back to their about pages
+                get_instrumentation().record_error("fetch.bulk_about", e)
+                continue
+            for partial in partials:
+                username = usernames.get(partial.fullname.lower())
+                if username is None:
+                    continue
+                if getattr(partial, "is_suspended", False):
+                    headers[username] = AccountHeader(username, SUSPENDED)
+                else:
+                    headers[username] = AccountHeader(username, FOUND, {field: getattr(partial, attribute, None)
+                                                                        for field, attribute in BULK_ATTRIBUTES.items()})
+        self.__count__("bulk_found", sum(header.status == FOUND for header in headers.values()))
+        return headers
+
+    def __get_about__(self, username: str) -> AccountHeader:
+        """Fetches the about page of one account"""
+        from prawcore.exceptions import NotFound, Forbidden #imported on first use, like praw itself
+        self.__count__("about_requests")
+        redditor = self.praw_instance.redditor(username)
+        try:
+            with get_instrumentation().stage("fetch.about"):
+                #suspended accounts only have a name and is_suspended, reading any other about field fails
+                if getattr(redditor, "is_suspended", False):
+                    return AccountHeader(username, SUSPENDED, redditor=redditor)
+                values = {field: getattr(redditor, attribute) for field, attribute in ABOUT_ATTRIBUTES.items()}
+        except (NotFound, Forbidden):
+            return AccountHeader(username, NOT_FOUND, redditor=redditor)
+        except Exception as e:
+            get_instrumentation().record_error("fetch.about", e)
+            return AccountHeader(username, UNKNOWN, redditor=redditor, error=f"{type(e).__name__}: {e}")
+        return AccountHeader(username, FOUND, values, redditor=redditor)
+
+    def get_headers(self, usernames: list[str], account_ids: dict = None, fields=ABOUT_FIELDS) -> dict:
+        """Returns the AccountHeader of every username, keyed by username
+
+        account_ids maps usernames to their account ids (like a comment's author_fullname), users without one have
+        their about page fetched. fields are the about fields needed: with any the bulk endpoint does not answer
+        (verified_email), every user has their about page fetched, as it would cost a request each anyway.
+        """
+        account_ids = account_ids or {}
+        bulk = set(fields) <= set(BULK_ATTRIBUTES)
+        headers = self.__get_bulk__({username: account_ids[username] for username in usernames if username in account_ids}) if bulk else {}
+
+        #an id missing from the bulk answer is an account that was deleted, suspended or never existed, its about page tells which
+        rest = [username for username in usernames if username not in headers]
+        if self.max_workers > 1 and len(rest) > 1:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(rest))) as executor:
+                headers.update(zip(rest, executor.map(get_instrumentation().bind(self.__get_about__), rest)))
+        else:
+            headers.update((username, self.__get_about__(username)) for username in rest)
+
+        for header in headers.values():
+            if header.status != FOUND:
+                self.__count__(header.status)
+        return {username: headers[username] for username in usernames}
+
+    def get_header(self, username: str, account_id: str = None, fields=ABOUT_FIELDS) -> AccountHeader:
+        return self.get_headers([username], {username: account_id} if account_id else None, fields)[username]
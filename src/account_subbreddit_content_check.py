@@ -1,5 +1,9 @@
 from src.i_detection_rule import IDecetionRule
 import time
+import re
+import itertools
+from functools import lru_cache
+import numpy as np
 # from detection_result import DetectionResults archived
 
 
@@ -26,6 +30,62 @@ BOT_TYPICAL_TOPICS = {
 }
 
 
+def compile_keyword_matcher(keywords) -> re.Pattern:
+    """Compiles keywords into one regex that finds if any of them is inside a string
+
+    The keywords are merged into a trie first, so the regex branches on one character at a time instead of trying
+    every keyword at every position, which keeps matching fast with thousands of keywords. A keyword that has
+    another keyword as its prefix is dropped, as the shorter one already matches.
+    """
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for character in keyword:
+            node = node.setdefault(character, {})
+        node[""] = {}
+
+    def to_pattern(node: dict) -> str:
+        if "" in node:
+            return ""
+        branches = [re.escape(character) + to_pattern(child) for character, child in sorted(node.items())]
+        if len(branches) == 1:
+            return branches[0]
+        return "(?:" + "|".join(branches) + ")"
+
+    if not trie:
+        return re.compile(r"(?!)") #matches nothing
+    return re.compile(to_pattern(trie))
+
+
+SCAMMY_MATCHER = compile_keyword_matcher(BOT_TYPICAL_TOPICS)
+SUBREDDIT_CACHE_SIZE = 1 << 16
+
+
+@lru_cache(maxsize=SUBREDDIT_CACHE_SIZE)
+def get_subreddit_flags(subreddit: str) -> (bool, bool):
+    """Returns (is a popular bot frequented subreddit, has a scam/spam/profit keyword in its name), remembered per subreddit
+    """
+    return subreddit in BOT_FREQUENTED_SUBREDDITS, SCAMMY_MATCHER.search(subreddit) is not None
+
+
+def get_subreddit_features_batch(subreddit_lists: list) -> dict:
+    """Computes the AccountSubbredditContentCheck features of many users in one call
+
+    Takes one list of subreddits per user and returns a dict of feature name to an array with one value per user
+    """
+    user_count = len(subreddit_lists)
+    counts = np.fromiter((len(subreddits) for subreddits in subreddit_lists), dtype=np.int64, count=user_count)
+    flat = itertools.chain.from_iterable(subreddit_lists)
+    codes = np.fromiter((popular + 2 * scammy for popular, scammy in map(get_subreddit_flags, flat)), dtype=np.int8, count=int(counts.sum()))
+    owners = np.repeat(np.arange(user_count), counts)
+    popular = np.bincount(owners, weights=codes & 1, minlength=user_count)
+    scammy = np.bincount(owners, weights=codes >> 1, minlength=user_count)
+    return {
+        "popular_subreddits_ratio": np.divide(popular, counts, out=np.zeros(user_count), where=counts > 0),
+        "scammy_subreddits_ratio": np.divide(scammy, counts, out=np.zeros(user_count), where=counts > 0)
+    }
+
+
 class AccountSubbredditContentCheck(IDecetionRule):
     """
     This class determins patterns based on a users activity in certain subreddits
@@ -37,6 +97,11 @@ class AccountSubbredditContentCheck(IDecetionRule):
         1. The ratio of popular subreddit participation to all participation
         2. The ratio of scammy topic subreddit participation to all participation
     """
+    REQUIRED_FIELDS = {
+        "popular_subreddits_ratio": ("subreddits",),
+        "scammy_subreddits_ratio": ("subreddits",)
+    }
+
     def __init__(self, subreddits_frequents: set[str]):
         self.subreddits_frequents = subreddits_frequents
         self.subreddits_popular = BOT_FREQUENTED_SUBREDDITS
@@ -46,30 +111,22 @@ class AccountSubbredditContentCheck(IDecetionRule):
     def __check_popular_subbreddit_frequency__(self):
         if not self.subreddits_frequents:
             return 0
-        total = 0
-        for subreddit in self.subreddits_frequents:
-            if subreddit in self.subreddits_popular:
-                total += 1
+        total = sum(1 for subreddit in self.subreddits_frequents if get_subreddit_flags(subreddit)[0])
         return total / len(self.subreddits_frequents)
     
     #returns the ratio of activity in scam/spam/profit subreddits
     def __check_scammy_subbreddit_frequency__(self):
         if not self.subreddits_frequents:
             return 0
-        total = 0
-        for user_subreddit in self.subreddits_frequents:
-            for scam_keyword in self.subreddits_scammy:
-                if scam_keyword in user_subreddit:
-                    total += 1
-                    break 
+        total = sum(1 for subreddit in self.subreddits_frequents if get_subreddit_flags(subreddit)[1])
         return total / len(self.subreddits_frequents)
     
-    def get_features(self) -> dict:
-        features = {
-            "popular_subreddits_ratio": self.__check_popular_subbreddit_frequency__(),
-            "scammy_subreddits_ratio": self.__check_scammy_subbreddit_frequency__()
+    def get_features(self, features=None) -> dict:
+        getters = {
+            "popular_subreddits_ratio": self.__check_popular_subbreddit_frequency__,
+            "scammy_subreddits_ratio": self.__check_scammy_subbreddit_frequency__
         }
-        return features
+        return {feature: getter() for feature, getter in getters.items() if features is None or feature in features}
     """
     def execute_check(self) -> DetectionResults:
         rule_name = "Popular Subreddit Check"
@@ -0,0 +1,220 @@
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from src.rate_limiter import RateLimiter, ARCTIC_SHIFT, get_default_limiter
+from src.instrumentation import get_instrumentation
+
+
+ARCTIC_SHIFT_URL = "https://arctic-shift.photon-reddit.com/api/{}/search"
+KINDS = ("comments", "submissions")
+NO_ACTIVITY = -1 #returned when an author has no archived activity, or it could not be looked up
+
+NEGATIVE_TTL = 24 * 60 * 60 #authors without any archived activity are asked again after this many seconds
+FAILURE_THRESHOLD = 5 #failed lookups in a row that open the circuit
+COOLDOWN = 60 #seconds the circuit stays open before one lookup is let through again
+LOOKUP_DEADLINE = 10 #seconds a whole lookup (both searches, their retries and waits for the rate limiter) may take
+CACHE_PATH = os.getenv("ARCTIC_SHIFT_CACHE", "arctic_shift_cache.sqlite") #where the default client keeps found timestamps
+
+
+class ArcticShiftClient:
+    """This class looks up the first (not deleted) activity of an author on Arctic Shift
+
+    Both the comments and submissions searches are sent in parallel over a pooled session that retries transient
+    error statuses (not read timeouts), and every search first waits its turn in the shared RateLimiter. A lookup
+    whose searches have not both answered after deadline seconds counts as failed; the searches still running
+    finish in the background. Found timestamps never change, so they are cached for good, while authors with no
+    results are cached for negative_ttl seconds.
+
+    After failure_threshold failed lookups in a row the circuit opens: for cooldown seconds lookups return
+    NO_ACTIVITY right away instead of waiting on a slow or down Arctic Shift. After that a single lookup is let
+    through as a probe while the others keep returning NO_ACTIVITY; if it succeeds the circuit closes, if it fails
+    the circuit opens for another cooldown.
+
+        Attributes:
+            timeout (float): Seconds each search may take to connect and to answer
+            deadline (float): Seconds a whole lookup may take
+            negative_ttl (float): Seconds an author with no results is remembered for
+            failure_threshold (int): Failed lookups in a row before the circuit opens
+            cooldown (float): Seconds the circuit stays open
+            session (requests.Session): The session searches are sent through, a pooled one with retries by default
+            cache_path (str): The SQLite file found timestamps are kept in, ":memory:" keeps them for this process only
+            rate_limiter (RateLimiter): The scheduler searches are sent through, the shared default one if not given
+            stats (dict): Counts of cache hits, negative_hits, misses, failures and short_circuited lookups
+            url (str): The search URL, with {} where the kind (comments or submissions) goes
+    """
+    def __init__(self, timeout: float = 5, pool_size: int = 16, retries: int = 2, negative_ttl: float = NEGATIVE_TTL,
+                 failure_threshold: int = FAILURE_THRESHOLD, cooldown: float = COOLDOWN, session: "requests.Session" = None,
+                 cache_path: str = ":memory:", rate_limiter: RateLimiter = None, url: str = ARCTIC_SHIFT_URL,
+                 deadline: float = LOOKUP_DEADLINE):
+        self.timeout = timeout
+        self.deadline = deadline
+        self.url = url
+        self.negative_ttl = negative_ttl
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.session = session if session is not None else self.__build_session__(pool_size, retries)
+        self.executor = ThreadPoolExecutor(max_workers=pool_size)
+        self.cache_path = cache_path
+        self.rate_limiter = rate_limiter if rate_limiter is not None else get_default_limiter()
+        self.stats = {"hits": 0, "negative_hits": 0, "misses": 0, "failures": 0, "short_circuited": 0}
+
+        self.lock = threading.Lock()
+        self.consecutive_failures = 0
+        self.open_until = 0.0 #0 while the circuit is closed
+        self.probing = False #if the one lookup let through after the cooldown is still running
+        self.connection = sqlite3.connect(cache_path, check_same_thread=False, timeout=30)
+        with self.connection:
+            self.connection.execute(
+                """CREATE TABLE IF NOT EXISTS oldest_activity (
+                    author TEXT PRIMARY KEY,
+                    oldest_utc INTEGER NOT NULL,
+                    cached_at REAL NOT NULL
+                )"""
+            )
+
+    def __build_session__(self, pool_size: int, retries: int) -> "requests.Session":
+        import requests #imported on first use, importing it takes longer than everything else here
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+        #a read timeout is not retried, the search already took the whole timeout
+        retry = Retry(total=retries, read=0, backoff_factor=0.3, status_forcelist=(429, 500, 502, 503, 504), allowed_methods=("GET",))
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def __count__(self, stat: str):
+        with self.lock:
+            self.stats[stat] += 1
+
+    def __cached__(self, author: str):
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT oldest_utc, cached_at FROM oldest_activity WHERE author = ?", (author,)
+            ).fetchone()
+        if row is None:
+            return None
+        oldest_utc, cached_at = row
+        if oldest_utc == NO_ACTIVITY:
+            if time.time() - cached_at > self.negative_ttl:
+                return None
+            self.__count__("negative_hits")
+        else:
+            self.__count__("hits")
+        return oldest_utc
+
+    def __store__(self, author: str, oldest_utc: int):
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO oldest_activity (author, oldest_utc, cached_at) VALUES (?, ?, ?)",
+                (author, oldest_utc, time.time())
+            )
+
+    def __admit__(self):
+        """Returns None if the circuit short circuits the lookup, otherwise if the lookup is the probe after a cooldown"""
+        with self.lock:
+            if self.open_until == 0.0:
+                return False
+            if self.probing or time.time() < self.open_until:
+                return None
+            self.probing = True
+            return True
+
+    def __record_outcome__(self, failed: bool, probe: bool = False):
+        with self.lock:
+            if probe:
+                self.probing = False
+            if not failed:
+                self.consecutive_failures = 0
+                self.open_until = 0.0
+                return
+            self.stats["failures"] += 1
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= self.failure_threshold:
+                self.open_until = time.time() + self.cooldown
+                self.consecutive_failures = self.failure_threshold - 1 #one more failure after the cooldown reopens it
+
+    def __search_oldest__(self, kind: str, author: str):
+        """Gets the timestamp of the author's first comment or submission (kind), inf if there is none
+
+        Raises requests.RequestException if the search failed
+        """
+        params = {"author": author, "sort": "asc", "limit": 1}
+        self.rate_limiter.acquire(ARCTIC_SHIFT)
+        started = time.perf_counter()
+        try:
+            r = self.session.get(self.url.format(kind), params=params, timeout=self.timeout)
+        except Exception as e:
+            get_instrumentation().record_request(ARCTIC_SHIFT, time.perf_counter() - started, error=e)
+            raise
+        get_instrumentation().record_request(ARCTIC_SHIFT, time.perf_counter() - started, r.status_code, r.headers)
+        self.rate_limiter.update(ARCTIC_SHIFT, r.headers, r.status_code)
+        r.raise_for_status()
+        data = r.json().get("data") or []
+        if data:
+            ts = data[0].get("created_utc")
+            if ts is not None:
+                return float(ts)
+        return float("inf")
+
+    def __try_search_oldest__(self, kind: str, author: str):
+        import requests
+        try:
+            return self.__search_oldest__(kind, author), False
+        except (requests.RequestException, ValueError):
+            return float("inf"), True
+
+    def get_oldest_timestamp(self, author: str) -> int:
+        """Returns the Unix timestamp of the author's first activity, NO_ACTIVITY if there is none or it could not be found
+        """
+        key = author.lower()
+        cached = self.__cached__(key)
+        if cached is not None:
+            return cached
+        probe = self.__admit__()
+        if probe is None:
+            self.__count__("short_circuited")
+            return NO_ACTIVITY
+
+        self.__count__("misses")
+        search = get_instrumentation().bind(self.__try_search_oldest__)
+        futures = [self.executor.submit(search, kind, author) for kind in KINDS]
+        deadline = time.monotonic() + self.deadline
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result(timeout=max(deadline - time.monotonic(), 0)))
+            except FutureTimeoutError:
+                results.append((float("inf"), True))
+        failed = any(search_failed for _, search_failed in results)
+        self.__record_outcome__(failed, probe)
+        oldest_activity = min(timestamp for timestamp, _ in results)
+        oldest_utc = NO_ACTIVITY if oldest_activity == float("inf") else int(oldest_activity)
+        if not failed:
+            self.__store__(key, oldest_utc)
+        return oldest_utc
+
+    def close(self):
+        self.executor.shutdown()
+        self.session.close()
+        with self.lock:
+            self.connection.close()
+
+
+default_client = None
+default_client_lock = threading.Lock()
+
+
+def get_default_client() -> ArcticShiftClient:
+    """Returns the ArcticShiftClient shared by every UserDataFetcher that is not given its own, its found timestamps
+    are kept in the ARCTIC_SHIFT_CACHE file (arctic_shift_cache.sqlite by default) across runs
+    """
+    global default_client
+    with default_client_lock:
+        if default_client is None:
+            default_client = ArcticShiftClient(cache_path=CACHE_PATH)
+        return default_client
@@ -1,83 +1,234 @@
-import praw
-from dotenv import load_dotenv
 import os
-import joblib
+import threading
+import time
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 
 # Import all your check classes and UserDataFetcher
-from src.user_data_fetcher import UserDataFetcher
-from src.account_activity_check import AccountActivityCheck
-from src.account_content_check import AccountContentCheck
-from src.account_subbreddit_content_check import AccountSubbredditContentCheck
-from src.account_general_search import AccountGeneralSearch
+from src.user_data_fetcher import UserDataFetcher, UserProfile, LazyUserProfile
+from src.profile_cache import ProfileCache, CachedUserDataFetcher
+from src.account_headers import AccountHeaderFetcher, AccountHeader, ABOUT_FIELDS
+from src.copy_index import CopyIndex
+from src.arctic_shift_client import ArcticShiftClient
+from src.profile_features import get_profile_features, required_fields
+from src.detection_result import DetectionResult
+from src.feature_schema import FEATURE_COLUMNS, to_feature_vector
+from src.forest_engine import compile_forest
+from src.instrumentation import get_instrumentation
+
+
+FETCH_WORKERS = 8 #requests sent at the same time while fetching one user
+USER_WORKERS = 4 #users fetched at the same time by check_users
+SUSPICIOUS_THRESHOLD = 0.5
+MODEL_PATH = os.getenv("BOT_DETECTOR_MODEL", "models/bot_detector_model.pkl")
+#the model's feature columns, comma separated, for a model trained with train_model.py --features
+FEATURES = os.getenv("BOT_DETECTOR_FEATURES", "").replace(",", " ").split() or FEATURE_COLUMNS
+
+loaded_models = {}
+loaded_models_lock = threading.Lock()
+
+
+def load_model(path: str = MODEL_PATH, mmap_mode: str = None, compiled: bool = True):
+    """Loads the model at path once per process, every later call gets the same object
+
+    The file can hold a RandomForestClassifier or the CompiledForest train_model.py exports from it. With compiled,
+    a RandomForestClassifier is compiled to a CompiledForest once loaded, so small batches skip sklearn's overhead,
+    and kept as its estimator for the batches of more than COMPILED_MAX_ROWS rows sklearn scores faster. An exported
+    CompiledForest has no estimator and scores every batch itself.
+
+    With mmap_mode="r" the numpy arrays joblib stored uncompressed are memory mapped read only instead of read, so
+    every process loading the same file shares their pages. Only a CompiledForest keeps them mapped, sklearn's trees
+    copy their arrays when they are loaded. Loading before worker processes are forked shares the whole model with them too.
+    """
+    key = (os.path.abspath(path), mmap_mode, compiled)
+    with loaded_models_lock:
+        if key not in loaded_models:
+            import joblib #imported on first use, it is only needed to load the model
+            model = joblib.load(path, mmap_mode=mmap_mode)
+            loaded_models[key] = compile_forest(model, keep_estimator=True) if compiled and hasattr(model, "estimators_") else model
+        return loaded_models[key]
 
 
 class BotDetector:
-    def __init__(self, praw_instance):
+    def __init__(self, praw_instance, fetch_workers: int = FETCH_WORKERS, profile_cache: ProfileCache = None, copy_index: CopyIndex = None,
+                 model_path: str = MODEL_PATH, mmap_mode: str = None, compiled: bool = True, arctic_shift: ArcticShiftClient = None,
+                 features: list[str] = FEATURES, account_headers: bool = True):
         self.praw_instance = praw_instance
-        self.model = joblib.load("models/bot_detector_model.pkl")
-        
-
-        self.feature_cols_order = [
-            "karma_ratio",
-            "active_karma_rate",
-            "age_days",
-            "biggest_timestamp",
-            "burst_activity_ratio",
-            "first_activity_delay",
-            "short_comment_ratio",
-            "avg_comment_similarity",
-            "verified_email",
-            "trophy_count",
-            "name_pattern",
-            "icon_default",
-            "popular_subreddits_ratio",
-            "scammy_subreddits_ratio"
-        ]
+        self.fetch_workers = fetch_workers
+        self.profile_cache = profile_cache
+        self.copy_index = copy_index
+        self.arctic_shift = arctic_shift
+        self.model_path = model_path
+        self.mmap_mode = mmap_mode
+        self.compiled = compiled
+        self.loaded_model = None
+
+        self.feature_cols_order = list(features)
+        #only the rules these features come from run, and only the fields they read are fetched
+        self.features = self.feature_cols_order + (["copy_count"] if copy_index is not None else [])
+        self.required_fields = required_fields(self.features)
+        #check_users looks up the about fields of every user first, and skips the suspended and not found ones
+        self.header_fetcher = AccountHeaderFetcher(praw_instance) if account_headers else None
+
+    @property
+    def model(self):
+        """The trained model, loaded (see load_model) the first time a user is scored"""
+        if self.loaded_model is None:
+            self.loaded_model = load_model(self.model_path, self.mmap_mode, self.compiled)
+        return self.loaded_model
 
     def get_all_features(self, reddit_user, user_info) -> dict:
         """Gathers all raw features from all check classes."""
-        all_features = {}
-
-        activity_check = AccountActivityCheck(user_info.comment_karma, user_info.link_karma, user_info.timestamps_and_karma, user_info.oldest_timestamp, user_info.account_timestamp)
-        all_features.update(activity_check.get_features()) 
-
-        content_check = AccountContentCheck(user_info.account_name, user_info.comments, user_info.comments, self.praw_instance)
-        all_features.update(content_check.get_features())
-
-        subreddit_check = AccountSubbredditContentCheck(user_info.subreddits)
-        all_features.update(subreddit_check.get_features())
-
-        general_check = AccountGeneralSearch(user_info.verified_email, user_info.trophy_count, user_info.account_name, user_info.profile_picture)
-        all_features.update(general_check.get_features())
-
-        return all_features
-
-    def check_user(self, username: str):
-        reddit_user = self.praw_instance.redditor(username)
-
-        user_data_fetcher = UserDataFetcher(reddit_user)
-        user_info = user_data_fetcher.get_data()
-
-        features_dict = self.get_all_features(reddit_user, user_info)
-
-        feature_vector = [features_dict[col] for col in self.feature_cols_order]
-        feature_vector = [1 if v is True else (0 if v is False else v) for v in feature_vector]
-        
-
-        final_features = np.array(feature_vector).reshape(1, -1)
-
-        probability = self.model.predict_proba(final_features)
-        
-        confidence_score = probability[0][1] # Get the probability of being a bot
-        is_suspicious = confidence_score > 0.5 
-
-        print(f"--- Detection Results for {username} ---")
-        print(f"Suspicious: {is_suspicious}")
-        print(f"Confidence Score: {confidence_score:.0%}")
-        print(f"-----------------------")
+        return get_profile_features(user_info, self.praw_instance, copy_index=self.copy_index, features=self.features)
+
+    def get_headers(self, usernames: list[str], account_ids: dict = None) -> dict:
+        """Looks up the about fields of the users (see AccountHeaderFetcher), in bulk for those with an account id
+
+        Returns their AccountHeader keyed by username. Users whose about fields are fresh in the profile cache are
+        left out, as looking them up would cost a request their fetch does not.
+        """
+        if self.header_fetcher is None:
+            return {}
+        if self.profile_cache is not None:
+            usernames = [username for username in usernames if not self.profile_cache.is_fresh(username, ABOUT_FIELDS)]
+        about_fields = [field for field in ABOUT_FIELDS if field in self.required_fields]
+        return self.header_fetcher.get_headers(usernames, account_ids, about_fields)
+
+    def fetch_profile(self, username: str, fields=None, header: AccountHeader = None) -> UserProfile:
+        """Fetches the required_fields of a user (or only the given fields), any other field is fetched the first time it is read
+
+        The about fields of the user's header are used instead of fetched.
+        """
+        about = header.values if header is not None else None
+        reddit_user = header.redditor if header is not None and header.redditor is not None else self.praw_instance.redditor(username)
+
+        if self.profile_cache is not None:
+            user_data_fetcher = CachedUserDataFetcher(reddit_user, self.profile_cache, max_workers=self.fetch_workers, arctic_shift=self.arctic_shift,
+                                                      about=about)
+        else:
+            user_data_fetcher = UserDataFetcher(reddit_user, max_workers=self.fetch_workers, arctic_shift=self.arctic_shift, about=about)
+        return user_data_fetcher.get_data(self.required_fields if fields is None else fields)
+
+    def get_profile_features(self, user_info: UserProfile) -> dict:
+        """Returns the features of a fetched profile, after adding its comments to the copy index
+        """
+        if isinstance(user_info, LazyUserProfile):
+            user_info.fetch(self.required_fields) #what is still missing, concurrently, instead of one request at a time
+        if self.copy_index is not None and "comments" in self.required_fields:
+            with get_instrumentation().stage("copy_index.add"):
+                self.copy_index.add_comments(user_info.account_name, user_info.comments)
+        return get_profile_features(user_info, self.praw_instance, copy_index=self.copy_index, features=self.features)
+
+    def __get_user_features__(self, username: str, header: AccountHeader = None) -> dict:
+        """Fetches one user and returns their features, raises if the user could not be fetched
+        """
+        return self.get_profile_features(self.fetch_profile(username, header=header))
+
+    def get_user_features(self, username: str, header: AccountHeader = None) -> (dict, str):
+        """Fetches one user and returns (features, None), or (None, error) if the user could not be fetched
+        """
+        try:
+            return self.__get_user_features__(username, header), None
+        except Exception as e:
+            get_instrumentation().record_error("fetch", e)
+            return None, f"{type(e).__name__}: {e}"
+
+    def fetch_user(self, username: str, header: AccountHeader = None) -> DetectionResult:
+        """Returns an unscored DetectionResult of one user with their features or error, and their trace when
+        instrumentation is enabled
+
+        A user whose header says they are suspended or not found is not fetched at all.
+        """
+        if header is not None and not header.exists:
+            return account_status_result(header)
+        with get_instrumentation().trace(username) as trace:
+            features, error = self.get_user_features(username, header)
+        return DetectionResult(username, features=features, error=error, trace=trace)
+
+    def __to_feature_vector__(self, features_dict: dict) -> list:
+        return to_feature_vector(features_dict, self.feature_cols_order)
+
+    def feature_vector(self, features: dict) -> list[float]:
+        """Returns the model input row of a features dict, missing features as nan, raises ValueError or TypeError
+        for a value that is not a number
+        """
+        return self.__to_feature_vector__(dict.fromkeys(self.feature_cols_order) | features)
+
+    def score_vectors(self, vectors: list[list[float]]) -> list[float]:
+        """Returns the model's bot probability of each row of feature_vector values, scored with one predict_proba call
+        """
+        with get_instrumentation().stage("inference"):
+            feature_matrix = np.array(vectors, dtype=np.float64).reshape(len(vectors), -1)
+            return [float(score) for score in self.model.predict_proba(feature_matrix)[:, 1]] # Get the probability of being a bot
+
+    def score_features(self, features: list[dict]) -> list[float]:
+        """Returns the model's bot probability of each features dict, scored with one predict_proba call
+        """
+        return self.score_vectors([self.__to_feature_vector__(row) for row in features])
+
+    def score_results(self, results: list[DetectionResult]) -> list[DetectionResult]:
+        """Scores every result without an error by a single predict_proba call on one feature matrix, and logs every trace
+        """
+        scored = [result for result in results if result.error is None]
+        if scored:
+            started = time.perf_counter()
+            scores = self.score_features([result.features for result in scored])
+            inference_ms = round((time.perf_counter() - started) * 1000, 3)
+            for result, confidence_score in zip(scored, scores):
+                result.score = confidence_score
+                result.is_suspicious = result.score > SUSPICIOUS_THRESHOLD
+                if result.trace is not None: #the batch's inference time, shared by every user in it
+                    result.trace.add("stages", {"stage": "inference", "ms": inference_ms, "batch": len(scored)})
+        for result in results:
+            get_instrumentation().log_trace(result.trace)
+        return results
+
+    def check_users(self, usernames: list[str], max_workers: int = USER_WORKERS, account_ids: dict = None) -> list[DetectionResult]:
+        """Scores many users at once
+
+        The about fields of every user are looked up first (see get_headers), 100 users per request for those with
+        an id in account_ids (like a comment's author_fullname), and suspended or not found users go no further.
+        The others are fetched concurrently, max_workers at a time, and every user that could be fetched is scored
+        by a single predict_proba call on one feature matrix (see load_model for which forest scores it).
+        Returns one DetectionResult per username, in the same order, with the error set for users that failed.
+        """
+        headers = self.get_headers(usernames, account_ids)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(self.fetch_user, usernames, [headers.get(username) for username in usernames]))
+        return self.score_results(results)
+
+    def check_user(self, username: str) -> DetectionResult:
+        result = self.check_users([username], max_workers=1)[0]
+        print_result(result)
+        return result
+
+
+def account_status_result(header: AccountHeader) -> DetectionResult:
+    """The unscored DetectionResult of a user whose header says they are suspended or not found"""
+    return DetectionResult(header.username, error=f"Account {header.status.replace('_', ' ')}", account_status=header.status)
+
+
+def print_result(result: DetectionResult):
+    print(f"--- Detection Results for {result.username} ---")
+    if result.error is not None:
+        print(f"Error: {result.error}")
+    else:
+        print(f"Suspicious: {result.is_suspicious}")
+        print(f"Confidence Score: {result.score:.0%}")
+        if result.stage is not None:
+            print(f"Scored by Stage: {result.stage}")
+        if "copy_count" in result.features:
+            print(f"Copied Comments: {result.features['copy_count']}")
+    if result.trace is not None:
+        stages = ", ".join(f"{stage['stage']} {stage['ms']:.0f} ms" for stage in result.trace.to_dict()["stages"])
+        print(f"Time: {result.trace.total_ms:.0f} ms to fetch ({stages})")
+    print(f"-----------------------")
 
 def main():
+    import praw
+    from dotenv import load_dotenv
+    from src.reddit_requestor import RateLimitedRequestor
+
     load_dotenv()
     client_id = os.getenv("REDDIT_CLIENT_ID")
     client_secret = os.getenv("REDDIT_CLIENT_SECRET")
@@ -88,8 +239,9 @@ def main():
                      client_secret = client_secret, 
                      username = username, 
                      password = password,
-                     user_agent = user_agent) 
-    detector = BotDetector(reddit)
+                     user_agent = user_agent,
+                     requestor_class = RateLimitedRequestor) 
+    detector = BotDetector(reddit, profile_cache=ProfileCache(), copy_index=CopyIndex("copy_index.sqlite"))
 
     detector.check_user("TheAttraction-Signal") 
     detector.check_user("GoldenRaptorGaming")
@@ -0,0 +1,144 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from src.bot_detector import BotDetector, load_model, print_result, account_status_result, USER_WORKERS, SUSPICIOUS_THRESHOLD
+from src.account_headers import AccountHeader
+from src.detection_result import DetectionResult
+from src.feature_schema import FEATURE_COLUMNS, to_feature_vector
+from src.profile_features import get_profile_features, features_from_sources, required_fields
+from src.user_data_fetcher import FIELD_SOURCES
+from src.instrumentation import get_instrumentation
+
+
+STAGE_ONE_SOURCES = ("about",) #one request per user
+STAGE_ONE_FEATURES = features_from_sources(STAGE_ONE_SOURCES, FEATURE_COLUMNS)
+STAGE_ONE_MODEL_PATH = os.getenv("BOT_DETECTOR_STAGE_ONE_MODEL", "models/bot_detector_stage_one.pkl")
+UNCERTAINTY_BAND = (0.1, 0.9) #stage one scores inside it go on to the full model
+MIN_REQUESTS = {"about": 1, "listings": 1, "trophies": 1, "arctic_shift": 2} #fewest requests a fetch of each source sends
+
+
+def evaluate_cascade(stage_one_proba, full_proba, labels, band: tuple = UNCERTAINTY_BAND) -> dict:
+    """Returns how a cascade with band would have done, from the stage one and full model probabilities of labeled users
+
+    Use out of fold probabilities (see train_model.py --cascade), so neither model has seen the users it scores.
+    """
+    stage_one_proba, full_proba, labels = np.asarray(stage_one_proba), np.asarray(full_proba), np.asarray(labels)
+    low, high = band
+    exits = (stage_one_proba < low) | (stage_one_proba > high)
+    cascade_proba = np.where(exits, stage_one_proba, full_proba)
+    return {
+        "band": [low, high],
+        "exit_rate": float(exits.mean()),
+        "cascade_accuracy": float(((cascade_proba > SUSPICIOUS_THRESHOLD) == labels).mean()),
+        "full_accuracy": float(((full_proba > SUSPICIOUS_THRESHOLD) == labels).mean()),
+        "stage_one_exit_accuracy": float(((stage_one_proba[exits] > SUSPICIOUS_THRESHOLD) == labels[exits]).mean()) if exits.any() else None
+    }
+
+
+class CascadeDetector:
+    """This class scores users in two stages, so the expensive fetch only runs for users the cheap one is unsure about
+
+    Stage one fetches only the about fields (one request) and scores the about only features (karma split, age,
+    verified email, name pattern, default icon) with a small model trained on them alone. A user whose stage one
+    score is outside the uncertainty band is done: the score is confident enough. Only users inside it go on to
+    stage two, the full fetch and the detector's full model. Stage two reuses what stage one fetched, and its
+    scores are computed together with one predict_proba call like BotDetector.check_users.
+
+    Each result's stage says which model scored it. cascade_stats() counts how often each stage exits and the
+    fetches (and at least how many requests) the stage one exits skipped. Pick the band with
+    train_model.py --cascade, which reports the exit rate and accuracy of several bands on held out folds.
+
+        Attributes:
+            detector (BotDetector): Fetches users and holds the full model, stage two is its check
+            stage_one_path (str): The file of the stage one model, trained on stage_one_features only
+            band (tuple): (low, high), stage one scores from low to high go on to stage two
+            stage_one_features (list[str]): The features of the stage one model, in its column order
+    """
+    def __init__(self, detector: BotDetector, stage_one_path: str = STAGE_ONE_MODEL_PATH, band: tuple = UNCERTAINTY_BAND,
+                 stage_one_features: list[str] = STAGE_ONE_FEATURES):
+        low, high = band
+        if not 0 <= low <= high <= 1:
+            raise ValueError(f"The uncertainty band must be 0 <= low <= high <= 1, got {band}")
+        self.detector = detector
+        self.stage_one_path = stage_one_path
+        self.band = (low, high)
+        self.stage_one_features = list(stage_one_features)
+        self.stage_one_fields = required_fields(self.stage_one_features)
+        self.loaded_stage_one_model = None
+
+        stage_one_sources = {FIELD_SOURCES[field] for field in self.stage_one_fields}
+        #what a stage one exit does not fetch, compared to the full check
+        self.skipped_sources = sorted({FIELD_SOURCES[field] for field in detector.required_fields} - stage_one_sources)
+        self.lock = threading.Lock()
+        self.stats = {"users": 0, "failed": 0, "stage_one_exits": 0, "stage_two": 0}
+
+    @property
+    def praw_instance(self):
+        return self.detector.praw_instance
+
+    @property
+    def stage_one_model(self):
+        """The stage one model, loaded like the detector's model the first time a user is scored"""
+        if self.loaded_stage_one_model is None:
+            self.loaded_stage_one_model = load_model(self.stage_one_path, self.detector.mmap_mode, self.detector.compiled)
+        return self.loaded_stage_one_model
+
+    def __check__(self, username: str, header: AccountHeader = None) -> DetectionResult:
+        """Runs stage one on a user, and the stage two fetch and features if the score is inside the band"""
+        if header is not None and not header.exists:
+            return account_status_result(header)
+        with get_instrumentation().trace(username) as trace:
+            try:
+                profile = self.detector.fetch_profile(username, self.stage_one_fields, header)
+                features = get_profile_features(profile, features=self.stage_one_features)
+                with get_instrumentation().stage("inference.stage_one"):
+                    #one row at a time, so a confident user is done without waiting for the others' fetches
+                    row = np.array([to_feature_vector(features, self.stage_one_features)], dtype=np.float64)
+                    score = float(self.stage_one_model.predict_proba(row)[0, 1])
+                low, high = self.band
+                if score < low or score > high:
+                    return DetectionResult(username, score=score, is_suspicious=score > SUSPICIOUS_THRESHOLD, features=features,
+                                           trace=trace, stage=1)
+                return DetectionResult(username, features=self.detector.get_profile_features(profile), trace=trace, stage=2)
+            except Exception as e:
+                get_instrumentation().record_error("fetch", e)
+                return DetectionResult(username, error=f"{type(e).__name__}: {e}", trace=trace)
+
+    def check_users(self, usernames: list[str], max_workers: int = USER_WORKERS, account_ids: dict = None) -> list[DetectionResult]:
+        """Scores many users at once, the same as BotDetector.check_users but through the cascade
+        """
+        headers = self.detector.get_headers(usernames, account_ids)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(self.__check__, usernames, [headers.get(username) for username in usernames]))
+        exits = [result for result in results if result.stage == 1]
+        self.detector.score_results([result for result in results if result.stage != 1])
+        for result in exits: #score_results logs the traces of the others
+            get_instrumentation().log_trace(result.trace)
+
+        with self.lock:
+            self.stats["users"] += len(results)
+            self.stats["failed"] += sum(result.error is not None for result in results)
+            self.stats["stage_one_exits"] += len(exits)
+            self.stats["stage_two"] += sum(result.stage == 2 for result in results)
+        return results
+
+    def check_user(self, username: str) -> DetectionResult:
+        result = self.check_users([username], max_workers=1)[0]
+        print_result(result)
+        return result
+
+    def cascade_stats(self) -> dict:
+        """Returns the counts of users, failed users and exits at each stage, the exit_rate of stage one, and what its
+        exits skipped: the fetches of each source and the fewest requests those fetches send (listings send more
+        when a user has more than one page of activity, so the real savings are higher)
+        """
+        with self.lock:
+            stats = dict(self.stats)
+        scored = stats["stage_one_exits"] + stats["stage_two"]
+        stats["exit_rate"] = round(stats["stage_one_exits"] / scored, 4) if scored else 0.0
+        stats["skipped_fetches"] = {source: stats["stage_one_exits"] for source in self.skipped_sources}
+        stats["min_requests_saved"] = stats["stage_one_exits"] * sum(MIN_REQUESTS[source] for source in self.skipped_sources)
+        stats["band"] = list(self.band)
+        return stats
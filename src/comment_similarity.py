@@ -0,0 +1,88 @@
+import threading
+import numpy as np
+
+
+"""Computes avg_comment_similarity without fitting a TfidfVectorizer per user
+
+The feature is the mean cosine similarity over every pair of a user's recent comments, each comment weighted with
+TF-IDF fitted on that user's comments alone (smooth idf, l2 norm, English stop words). Fitting a vectorizer and
+building the dense similarity matrix for every user is what made it slow, so here:
+
+    - one analyzer, taken from TfidfVectorizer(stop_words='english') once, turns comments into tokens for every user
+    - the idf of each user is computed from document frequencies with the same formula sklearn uses
+    - the mean over the upper triangle comes straight from the l2 normalized rows v: the sum of every pairwise
+      similarity is (|sum of v|^2 - sum of |v|^2) / 2, so no n x n matrix is built
+
+Fidelity: the values equal sklearn's fit_transform + cosine_similarity + upper triangle mean up to float rounding
+(around 1e-16). scripts/check_similarity_fidelity.py compares both on any comments and fails above 1e-9, run it
+after touching this file so the trained model keeps getting the values it was trained on. The only difference is a
+user whose comments are all stop words or too short for a token: sklearn raised "empty vocabulary" for them and
+they got no features at all, here they get 0.0.
+"""
+
+analyzer = None
+analyzer_lock = threading.Lock()
+
+
+def get_analyzer():
+    """Returns the tokenizer shared by every user: lowercases, splits into 2+ character words and drops English stop words
+    """
+    global analyzer
+    with analyzer_lock:
+        if analyzer is None:
+            from sklearn.feature_extraction.text import TfidfVectorizer
+            analyzer = TfidfVectorizer(stop_words='english').build_analyzer()
+        return analyzer
+
+
+def get_mean_pairwise_similarity_batch(comment_lists: list) -> np.ndarray:
+    """Returns the mean pairwise TF-IDF cosine similarity of each list of comments, 0.0 for lists with under 2 comments
+
+    Every list gets its own idf, exactly as fitting one TfidfVectorizer per list would, but all of them are weighted
+    and summed together in a few array operations.
+    """
+    analyze = get_analyzer()
+    user_count = len(comment_lists)
+    document_counts = np.fromiter((len(comments) for comments in comment_lists), dtype=np.int64, count=user_count)
+
+    #one row per (document, term) with how often the term is in the document
+    vocabulary = {}
+    document_ids, term_ids = [], []
+    document = 0
+    for comments in comment_lists:
+        for comment in comments:
+            for token in analyze(comment):
+                document_ids.append(document)
+                term_ids.append(vocabulary.setdefault(token, len(vocabulary)))
+            document += 1
+    term_count = max(len(vocabulary), 1)
+    document_owners = np.repeat(np.arange(user_count), document_counts)
+    entries, term_frequency = np.unique(np.array(document_ids, dtype=np.int64) * term_count + np.array(term_ids, dtype=np.int64), return_counts=True)
+    entry_documents, entry_terms = np.divmod(entries, term_count)
+    entry_owners = document_owners[entry_documents]
+
+    #document frequency of each term inside its user's comments, and sklearn's smooth idf
+    user_terms, entry_user_term, document_frequency = np.unique(entry_owners * term_count + entry_terms, return_inverse=True, return_counts=True)
+    n_samples = document_counts[entry_owners].astype(np.float64) + 1
+    idf = np.log(n_samples / (document_frequency[entry_user_term].astype(np.float64) + 1)) + 1
+
+    #l2 normalized tf-idf weights
+    weights = term_frequency * idf
+    row_norms = np.sqrt(np.bincount(entry_documents, weights=weights * weights, minlength=document_owners.size))
+    weights = weights / row_norms[entry_documents]
+
+    #sum of every pairwise similarity per user = (|sum of rows|^2 - sum of |row|^2) / 2
+    summed_rows = np.bincount(entry_user_term, weights=weights, minlength=user_terms.size)
+    summed_row_norms = np.bincount(user_terms // term_count, weights=summed_rows * summed_rows, minlength=user_count)
+    row_norms_sum = np.bincount(document_owners, weights=(row_norms > 0).astype(np.float64), minlength=user_count)
+    pair_counts = document_counts * (document_counts - 1)
+    pair_similarity_sums = np.maximum(summed_row_norms - row_norms_sum, 0.0) #rounding can leave a tiny negative where sklearn gives 0
+    return np.divide(pair_similarity_sums, pair_counts, out=np.zeros(user_count), where=document_counts >= 2)
+
+
+def get_mean_pairwise_similarity(comments: list[str]) -> float:
+    """Returns the mean pairwise TF-IDF cosine similarity of one list of comments
+    """
+    if len(comments) < 2:
+        return 0.0
+    return float(get_mean_pairwise_similarity_batch([comments])[0])
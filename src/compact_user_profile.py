@@ -0,0 +1,68 @@
+import sys
+import numpy as np
+
+from src.user_data_fetcher import UserProfile, PROFILE_FIELDS
+from src.account_activity_check import activity_matrix
+from src.account_content_check import SHORT_COMMENT_CUTOFF, SIMILARITY_COMMENT_LIMIT
+
+
+class CompactUserProfile():
+    """ This class stores the same data as UserProfile in a fraction of the memory, for keeping many profiles around to re-score
+
+    The 900 (timestamp, karma) pairs live in one n x 2 float64 array instead of a list of tuples, subreddit names
+    are interned so every profile shares one copy of each name, and there is no per instance __dict__. The array
+    indexes, iterates and unpacks like the list of pairs, and AccountActivityCheck reads it without converting.
+
+    With trim_comments, only the comments short_comment_ratio and avg_comment_similarity read in full (the first
+    SIMILARITY_COMMENT_LIMIT) are kept whole. Every later comment is cut to SHORT_COMMENT_CUTOFF characters, which
+    keeps whether it counts as short, so those two features come out the same. copy_count does not: it shingles
+    every whole comment through the CopyIndex, so get_profile_features raises ValueError for copy_count of a profile
+    that had comments cut (comments_trimmed). Only trim profiles that are re-scored without a copy index.
+
+    Attributes:
+        account_name (str): The name of the reddit account
+        account_timestamp (float): Unix timestamp of the reddit account
+        timestamps_and_karma (np.ndarray): An n x 2 array of (timestamp of the post/comment, karma of the post/comment) of the
+                                           accounts last up to 900 posts and comments, newest first
+        oldest_timestamp (float): The Unix timestamp of a reddit's account first activity
+        comments (list[str]): The most recent comments of a account, see trim_comments
+        subreddits (tuple[str]): All the subreddits a user participates in based on the last 200 posts and 200 comments
+        comment_karma (int): An integer representing the karma the account has from commenting
+        link_karma (int): An integer representing the karma the account has from posting
+        verified_email (bool): Returns if user email is verfied for the account
+        trophy_count (int): The amount of trophies a account has earned (different from reddit achievements)
+        profile_picture (str): The image link of the profile picture
+        comments_trimmed (bool): If trim_comments cut any comment, so copy_count can no longer be computed
+    """
+    __slots__ = (*PROFILE_FIELDS, "comments_trimmed")
+
+    def __init__(self, account_name: str, account_timestamp: float, timestamps_and_karma, oldest_timestamp: float,
+                 comments: list[str], subreddits: list[str], comment_karma: int, link_karma: int, verified_email: bool,
+                 trophy_count: int, profile_picture: str, trim_comments: bool = False):
+        self.account_name = account_name
+        self.account_timestamp = account_timestamp
+        self.timestamps_and_karma = np.array(activity_matrix(timestamps_and_karma)) #its own copy, never a view of the caller's array
+        self.oldest_timestamp = oldest_timestamp
+        self.comments_trimmed = trim_comments and any(len(comment) > SHORT_COMMENT_CUTOFF for comment in comments[SIMILARITY_COMMENT_LIMIT:])
+        if self.comments_trimmed:
+            comments = comments[:SIMILARITY_COMMENT_LIMIT] + [comment[:SHORT_COMMENT_CUTOFF] for comment in comments[SIMILARITY_COMMENT_LIMIT:]]
+        self.comments = comments
+        self.subreddits = tuple(sys.intern(subreddit) for subreddit in subreddits)
+        self.comment_karma = comment_karma
+        self.link_karma = link_karma
+        self.verified_email = verified_email
+        self.trophy_count = trophy_count
+        self.profile_picture = sys.intern(profile_picture) if isinstance(profile_picture, str) else profile_picture
+
+    @classmethod
+    def from_profile(cls, profile: UserProfile, trim_comments: bool = False) -> "CompactUserProfile":
+        return cls(trim_comments=trim_comments, **{field: getattr(profile, field) for field in PROFILE_FIELDS})
+
+    def to_profile(self) -> UserProfile:
+        return UserProfile.from_dict(self.to_dict())
+
+    def to_dict(self) -> dict:
+        values = {field: getattr(self, field) for field in PROFILE_FIELDS}
+        values["timestamps_and_karma"] = self.timestamps_and_karma.tolist()
+        values["subreddits"] = list(self.subreddits)
+        return values
@@ -0,0 +1,189 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import numpy as np
+
+
+MIN_COMMENT_LENGTH = 20 #shorter comments are too generic to call copies
+SHINGLE_SIZE = 5 #characters per shingle
+NUM_PERM = 128 #MinHash values per signature
+BANDS = 32 #LSH bands, NUM_PERM / BANDS values each
+THRESHOLD = 0.6 #estimated Jaccard similarity of the shingles from which two comments count as copies
+QUERY_CHUNK = 500 #bucket keys per SQL query, under SQLite's variable limit
+
+NON_WORD = re.compile(r"[\W_]+")
+
+
+def normalize(text: str) -> str:
+    """Lowercases and turns every run of punctuation and whitespace into one space"""
+    return NON_WORD.sub(" ", text.lower()).strip()
+
+
+class CopyIndex:
+    """This class finds comments that near duplicate comments of other authors, without any external search
+
+    Every comment is cut into overlapping SHINGLE_SIZE character shingles and summed up in a MinHash signature,
+    the share of equal values between two signatures estimates the Jaccard similarity of their shingles. The
+    signature is split into bands and each band is hashed into a bucket, so only comments sharing a bucket with
+    the query are ever compared. With the defaults (32 bands of 4 values), comments of Jaccard similarity 0.6
+    share a bucket with a probability of 1 - (1 - 0.6^4)^32, about 0.988, and from 0.7 above 0.999: the same
+    typo-level edits the fuzz.ratio >= 85 check of SearchReddit caught.
+
+    Entries and buckets are kept in SQLite, in memory by default or in a file to build the index up across runs.
+    A lookup is one indexed query, well under a millisecond for a single comment.
+
+        Attributes:
+            path (str): The SQLite file the index is kept in, ":memory:" keeps it for this process only
+            num_perm (int): MinHash values per signature
+            bands (int): LSH bands the signature is split into, must divide num_perm
+            threshold (float): Estimated Jaccard similarity from which a candidate counts as a copy
+            stats (dict): Counts of added comments, queries and matches found
+    """
+    def __init__(self, path: str = ":memory:", num_perm: int = NUM_PERM, bands: int = BANDS, threshold: float = THRESHOLD, seed: int = 0):
+        if num_perm % bands != 0:
+            raise ValueError(f"bands ({bands}) must divide num_perm ({num_perm})")
+        self.path = path
+        self.num_perm = num_perm
+        self.bands = bands
+        self.threshold = threshold
+        self.stats = {"added": 0, "queries": 0, "matches": 0}
+
+        #multiply-shift hash functions, the uint64 products wrap around on purpose
+        rng = np.random.default_rng(seed)
+        self.multipliers = rng.integers(1, 2**63, num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self.increments = rng.integers(0, 2**63, num_perm, dtype=np.uint64)
+        self.shingle_weights = np.uint64(256) ** np.arange(SHINGLE_SIZE, dtype=np.uint64)
+
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self.connection:
+            self.connection.execute(
+                """CREATE TABLE IF NOT EXISTS comments (
+                    id INTEGER PRIMARY KEY,
+                    author TEXT NOT NULL,
+                    text_hash INTEGER NOT NULL,
+                    signature BLOB NOT NULL,
+                    UNIQUE (author, text_hash)
+                )"""
+            )
+            self.connection.execute(
+                """CREATE TABLE IF NOT EXISTS buckets (
+                    bucket INTEGER NOT NULL,
+                    comment_id INTEGER NOT NULL
+                )"""
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS buckets_by_key ON buckets (bucket)")
+
+    def __hash_int__(self, data: bytes) -> int:
+        return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little", signed=True)
+
+    def signature(self, text: str):
+        """Returns the MinHash signature of a comment, None if it is too short to compare
+        """
+        data = normalize(text).encode("utf-8")
+        if len(data) < max(MIN_COMMENT_LENGTH, SHINGLE_SIZE):
+            return None
+        windows = np.lib.stride_tricks.sliding_window_view(np.frombuffer(data, dtype=np.uint8), SHINGLE_SIZE)
+        shingles = np.unique(windows.astype(np.uint64) @ self.shingle_weights) #5 bytes fit in 40 bits, no collisions
+        hashes = self.multipliers[:, None] * shingles[None, :] + self.increments[:, None]
+        return (hashes.min(axis=1) >> np.uint64(32)).astype(np.uint32)
+
+    def __buckets__(self, signature: np.ndarray) -> list[int]:
+        rows = signature.reshape(self.bands, -1)
+        return [self.__hash_int__(band.to_bytes(2, "little") + rows[band].tobytes()) for band in range(self.bands)]
+
+    def add(self, author: str, text: str) -> bool:
+        """Adds one comment of author to the index, returns False if it is too short or already in it
+        """
+        return self.add_comments(author, [text]) == 1
+
+    def add_comments(self, author: str, comments: list[str]) -> int:
+        """Adds the comments of author to the index in one transaction, returns how many were new
+        """
+        author = author.lower()
+        added = 0
+        with self.lock, self.connection:
+            for text in comments:
+                signature = self.signature(text)
+                if signature is None:
+                    continue
+                cursor = self.connection.execute(
+                    "INSERT OR IGNORE INTO comments (author, text_hash, signature) VALUES (?, ?, ?)",
+                    (author, self.__hash_int__(normalize(text).encode("utf-8")), signature.tobytes())
+                )
+                if cursor.rowcount == 0:
+                    continue
+                self.connection.executemany(
+                    "INSERT INTO buckets (bucket, comment_id) VALUES (?, ?)",
+                    [(bucket, cursor.lastrowid) for bucket in self.__buckets__(signature)]
+                )
+                added += 1
+            self.stats["added"] += added
+        return added
+
+    def __candidates__(self, buckets: list[int]) -> (dict, dict):
+        """Returns {bucket: [comment id]} and {comment id: (author, signature)} of every indexed comment in any of the buckets"""
+        bucket_members, entries = {}, {}
+        with self.lock:
+            for start in range(0, len(buckets), QUERY_CHUNK):
+                chunk = buckets[start:start + QUERY_CHUNK]
+                rows = self.connection.execute(
+                    f"""SELECT buckets.bucket, comments.id, comments.author, comments.signature
+                        FROM buckets JOIN comments ON comments.id = buckets.comment_id
+                        WHERE buckets.bucket IN ({",".join("?" * len(chunk))})""",
+                    chunk
+                ).fetchall()
+                for bucket, comment_id, author, signature in rows:
+                    bucket_members.setdefault(bucket, []).append(comment_id)
+                    if comment_id not in entries:
+                        entries[comment_id] = (author, np.frombuffer(signature, dtype=np.uint32))
+        return bucket_members, entries
+
+    def find_copies_batch(self, comments: list[str], exclude_author: str = None) -> list[list[dict]]:
+        """Returns, for each comment, the near duplicates by other authors as {"copy_author", "similarity"}, most similar first
+
+        All the comments are looked up with the same few queries.
+        """
+        exclude_author = exclude_author.lower() if exclude_author is not None else None
+        signatures = [self.signature(text) for text in comments]
+        comment_buckets = [self.__buckets__(signature) if signature is not None else [] for signature in signatures]
+        bucket_members, entries = self.__candidates__(list({bucket for buckets in comment_buckets for bucket in buckets}))
+
+        copies = []
+        for signature, buckets in zip(signatures, comment_buckets):
+            candidate_ids = list({comment_id for bucket in buckets for comment_id in bucket_members.get(bucket, ())})
+            if not candidate_ids:
+                copies.append([])
+                continue
+            candidate_signatures = np.stack([entries[comment_id][1] for comment_id in candidate_ids])
+            similarities = (candidate_signatures == signature).mean(axis=1)
+            matches = {}
+            for index in np.flatnonzero(similarities >= self.threshold):
+                author = entries[candidate_ids[index]][0]
+                if author != exclude_author:
+                    matches[author] = max(matches.get(author, 0.0), float(similarities[index]))
+            copies.append([{"copy_author": author, "similarity": similarity}
+                           for author, similarity in sorted(matches.items(), key=lambda match: -match[1])])
+        with self.lock:
+            self.stats["queries"] += len(comments)
+            self.stats["matches"] += sum(len(matches) for matches in copies)
+        return copies
+
+    def find_copies(self, text: str, exclude_author: str = None) -> list[dict]:
+        """Returns the near duplicates of one comment by authors other than exclude_author
+        """
+        return self.find_copies_batch([text], exclude_author)[0]
+
+    def count_copied(self, author: str, comments: list[str]) -> int:
+        """Returns how many of the comments of author near duplicate a comment of another author
+        """
+        return sum(1 for matches in self.find_copies_batch(comments, exclude_author=author) if matches)
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM comments").fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
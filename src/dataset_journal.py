@@ -0,0 +1,124 @@
+import csv
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+DONE = "done"
+FAILED = "failed" #might work on a rerun (rate limits, timeouts, Arctic Shift down)
+NOT_FOUND = "not_found" #deleted, suspended or private, never retried
+STATUSES = (DONE, FAILED, NOT_FOUND)
+
+
+def to_builtin(value):
+    """json.dumps default for the numpy scalars some checks return"""
+    return value.item()
+
+
+class DatasetJournal:
+    """This class records every user the dataset builder has processed, with their feature row, in one SQLite file
+
+    A user's status and row are written in the same transaction, so a crash at any point leaves each user either
+    fully recorded or not at all, never a torn row. Lookups by username are indexed, so a rerun skips done and
+    not_found users instantly and only retries the failed ones. The rows are exported to CSV for training.
+
+    Only one thread should write (record_*), any number may read.
+
+        Attributes:
+            path (str): The SQLite file of the journal
+    """
+    def __init__(self, path: str = "build_journal.sqlite"):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self.connection:
+            self.connection.execute(
+                """CREATE TABLE IF NOT EXISTS users (
+                    username TEXT PRIMARY KEY,
+                    label INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    reason TEXT,
+                    attempts INTEGER NOT NULL,
+                    updated_at REAL NOT NULL,
+                    features TEXT
+                )"""
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS users_by_status ON users (status)")
+
+    def statuses(self) -> dict:
+        """Returns {username: status} of every recorded user"""
+        with self.lock:
+            return dict(self.connection.execute("SELECT username, status FROM users").fetchall())
+
+    def __record__(self, username: str, label: int, status: str, reason: str = None, features: dict = None):
+        with self.lock, self.connection:
+            self.connection.execute(
+                """INSERT INTO users (username, label, status, reason, attempts, updated_at, features) VALUES (?, ?, ?, ?, 1, ?, ?)
+                   ON CONFLICT (username) DO UPDATE SET label = excluded.label, status = excluded.status, reason = excluded.reason,
+                   attempts = attempts + 1, updated_at = excluded.updated_at, features = excluded.features""",
+                (username, label, status, reason, time.time(), json.dumps(features, default=to_builtin) if features is not None else None)
+            )
+
+    def record_done(self, username: str, label: int, features: dict):
+        self.__record__(username, label, DONE, features=features)
+
+    def record_failed(self, username: str, label: int, reason: str):
+        self.__record__(username, label, FAILED, reason=reason)
+
+    def record_not_found(self, username: str, label: int, reason: str):
+        self.__record__(username, label, NOT_FOUND, reason=reason)
+
+    def counts(self) -> dict:
+        """Returns how many users have each status"""
+        with self.lock:
+            counts = dict(self.connection.execute("SELECT status, COUNT(*) FROM users GROUP BY status").fetchall())
+        return {status: counts.get(status, 0) for status in STATUSES}
+
+    def failures(self) -> list:
+        """Returns (username, status, reason, attempts) of every failed or not_found user"""
+        with self.lock:
+            return self.connection.execute(
+                "SELECT username, status, reason, attempts FROM users WHERE status != ? ORDER BY username", (DONE,)
+            ).fetchall()
+
+    def rows(self):
+        """Yields (username, label, features) of every done user"""
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT username, label, features FROM users WHERE status = ? ORDER BY rowid", (DONE,)
+            ).fetchall()
+        for username, label, features in rows:
+            yield username, label, json.loads(features)
+
+    def import_csv(self, filename: str) -> int:
+        """Records the rows of a CSV written by an earlier build as done, returns how many were new"""
+        if not os.path.exists(filename):
+            return 0
+        known = self.statuses()
+        imported = 0
+        with open(filename, 'r', newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                if row["username"] in known:
+                    continue
+                features = {key: value for key, value in row.items() if key not in ("username", "is_bot")}
+                self.record_done(row["username"], int(row["is_bot"]), features)
+                imported += 1
+        return imported
+
+    def export_csv(self, filename: str, header: list[str]):
+        """Writes every done row to filename, replacing it only once the new file is complete"""
+        temporary = f"{filename}.tmp"
+        with open(temporary, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=header, extrasaction="ignore")
+            writer.writeheader()
+            for username, label, features in self.rows():
+                writer.writerow({**features, "username": username, "is_bot": label})
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, filename)
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,134 @@
+import csv
+import json
+import os
+import threading
+import numpy as np
+
+from src.feature_schema import FEATURE_COLUMNS, ID_COLUMN, LABEL_COLUMN, to_feature_vector
+
+
+FORMAT_VERSION = 1
+SCHEMA_FILE = "schema.json"
+FEATURES_FILE = "features.f64" #row-major float64, one row of len(columns) values per user
+LABELS_FILE = "labels.i8" #one int8 label per user
+USERNAMES_FILE = "usernames.txt" #one username per line
+
+
+class DatasetStore:
+    """This class keeps the training dataset as raw binary arrays in a directory, so training maps it instead of parsing it
+
+    The feature matrix is one row-major float64 file that np.memmap opens in place: features() returns it without
+    reading or converting anything, and sklearn can take it as X directly. Labels and usernames sit next to it,
+    and schema.json records the columns once, so a store is never read with the wrong column order.
+
+    Rows are only ever appended. Each append writes the usernames, features and labels and syncs them to disk; if
+    a crash leaves the three files with different row counts, opening the store cuts them back to the rows all three
+    have, so every row is either complete or gone.
+
+    Only one thread or process should append, any number may read.
+
+        Attributes:
+            path (str): The directory of the store
+            columns (list[str]): The feature columns, in the order of the matrix
+    """
+    def __init__(self, path: str = "training_data", columns: list[str] = None):
+        self.path = path
+        self.lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        schema_path = os.path.join(path, SCHEMA_FILE)
+        if os.path.exists(schema_path):
+            with open(schema_path, encoding="utf-8") as f:
+                schema = json.load(f)
+            if schema.get("format_version") != FORMAT_VERSION:
+                raise ValueError(f"{path} has format version {schema.get('format_version')}, expected {FORMAT_VERSION}")
+            if columns is not None and schema["columns"] != list(columns):
+                raise ValueError(f"{path} was built with the columns {schema['columns']}, not {list(columns)}")
+            self.columns = schema["columns"]
+        else:
+            self.columns = list(columns if columns is not None else FEATURE_COLUMNS)
+            with open(schema_path, "w", encoding="utf-8") as f:
+                json.dump({"format_version": FORMAT_VERSION, "columns": self.columns, "dtype": "float64"}, f, indent=2)
+        self.row_count = self.__repair__()
+
+    def __path_of__(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def __repair__(self) -> int:
+        """Cuts the files back to the rows complete in all three, returns how many that is"""
+        row_bytes = len(self.columns) * 8
+        for name in (FEATURES_FILE, LABELS_FILE, USERNAMES_FILE):
+            open(self.__path_of__(name), "ab").close()
+        with open(self.__path_of__(USERNAMES_FILE), "rb") as f:
+            line_ends = np.flatnonzero(np.frombuffer(f.read(), dtype=np.uint8) == ord("\n")) + 1
+        rows = min(os.path.getsize(self.__path_of__(FEATURES_FILE)) // row_bytes, os.path.getsize(self.__path_of__(LABELS_FILE)), len(line_ends))
+        for name, size in ((FEATURES_FILE, rows * row_bytes), (LABELS_FILE, rows), (USERNAMES_FILE, int(line_ends[rows - 1]) if rows else 0)):
+            if os.path.getsize(self.__path_of__(name)) != size:
+                os.truncate(self.__path_of__(name), size)
+        return rows
+
+    def __len__(self) -> int:
+        return self.row_count
+
+    def append(self, rows: list):
+        """Appends (username, label, features dict) rows, features missing from a row are stored as nan
+        """
+        if not rows:
+            return
+        matrix = np.array([to_feature_vector({column: None for column in self.columns} | features, self.columns) for _, _, features in rows],
+                          dtype=np.float64).reshape(len(rows), len(self.columns))
+        labels = np.array([int(label) for _, label, _ in rows], dtype=np.int8)
+        usernames = "".join(f"{username}\n" for username, _, _ in rows).encode("utf-8")
+        with self.lock:
+            for name, data in ((USERNAMES_FILE, usernames), (FEATURES_FILE, matrix.tobytes()), (LABELS_FILE, labels.tobytes())):
+                with open(self.__path_of__(name), "ab") as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+            self.row_count += len(rows)
+
+    def features(self, columns: list[str] = None) -> np.ndarray:
+        """Returns the n x len(columns) feature matrix, memory mapped read only when columns is the stored order
+        """
+        if self.row_count == 0:
+            matrix = np.empty((0, len(self.columns)), dtype=np.float64)
+        else:
+            matrix = np.memmap(self.__path_of__(FEATURES_FILE), dtype=np.float64, mode="r", shape=(self.row_count, len(self.columns)))
+        if columns is None or list(columns) == self.columns:
+            return matrix
+        return matrix[:, [self.columns.index(column) for column in columns]]
+
+    def labels(self) -> np.ndarray:
+        if self.row_count == 0:
+            return np.empty(0, dtype=np.int8)
+        return np.memmap(self.__path_of__(LABELS_FILE), dtype=np.int8, mode="r", shape=(self.row_count,))
+
+    def usernames(self) -> list[str]:
+        with open(self.__path_of__(USERNAMES_FILE), encoding="utf-8") as f:
+            return f.read().splitlines()[:self.row_count]
+
+    def import_csv(self, filename: str, chunk_size: int = 10000) -> int:
+        """Appends the rows of a CSV with CSV_HEADER's columns, returns how many were appended
+        """
+        appended = 0
+        with open(filename, "r", newline="", encoding="utf-8") as f:
+            chunk = []
+            for row in csv.DictReader(f):
+                chunk.append((row[ID_COLUMN], int(row[LABEL_COLUMN]), {column: row.get(column) for column in self.columns}))
+                if len(chunk) == chunk_size:
+                    self.append(chunk)
+                    appended += len(chunk)
+                    chunk = []
+            self.append(chunk)
+            appended += len(chunk)
+        return appended
+
+    def export_csv(self, filename: str):
+        """Writes every row to a CSV with CSV_HEADER's columns (for the stored columns), booleans come out as 1.0 and 0.0
+        """
+        header = [ID_COLUMN, LABEL_COLUMN] + self.columns
+        with open(filename, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            for username, label, row in zip(self.usernames(), self.labels(), self.features()):
+                writer.writerow([username, int(label)] + [repr(float(value)) if not np.isnan(value) else "" for value in row])
+
@@ -0,0 +1,24 @@
+class DetectionResult():
+    """ This class stores the outcome of scoring one user
+
+    Attributes:
+        username (str): The name of the reddit account that was scored
+        score (float): The model's probability of the account being a bot, None if the user could not be scored
+        is_suspicious (bool): If the score is above the detector's cut off
+        features (dict): The feature values the model was given, keyed by feature name
+        error (str): Why the user could not be scored, None when scoring worked
+        trace (Trace): Where the time to score the user went, None unless instrumentation is enabled
+        stage (int): The CascadeDetector stage the score came from, 1 for the about only model and 2 for the full one,
+                     None when the user was not scored by a cascade
+        account_status (str): "suspended" or "not_found" when the account lookup found the user gone, None otherwise
+    """
+    def __init__(self, username: str, score: float = None, is_suspicious: bool = False, features: dict = None, error: str = None,
+                 trace=None, stage: int = None, account_status: str = None):
+        self.username = username
+        self.score = score
+        self.is_suspicious = is_suspicious
+        self.features = features if features is not None else {}
+        self.error = error
+        self.trace = trace
+        self.stage = stage
+        self.account_status = account_status
@@ -0,0 +1,46 @@
+import math
+
+
+"""The features the model is trained on and scored with, in the order of the model's input columns
+
+Every script and the detector read the columns from here, so adding a feature is one line in FEATURE_COLUMNS
+(and a retrained model).
+"""
+
+FEATURE_COLUMNS = [
+    "karma_ratio", #returns float of the ratio of post karma to comment karma
+    "active_karma_rate", #returns float of the avg karma per day in the last 30 days or less of activity
+    "age_days", #returns int of the age of the account in days
+    "biggest_timestamp", #returns float the largest time between activity in Unix
+    "burst_activity_ratio", #returns float of the ratio of activity that takes place within 65 seconds
+    "first_activity_delay", #returns int of the days of how long it took from account creation to first activity
+    "short_comment_ratio", #returns float of the ratio of comments under 20 characters
+    "avg_comment_similarity", #returns float in the pairwise similarity score of the last 10 comments
+    "verified_email", #returns a boolean of if the account has a verified email
+    "trophy_count", #returns int of how many trophies an account has
+    "name_pattern", #returns boolean if an account has a Word-Word-Num regex name pattern
+    "icon_default", #returns boolean of if the account has the default icon
+    "popular_subreddits_ratio", #returns the ratio of activity of common karma farming subreddits given a list of subs
+    "scammy_subreddits_ratio" #returns the ratio of activity of scam/spam/selling subs given a list of keywords
+]
+ID_COLUMN = "username"
+LABEL_COLUMN = "is_bot"
+# The full CSV header
+CSV_HEADER = [ID_COLUMN, LABEL_COLUMN] + FEATURE_COLUMNS
+
+
+def to_number(value) -> float:
+    """Returns a feature value as the float the model reads: booleans (also the "True"/"False" of a CSV) as 1 and 0,
+    missing values as nan"""
+    if value is None or value == "":
+        return math.nan
+    if value is True or value == "True":
+        return 1.0
+    if value is False or value == "False":
+        return 0.0
+    return float(value)
+
+
+def to_feature_vector(features: dict, columns: list[str] = FEATURE_COLUMNS) -> list[float]:
+    """Returns the values of columns in features as model input"""
+    return [to_number(features[column]) for column in columns]
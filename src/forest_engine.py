@@ -0,0 +1,146 @@
+import numpy as np
+
+
+LEAF = -1 #children_left and children_right of a leaf, as sklearn stores them
+COMPILED_MAX_ROWS = 100 #larger batches go to the kept sklearn forest, its compiled loops win from about there (see benchmarks/forest_benchmark.py)
+
+
+class CompiledForest:
+    """This class holds a trained RandomForestClassifier as a few flat arrays and scores rows with plain NumPy
+
+    Every tree's nodes are concatenated into the same arrays: the feature and threshold each inner node splits on,
+    the global indices of its left and right children, where a missing (nan) value goes, and the class probabilities
+    of each leaf. roots holds the index of each tree's first node. predict_proba walks all rows through all trees at
+    once, one vectorized step per tree level, and averages the leaf probabilities the way the forest does, so one
+    1 x 14 row skips sklearn's input validation and per tree dispatch, which cost more than the traversal itself.
+
+    The walk costs the same per row at any batch size, while sklearn's fixed overhead is spread over the batch, so
+    from about COMPILED_MAX_ROWS rows sklearn is faster. With the forest it was compiled from kept as estimator
+    (see load_model), batches larger than max_rows are scored by it instead.
+
+    Rows are compared as float32, like sklearn's trees do, so the outputs match predict_proba to float rounding.
+    Without an estimator the object only holds numpy arrays, so joblib.load(..., mmap_mode="r") maps them and
+    processes share them.
+
+        Attributes:
+            classes_ (np.ndarray): The class labels, in the order of the predict_proba columns
+            n_features_in_ (int): Features per row
+            roots (np.ndarray): The node index of the root of each tree
+            feature (np.ndarray): The feature each node splits on, 0 for leaves
+            threshold (np.ndarray): Rows with feature <= threshold go left
+            children (np.ndarray): The right then left child of each node (at 2 * node and 2 * node + 1), the node
+                itself for leaves
+            missing_left (np.ndarray): Whether nan values go left at each node
+            value (np.ndarray): The class probabilities of each node (only leaves are read)
+            depth (int): Levels of the deepest tree
+            estimator (RandomForestClassifier): The forest compiled, scores batches larger than max_rows, None if not kept
+            max_rows (int): The most rows scored by the compiled trees when there is an estimator
+    """
+    #forests exported before the estimator was kept are loaded without these
+    estimator = None
+    max_rows = COMPILED_MAX_ROWS
+
+    def __init__(self, classes: np.ndarray, n_features: int, roots: np.ndarray, feature: np.ndarray, threshold: np.ndarray,
+                 children: np.ndarray, missing_left: np.ndarray, value: np.ndarray, depth: int, estimator=None,
+                 max_rows: int = COMPILED_MAX_ROWS):
+        self.classes_ = classes
+        self.n_features_in_ = n_features
+        self.roots = roots
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.missing_left = missing_left
+        self.value = value
+        self.depth = depth
+        self.estimator = estimator
+        self.max_rows = max_rows
+
+    @classmethod
+    def from_sklearn(cls, model, keep_estimator: bool = False) -> "CompiledForest":
+        """Compiles a fitted RandomForestClassifier (or ExtraTreesClassifier) with one output
+
+        With keep_estimator, model scores the batches larger than max_rows. Leave it off for a forest that is
+        exported to be memory mapped, sklearn's trees would be stored with it.
+        """
+        trees = [estimator.tree_ for estimator in model.estimators_]
+        if any(tree.n_outputs != 1 for tree in trees):
+            raise ValueError("Only forests with a single output can be compiled")
+        sizes = np.array([tree.node_count for tree in trees])
+        #indices are kept as np.intp, numpy would convert any other integer type on every lookup
+        roots = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.intp)
+
+        feature, threshold, children, missing_left, value = [], [], [], [], []
+        for root, tree in zip(roots, trees):
+            nodes = np.arange(tree.node_count, dtype=np.intp)
+            is_leaf = tree.children_left == LEAF
+            feature.append(np.where(is_leaf, 0, tree.feature).astype(np.intp))
+            threshold.append(tree.threshold.astype(np.float64))
+            left = np.where(is_leaf, nodes, tree.children_left)
+            right = np.where(is_leaf, nodes, tree.children_right)
+            children.append(np.stack([right, left], axis=1).ravel().astype(np.intp) + root)
+            missing = getattr(tree, "missing_go_to_left", None) #sklearn < 1.3 has no missing value support
+            missing_left.append(np.asarray(missing, dtype=bool) if missing is not None else np.ones(tree.node_count, dtype=bool))
+            leaf_value = tree.value[:, 0, :]
+            #sklearn >= 1.4 stores fractions, older versions sample counts, normalizing gives the same for both
+            value.append(leaf_value / np.maximum(leaf_value.sum(axis=1, keepdims=True), np.finfo(np.float64).tiny))
+
+        return cls(
+            classes=np.asarray(model.classes_),
+            n_features=int(model.n_features_in_),
+            roots=roots,
+            feature=np.concatenate(feature),
+            threshold=np.concatenate(threshold),
+            children=np.concatenate(children),
+            missing_left=np.concatenate(missing_left),
+            value=np.concatenate(value),
+            depth=max(tree.max_depth for tree in trees),
+            estimator=model if keep_estimator else None
+        )
+
+    def apply(self, X) -> np.ndarray:
+        """Returns the n x trees leaf index each row reaches in each tree
+        """
+        #rounded to float32 as sklearn's trees do, then compared with the float64 thresholds as they are
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features_in_:
+            raise ValueError(f"X has {X.shape[1]} features, the forest was trained on {self.n_features_in_}")
+        n_rows, n_trees = X.shape[0], len(self.roots)
+        leaves = np.empty(n_rows * n_trees, dtype=np.intp)
+        #the (row, tree) pairs still walking, pairs that reached a leaf are dropped, so shallow paths cost nothing later
+        active = np.arange(n_rows * n_trees)
+        offsets = active // n_trees * X.shape[1]
+        nodes = np.tile(self.roots, n_rows)
+        X = X.ravel()
+        while len(active):
+            values = X[offsets + self.feature[nodes]]
+            go_left = values <= self.threshold[nodes]
+            missing = np.isnan(values)
+            if missing.any():
+                go_left[missing] = self.missing_left[nodes[missing]]
+            children = self.children[nodes * 2 + go_left]
+            done = children == nodes #leaves point at themselves
+            if done.any():
+                leaves[active[done]] = nodes[done]
+                walking = ~done
+                active, offsets, children = active[walking], offsets[walking], children[walking]
+            nodes = children
+        return leaves.reshape(n_rows, n_trees)
+
+    def predict_proba(self, X) -> np.ndarray:
+        """Returns the n x classes probabilities, the same as the compiled forest's predict_proba
+        """
+        if self.estimator is not None and np.ndim(X) > 1 and len(X) > self.max_rows:
+            return self.estimator.predict_proba(X)
+        return self.value[self.apply(X)].mean(axis=1)
+
+    def predict(self, X) -> np.ndarray:
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+
+def compile_forest(model, keep_estimator: bool = False) -> CompiledForest:
+    """Returns model compiled to a CompiledForest, or model itself if it already is one"""
+    if isinstance(model, CompiledForest):
+        return model
+    return CompiledForest.from_sklearn(model, keep_estimator)
@@ -2,8 +2,17 @@ from abc import ABC, abstractmethod
 #from detection_result import DetectionResults       #Old import
 
 class IDecetionRule(ABC):
+    #the UserProfile fields each feature is computed from, so only the fields of the features asked for are fetched
+    REQUIRED_FIELDS: dict = {}
+
+    @classmethod
+    def required_fields(cls, features=None) -> set:
+        """The UserProfile fields the given features (every feature of the rule if None) are computed from"""
+        return {field for feature, fields in cls.REQUIRED_FIELDS.items() if features is None or feature in features for field in fields}
+
     @abstractmethod
-    def get_features(self) -> dict:
+    def get_features(self, features=None) -> dict:
+        """Returns the given features, every feature of the rule if None"""
         pass
 
-    
\ No newline at end of file
+
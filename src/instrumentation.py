@@ -0,0 +1,235 @@
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import time
+
+
+ENABLED = os.getenv("BOT_DETECTOR_INSTRUMENTATION", "").lower() in ("1", "true", "yes")
+TRACE_LOG = os.getenv("BOT_DETECTOR_TRACE_LOG") #JSON lines file log_trace() appends finished traces to
+RATE_LIMIT_HEADERS = {"x-ratelimit-remaining": "remaining", "x-ratelimit-used": "used", "x-ratelimit-reset": "reset"}
+METRIC_PREFIX = "bot_detector"
+
+NOT_RECORDING = contextlib.nullcontext() #what stage() and trace() return while disabled, reused so nothing is allocated
+current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+class Trace:
+    """This class collects the stages, upstream requests and errors of scoring one user
+
+        Attributes:
+            username (str): The user traced
+            started_at (float): Unix time the trace started
+            total_ms (float): Milliseconds from start to end, None while the trace is running
+            stages (list[dict]): {stage, ms, error} of every timed stage, in the order they ended
+            requests (list[dict]): {upstream, ms, status, error, remaining} of every upstream request
+            errors (list[dict]): {stage, error} of every error recorded
+    """
+    def __init__(self, username: str):
+        self.username = username
+        self.started_at = time.time()
+        self.total_ms = None
+        self.stages = []
+        self.requests = []
+        self.errors = []
+        self.lock = threading.Lock() #the fetch stages of a user run in several threads
+
+    def add(self, kind: str, entry: dict):
+        with self.lock:
+            getattr(self, kind).append(entry)
+
+    def to_dict(self) -> dict:
+        with self.lock:
+            return {"username": self.username, "started_at": self.started_at, "total_ms": self.total_ms,
+                    "stages": list(self.stages), "requests": list(self.requests), "errors": list(self.errors)}
+
+
+class StageTimer:
+    """Times one stage for Instrumentation.stage()"""
+    def __init__(self, instrumentation: "Instrumentation", name: str):
+        self.instrumentation = instrumentation
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        self.instrumentation.record_stage(self.name, time.perf_counter() - self.started, exception)
+        return False
+
+
+class Instrumentation:
+    """This class counts where scoring time goes: per stage timers and per upstream request counters
+
+    stage(name) times a block: fetching each field source, each detection rule's features, model inference.
+    record_request() counts a request to an upstream (Reddit endpoints, Arctic Shift, Google) with its latency, HTTP
+    status, error and a snapshot of its rate limit headers. Both also go into the Trace of the user being scored,
+    trace(username) starts one for the current thread, bind() carries it into worker threads.
+
+    The totals are exported as Prometheus text (prometheus_text()) or as a dict (snapshot()), log_trace() appends a
+    finished trace to trace_log as a JSON line if it is set.
+
+    While enabled is False, stage() and trace() return one shared do-nothing context manager and record_*() return
+    at once, so the calls left in the code cost a few hundred nanoseconds each.
+
+        Attributes:
+            enabled (bool): If anything is recorded, BOT_DETECTOR_INSTRUMENTATION=1 enables the default instance
+            trace_log (str): The JSON lines file finished traces are appended to, BOT_DETECTOR_TRACE_LOG by default
+    """
+    def __init__(self, enabled: bool = False, trace_log: str = None):
+        self.enabled = enabled
+        self.trace_log = trace_log
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.stages = {} #name -> {calls, seconds, max_seconds, errors}
+            self.upstreams = {} #name -> {requests, seconds, max_seconds, errors, statuses, rate_limit}
+
+    def stage(self, name: str):
+        """Returns a context manager timing the block as the stage name"""
+        if not self.enabled:
+            return NOT_RECORDING
+        return StageTimer(self, name)
+
+    def record_stage(self, name: str, seconds: float, error: BaseException = None):
+        if not self.enabled:
+            return
+        with self.lock:
+            stage = self.stages.setdefault(name, {"calls": 0, "seconds": 0.0, "max_seconds": 0.0, "errors": 0})
+            stage["calls"] += 1
+            stage["seconds"] += seconds
+            stage["max_seconds"] = max(stage["max_seconds"], seconds)
+            stage["errors"] += error is not None
+        trace = current_trace.get()
+        if trace is not None:
+            entry = {"stage": name, "ms": round(seconds * 1000, 3)}
+            if error is not None:
+                entry["error"] = f"{type(error).__name__}: {error}"
+            trace.add("stages", entry)
+
+    def record_error(self, stage: str, error: BaseException):
+        """Counts an error that was handled (and printed) instead of raised"""
+        if not self.enabled:
+            return
+        with self.lock:
+            self.stages.setdefault(stage, {"calls": 0, "seconds": 0.0, "max_seconds": 0.0, "errors": 0})["errors"] += 1
+        trace = current_trace.get()
+        if trace is not None:
+            trace.add("errors", {"stage": stage, "error": f"{type(error).__name__}: {error}"})
+
+    def record_request(self, upstream: str, seconds: float, status_code: int = None, headers=None, error: BaseException = None):
+        """Counts one request to upstream, headers are the response headers the rate limit snapshot is taken from
+        """
+        if not self.enabled:
+            return
+        rate_limit = {}
+        for header, value in (headers or {}).items():
+            key = RATE_LIMIT_HEADERS.get(header.lower())
+            if key is not None:
+                try:
+                    rate_limit[key] = float(value)
+                except (TypeError, ValueError):
+                    pass
+        status = str(status_code) if status_code is not None else "error"
+        with self.lock:
+            counters = self.upstreams.setdefault(upstream, {"requests": 0, "seconds": 0.0, "max_seconds": 0.0, "errors": 0,
+                                                            "statuses": {}, "rate_limit": {}})
+            counters["requests"] += 1
+            counters["seconds"] += seconds
+            counters["max_seconds"] = max(counters["max_seconds"], seconds)
+            counters["errors"] += error is not None or (status_code is not None and status_code >= 400)
+            counters["statuses"][status] = counters["statuses"].get(status, 0) + 1
+            counters["rate_limit"].update(rate_limit)
+        trace = current_trace.get()
+        if trace is not None:
+            entry = {"upstream": upstream, "ms": round(seconds * 1000, 3), "status": status_code}
+            if error is not None:
+                entry["error"] = f"{type(error).__name__}: {error}"
+            if "remaining" in rate_limit:
+                entry["remaining"] = rate_limit["remaining"]
+            trace.add("requests", entry)
+
+    @contextlib.contextmanager
+    def __tracing__(self, username: str):
+        trace = Trace(username)
+        token = current_trace.set(trace)
+        started = time.perf_counter()
+        try:
+            yield trace
+        finally:
+            trace.total_ms = round((time.perf_counter() - started) * 1000, 3)
+            current_trace.reset(token)
+
+    def trace(self, username: str):
+        """Returns a context manager collecting a Trace of everything recorded in the block, as username's
+        """
+        if not self.enabled:
+            return NOT_RECORDING
+        return self.__tracing__(username)
+
+    def log_trace(self, trace: Trace):
+        """Appends a finished trace to trace_log as one JSON line, if trace_log is set"""
+        if trace is None or not self.trace_log:
+            return
+        line = json.dumps(trace.to_dict(), default=str)
+        with self.lock, open(self.trace_log, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    def bind(self, function):
+        """Returns function running with the trace of the calling thread, for work handed to other threads"""
+        trace = current_trace.get()
+        if trace is None:
+            return function
+
+        def traced(*args, **kwargs):
+            token = current_trace.set(trace)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                current_trace.reset(token)
+        return traced
+
+    def snapshot(self) -> dict:
+        """Returns the totals per stage and per upstream"""
+        with self.lock:
+            return {"stages": {name: dict(stage) for name, stage in self.stages.items()},
+                    "upstreams": {name: {**counters, "statuses": dict(counters["statuses"]), "rate_limit": dict(counters["rate_limit"])}
+                                  for name, counters in self.upstreams.items()}}
+
+    def prometheus_text(self) -> str:
+        """Returns the totals in the Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        lines = []
+
+        def metric(name: str, kind: str, description: str, samples: list):
+            lines.append(f"# HELP {METRIC_PREFIX}_{name} {description}")
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name} {kind}")
+            for labels, value in samples:
+                label_text = ",".join(f'{label}="{label_value}"' for label, label_value in labels.items())
+                lines.append(f"{METRIC_PREFIX}_{name}{{{label_text}}} {value}")
+
+        stages, upstreams = snapshot["stages"], snapshot["upstreams"]
+        metric("stage_calls_total", "counter", "Times each stage ran", [({"stage": name}, stage["calls"]) for name, stage in stages.items()])
+        metric("stage_seconds_total", "counter", "Seconds spent in each stage", [({"stage": name}, stage["seconds"]) for name, stage in stages.items()])
+        metric("stage_max_seconds", "gauge", "Longest single run of each stage", [({"stage": name}, stage["max_seconds"]) for name, stage in stages.items()])
+        metric("stage_errors_total", "counter", "Errors raised or handled in each stage", [({"stage": name}, stage["errors"]) for name, stage in stages.items()])
+        metric("upstream_requests_total", "counter", "Requests to each upstream by HTTP status",
+               [({"upstream": name, "status": status}, count) for name, counters in upstreams.items() for status, count in counters["statuses"].items()])
+        metric("upstream_seconds_total", "counter", "Seconds spent waiting for each upstream", [({"upstream": name}, counters["seconds"]) for name, counters in upstreams.items()])
+        metric("upstream_max_seconds", "gauge", "Slowest single request to each upstream", [({"upstream": name}, counters["max_seconds"]) for name, counters in upstreams.items()])
+        metric("upstream_errors_total", "counter", "Failed requests and error statuses of each upstream", [({"upstream": name}, counters["errors"]) for name, counters in upstreams.items()])
+        metric("upstream_rate_limit", "gauge", "Last rate limit header values of each upstream",
+               [({"upstream": name, "value": key}, value) for name, counters in upstreams.items() for key, value in counters["rate_limit"].items()])
+        return "\n".join(lines) + "\n"
+
+
+default_instrumentation = Instrumentation(enabled=ENABLED, trace_log=TRACE_LOG)
+
+
+def get_instrumentation() -> Instrumentation:
+    """Returns the Instrumentation everything records to, enabled by the BOT_DETECTOR_INSTRUMENTATION environment variable"""
+    return default_instrumentation
@@ -0,0 +1,173 @@
+import time
+from typing import TYPE_CHECKING
+
+from src.instrumentation import get_instrumentation
+
+if TYPE_CHECKING: #praw is only needed by whoever creates the Redditor
+    from praw.models import Redditor
+
+
+ACTIVITY_LIMIT = 900 #posts and comments kept for timestamps and karma
+COMMENT_LIMIT = 500 #comment bodies kept
+SUBREDDIT_LIMIT = 200 #comments and posts, each, read for subreddit names
+COMMENT_PREFIX = "t1_" #fullname prefix of comments, posts are t3_
+
+
+class ListingHistory():
+    """ This class stores the raw items harvested from a user's listings, so a later harvest only has to read what is newer
+
+    Attributes:
+        activity (list[(str,float,float)]): (fullname, timestamp, karma) of the last up to 900 posts and comments, newest first
+        comments (list[(str,str,str)]): (fullname, body, subreddit) of the last up to 500 comments, newest first. The subreddit
+                                        is only kept for the first 200
+        submissions (list[(str,str)]): (fullname, subreddit) of the last up to 200 posts, newest first
+        complete (bool): If activity holds every post and comment the user has
+        harvested_at (float): Unix timestamp of the last harvest that read every listing in full, incremental harvests keep it
+    """
+    def __init__(self, activity: list, comments: list, submissions: list, complete: bool, harvested_at: float):
+        self.activity = activity
+        self.comments = comments
+        self.submissions = submissions
+        self.complete = complete
+        self.harvested_at = harvested_at
+
+    def mark(self):
+        """The newest item seen, the high-water mark an incremental harvest pages down to
+        """
+        if not self.activity:
+            return None, None
+        fullname, timestamp, _ = self.activity[0]
+        return fullname, timestamp
+
+    def to_dict(self) -> dict:
+        return {
+            "activity": self.activity,
+            "comments": self.comments,
+            "submissions": self.submissions,
+            "complete": self.complete,
+            "harvested_at": self.harvested_at
+        }
+
+    @classmethod
+    def from_dict(cls, values: dict) -> "ListingHistory":
+        return cls(
+            activity = [tuple(item) for item in values["activity"]],
+            comments = [tuple(item) for item in values["comments"]],
+            submissions = [tuple(item) for item in values["submissions"]],
+            complete = values["complete"],
+            harvested_at = values["harvested_at"]
+        )
+
+
+class HarvestedListings():
+    """ This class stores everything read from a user's listings
+
+    Attributes:
+        timestamps_and_karma (list[(float,float)]): (timestamp, karma) of the last up to 900 posts and comments, newest first
+        comments (list[str]): The bodies of the last up to 500 comments, newest first
+        subreddits (list[str]): The lowercase subreddits of the last 200 posts and 200 comments
+        history (ListingHistory): The raw items the fields were built from, None if the overview could not be read
+    """
+    def __init__(self, timestamps_and_karma: list[(float, float)], comments: list[str], subreddits: list[str], history: ListingHistory = None):
+        self.timestamps_and_karma = timestamps_and_karma
+        self.comments = comments
+        self.subreddits = subreddits
+        self.history = history
+
+
+class ListingHarvester:
+    """This class walks a user's listings once and fills the timestamps and karma, comment bodies and subreddits from that one stream
+
+    The overview listing (reddit_user.new) mixes posts and comments newest first, so the comments and posts inside its
+    first 900 items are the first items of comments.new and submissions.new. Those listings are only paged afterwards,
+    starting after the last item already seen, when the overview ran out before 500 comments or 200 posts were found.
+
+    Given the history of an earlier harvest, the overview is only paged down to that history's newest item and the new
+    items are put in front of it. Karma of the items that were already in the history is not updated.
+
+        Attributes:
+            reddit_user (praw.Reddit.Redditor): An authenticated PRAW Reddit instance of a Redditor class
+            previous (ListingHistory): The history of an earlier harvest of the same user, None walks every listing in full
+    """
+    def __init__(self, reddit_user: "Redditor", previous: ListingHistory = None):
+        self.reddit_user = reddit_user
+        self.previous = previous
+        self.activity = [] #(fullname, timestamp, karma)
+        self.comments = [] #(fullname, body, subreddit)
+        self.submissions = [] #(fullname, subreddit)
+
+    def __add_comment__(self, comment):
+        if len(self.comments) < COMMENT_LIMIT:
+            subreddit = comment.subreddit.display_name.lower() if len(self.comments) < SUBREDDIT_LIMIT else None
+            self.comments.append((comment.fullname, comment.body, subreddit))
+
+    def __add_submission__(self, submission):
+        if len(self.submissions) < SUBREDDIT_LIMIT:
+            self.submissions.append((submission.fullname, submission.subreddit.display_name.lower()))
+
+    def __walk_overview__(self, mark_fullname: str = None, mark_timestamp: float = None):
+        """Pages reddit_user.new once, stopping at the mark if one is given
+
+        Returns (read without error, reached the mark, held every post and comment of the user)
+        """
+        reached_mark = False
+        try:
+            for item in self.reddit_user.new(limit=ACTIVITY_LIMIT):
+                if mark_fullname is not None and (item.fullname == mark_fullname or item.created_utc < mark_timestamp):
+                    reached_mark = True
+                    break
+                self.activity.append((item.fullname, item.created_utc, item.score))
+                if item.fullname.startswith(COMMENT_PREFIX):
+                    self.__add_comment__(item)
+                else:
+                    self.__add_submission__(item)
+        except Exception as e:
+            print(f"Debug: Error fetching user.new(): {e}")
+            get_instrumentation().record_error("fetch.listings", e)
+            self.activity = []
+            return False, False, False
+        return True, reached_mark, len(self.activity) < ACTIVITY_LIMIT
+
+    def __continue_listing__(self, sublisting, seen: list, limit: int):
+        """Pages the rest of a comments/submissions listing after the last item already seen
+        """
+        if len(seen) >= limit:
+            return []
+        params = {"after": seen[-1][0]} if seen else None
+        return sublisting.new(limit=limit - len(seen), params=params)
+
+    def __merge__(self, new: list, previous: list, limit: int) -> list:
+        seen = {item[0] for item in new}
+        return (new + [item for item in previous if item[0] not in seen])[:limit]
+
+    def __merge_previous__(self):
+        """Puts the new items in front of the previous history, keeping the same limits a full harvest has
+        """
+        merged_count = len(self.activity) + len(self.previous.activity)
+        self.activity = self.__merge__(self.activity, self.previous.activity, ACTIVITY_LIMIT)
+        self.comments = self.__merge__(self.comments, self.previous.comments, COMMENT_LIMIT)
+        self.submissions = self.__merge__(self.submissions, self.previous.submissions, SUBREDDIT_LIMIT)
+        return self.previous.complete and merged_count < ACTIVITY_LIMIT
+
+    def harvest(self) -> HarvestedListings:
+        mark_fullname, mark_timestamp = self.previous.mark() if self.previous is not None else (None, None)
+        read, reached_mark, complete = self.__walk_overview__(mark_fullname, mark_timestamp)
+        harvested_at = time.time()
+        if reached_mark:
+            complete = self.__merge_previous__()
+            harvested_at = self.previous.harvested_at
+        elif not complete:
+            for comment in self.__continue_listing__(self.reddit_user.comments, self.comments, COMMENT_LIMIT):
+                self.__add_comment__(comment)
+            for submission in self.__continue_listing__(self.reddit_user.submissions, self.submissions, SUBREDDIT_LIMIT):
+                self.__add_submission__(submission)
+
+        subreddits = {subreddit for _, subreddit in self.submissions}
+        subreddits |= {subreddit for _, _, subreddit in self.comments[:SUBREDDIT_LIMIT]}
+        history = ListingHistory(self.activity, self.comments, self.submissions, complete, harvested_at) if read else None
+        return HarvestedListings(
+            timestamps_and_karma = [(timestamp, karma) for _, timestamp, karma in self.activity],
+            comments = [body for _, body, _ in self.comments],
+            subreddits = list(subreddits),
+            history = history
+        )
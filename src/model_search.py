@@ -0,0 +1,115 @@
+import itertools
+import math
+import time
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import KFold
+
+
+FACTOR = 3 #share of the configurations dropped after each round is 1 - 1/FACTOR
+
+
+def cross_validation_splits(n_rows: int, n_splits: int = 10, random_state: int = 42) -> list:
+    """Returns the (train indices, test indices) of each fold, the same folds as KFold(n_splits, shuffle=True, random_state)"""
+    return list(KFold(n_splits=n_splits, shuffle=True, random_state=random_state).split(np.empty((n_rows, 0))))
+
+
+class HalvingForestSearch:
+    """This class tunes a RandomForestClassifier with successive halving over warm started forests
+
+    n_estimators is not searched like the other parameters: every other combination (a configuration) gets one
+    forest per fold with warm_start, grown to each n_estimators value in turn, so a forest of 200 trees costs the
+    fit of 200 trees instead of 50 + 100 + 150 + 200 for four separate fits. With the same random_state, the first n
+    trees of a warm started forest are the trees a forest of n would have, so every score is one GridSearchCV
+    would have computed.
+
+    After each round only the best 1/factor of the configurations are grown further, so the expensive rounds with
+    many trees are only spent on the ones that looked good with few. A first screening round grows every forest to
+    only screening_trees trees: it only decides which configurations go on, its scores are not grid points and
+    never chosen as the best. The folds and the training matrix (converted to float32 once, as the trees need it)
+    are computed once and shared by every fit.
+
+    The attributes after fit() follow GridSearchCV's.
+
+        Attributes:
+            param_grid (dict): Lists of values per RandomForestClassifier parameter, must have n_estimators
+            splits (list): The (train indices, test indices) of each fold
+            factor (int): Each round keeps the best 1/factor of the configurations
+            screening_trees (int): Trees of the screening round, None for the smallest n_estimators // factor, 0 skips it
+            random_state (int): random_state of every forest
+            n_jobs (int): Trees fitted at the same time by each forest
+            verbose (bool): If every (configuration, n_estimators) is printed with its score and fit time
+            best_params_ (dict): The parameters of the best score
+            best_score_ (float): The best mean accuracy over the folds
+            best_estimator_ (RandomForestClassifier): A forest with best_params_, fitted on all rows
+            results_ (list[dict]): params, mean_test_score, fit_seconds (of the trees added for it), round and screening
+                of every score
+            search_seconds_ (float): Wall clock of the search, without the final refit
+    """
+    def __init__(self, param_grid: dict, splits: list, factor: int = FACTOR, screening_trees: int = None, random_state: int = 42,
+                 n_jobs: int = -1, verbose: bool = True):
+        if "n_estimators" not in param_grid:
+            raise ValueError("param_grid must have n_estimators, the forests are grown along it")
+        self.param_grid = param_grid
+        self.splits = splits
+        self.factor = factor
+        self.screening_trees = screening_trees
+        self.random_state = random_state
+        self.n_jobs = n_jobs
+        self.verbose = verbose
+
+    def __configurations__(self) -> list[dict]:
+        names = sorted(name for name in self.param_grid if name != "n_estimators")
+        return [dict(zip(names, values)) for values in itertools.product(*(self.param_grid[name] for name in names))]
+
+    def fit(self, X, y) -> "HalvingForestSearch":
+        started = time.perf_counter()
+        X = np.ascontiguousarray(X, dtype=np.float32) #what every tree would convert X to otherwise, on every fit
+        y = np.asarray(y)
+        tree_counts = sorted(self.param_grid["n_estimators"])
+        screening_trees = tree_counts[0] // self.factor if self.screening_trees is None else self.screening_trees
+        if 0 < screening_trees < tree_counts[0]:
+            tree_counts = [screening_trees] + tree_counts
+        else:
+            screening_trees = 0
+        configurations = self.__configurations__()
+        forests = [[RandomForestClassifier(warm_start=True, random_state=self.random_state, n_jobs=self.n_jobs, **configuration)
+                    for _ in self.splits] for configuration in configurations]
+
+        self.results_ = []
+        surviving = list(range(len(configurations)))
+        for round_index, trees in enumerate(tree_counts):
+            scores = {index: [] for index in surviving}
+            fit_seconds = dict.fromkeys(surviving, 0.0)
+            for fold, (train, test) in enumerate(self.splits):
+                X_train, y_train, X_test, y_test = X[train], y[train], X[test], y[test] #indexed once per fold, not per fit
+                for index in surviving:
+                    fit_started = time.perf_counter()
+                    forest = forests[index][fold].set_params(n_estimators=trees).fit(X_train, y_train)
+                    fit_seconds[index] += time.perf_counter() - fit_started
+                    scores[index].append(float((forest.predict(X_test) == y_test).mean()))
+
+            for index in surviving:
+                result = {"params": {**configurations[index], "n_estimators": trees}, "mean_test_score": float(np.mean(scores[index])),
+                          "fit_seconds": fit_seconds[index], "round": round_index, "screening": trees == screening_trees}
+                self.results_.append(result)
+                if self.verbose:
+                    stage = "Screening" if result["screening"] else f"Round {round_index}"
+                    added = trees - (tree_counts[round_index - 1] if round_index else 0)
+                    print(f"  {stage}: {result['params']} accuracy {result['mean_test_score'] * 100:.2f}% "
+                          f"(+{added} trees per fold in {result['fit_seconds']:.2f}s)")
+
+            if round_index < len(tree_counts) - 1:
+                keep = max(1, math.ceil(len(surviving) / self.factor))
+                ranked = sorted(surviving, key=lambda index: -np.mean(scores[index]))
+                for index in ranked[keep:]:
+                    forests[index] = None #frees the trees of dropped configurations
+                surviving = sorted(ranked[:keep])
+
+        #earliest first, so ties go to the fewest trees like GridSearchCV's first rank
+        best = max((result for result in self.results_ if not result["screening"]), key=lambda result: result["mean_test_score"])
+        self.best_params_ = best["params"]
+        self.best_score_ = best["mean_test_score"]
+        self.search_seconds_ = time.perf_counter() - started
+        self.best_estimator_ = RandomForestClassifier(random_state=self.random_state, n_jobs=self.n_jobs, **self.best_params_).fit(X, y)
+        return self
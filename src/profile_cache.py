@@ -0,0 +1,246 @@
+import json
+import sqlite3
+import threading
+import time
+from typing import TYPE_CHECKING
+
+from src.user_data_fetcher import UserDataFetcher, UserProfile, LazyUserProfile, PROFILE_FIELDS, FIELD_SOURCES
+from src.listing_harvester import ListingHistory
+from src.arctic_shift_client import ArcticShiftClient, NO_ACTIVITY, NEGATIVE_TTL
+
+if TYPE_CHECKING: #praw is only needed by whoever creates the Redditor
+    from praw.models import Redditor
+
+
+#fields that share a TTL
+FIELD_GROUPS = {
+    "static": ["account_name", "account_timestamp", "oldest_timestamp"], #almost never change, NO_ACTIVITY expires after negative_ttl
+    "about": ["comment_karma", "link_karma", "verified_email", "profile_picture", "trophy_count"],
+    "listings": ["timestamps_and_karma", "comments", "subreddits"]
+}
+FIELD_GROUP = {field: group for group, fields in FIELD_GROUPS.items() for field in fields}
+DEFAULT_TTLS = {
+    "static": 30 * 24 * 60 * 60,
+    "about": 60 * 60,
+    "listings": 60 * 60
+}
+DEFAULT_MAX_ENTRIES = 10000
+FULL_REFRESH_AFTER = 24 * 60 * 60 #incremental listing refreshes stop being used once the last full walk is this old
+
+
+class ProfileCache:
+    """This class stores fetched UserProfiles in a SQLite file so users scored recently are not fetched again
+
+    Each field remembers when it was fetched and expires after the TTL of its group (see FIELD_GROUPS), so a stale
+    field is refetched without touching the fields that are still fresh. An oldest_timestamp of NO_ACTIVITY, which a
+    failed or short circuited Arctic Shift lookup also gives, expires after negative_ttl like it does in the
+    ArcticShiftClient, instead of being kept as long as the static fields. Only the fields asked for are looked at:
+    a caller that needs the about fields never fetches listings, and later gets them from the cache if another
+    caller fetched them. When more than max_entries users are stored, the least recently used ones are evicted.
+
+    With incremental on, the raw listing items of each user are kept too, and a stale listings group is refreshed by
+    paging only the items newer than the newest one stored (see ListingHarvester). Every full_refresh_after seconds
+    the listings are walked in full again so karma and deleted items catch up.
+
+        Attributes:
+            path (str): The SQLite file the profiles are kept in, ":memory:" keeps them for this process only
+            ttls (dict): Seconds each field group stays fresh, groups not given use DEFAULT_TTLS
+            negative_ttl (float): Seconds an oldest_timestamp of NO_ACTIVITY stays fresh, at most its group's TTL
+            max_entries (int): The most users kept before the least recently used are evicted
+            incremental (bool): If stale listings are refreshed from the stored listing history instead of walked in full
+            full_refresh_after (float): Seconds after a full listing walk that the stored history is last used
+            stats (dict): Counts of hits (every field asked for fresh), partial_hits (some fields refetched), misses,
+                          evictions and incremental_refreshes
+    """
+    def __init__(self, path: str = "profile_cache.sqlite", ttls: dict = None, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 incremental: bool = True, full_refresh_after: float = FULL_REFRESH_AFTER, negative_ttl: float = NEGATIVE_TTL):
+        self.path = path
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.incremental = incremental
+        self.full_refresh_after = full_refresh_after
+        self.stats = {"hits": 0, "partial_hits": 0, "misses": 0, "evictions": 0, "incremental_refreshes": 0}
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self.connection:
+            self.connection.execute(
+                """CREATE TABLE IF NOT EXISTS profiles (
+                    username TEXT PRIMARY KEY,
+                    fields TEXT NOT NULL,
+                    fetched_at TEXT NOT NULL,
+                    last_used REAL NOT NULL
+                )"""
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS profiles_last_used ON profiles (last_used)")
+            self.connection.execute(
+                """CREATE TABLE IF NOT EXISTS listing_histories (
+                    username TEXT PRIMARY KEY,
+                    mark_fullname TEXT,
+                    mark_utc REAL,
+                    history TEXT NOT NULL
+                )"""
+            )
+
+    def __key__(self, username: str) -> str:
+        return username.lower() #reddit names are not case sensitive
+
+    def __load__(self, username: str):
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT fields, fetched_at FROM profiles WHERE username = ?", (self.__key__(username),)
+            ).fetchone()
+        if row is None:
+            return {}, {}
+        return json.loads(row[0]), json.loads(row[1])
+
+    def __evict__(self):
+        overflow = self.connection.execute("SELECT COUNT(*) FROM profiles").fetchone()[0] - self.max_entries
+        if overflow > 0:
+            self.connection.execute(
+                "DELETE FROM profiles WHERE username IN (SELECT username FROM profiles ORDER BY last_used ASC LIMIT ?)",
+                (overflow,)
+            )
+            self.connection.execute("DELETE FROM listing_histories WHERE username NOT IN (SELECT username FROM profiles)")
+            self.stats["evictions"] += overflow
+
+    def get_listing_history(self, username: str):
+        """Returns the stored ListingHistory of a user if it can still be refreshed incrementally, otherwise None
+        """
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT history FROM listing_histories WHERE username = ?", (self.__key__(username),)
+            ).fetchone()
+        if row is None:
+            return None
+        history = ListingHistory.from_dict(json.loads(row[0]))
+        if time.time() - history.harvested_at > self.full_refresh_after:
+            return None
+        return history
+
+    def put_listing_history(self, username: str, history: ListingHistory):
+        mark_fullname, mark_utc = history.mark()
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO listing_histories (username, mark_fullname, mark_utc, history) VALUES (?, ?, ?, ?)",
+                (self.__key__(username), mark_fullname, mark_utc, json.dumps(history.to_dict()))
+            )
+
+    def __count__(self, stat: str):
+        with self.lock:
+            self.stats[stat] += 1
+
+    def __ttl__(self, field: str, values: dict) -> float:
+        ttl = self.ttls[FIELD_GROUP[field]]
+        if field == "oldest_timestamp" and values.get(field) == NO_ACTIVITY:
+            return min(ttl, self.negative_ttl)
+        return ttl
+
+    def stale_fields(self, fetched_at: dict, fields=PROFILE_FIELDS, now: float = None, values: dict = None) -> list[str]:
+        """Returns the fields that were never fetched or are older than their TTL, values are the cached fields
+        """
+        now = time.time() if now is None else now
+        values = values or {}
+        #profiles cached before fields were timed one by one only have the time of each group
+        return [field for field in fields
+                if now - fetched_at.get(field, fetched_at.get(FIELD_GROUP[field], float("-inf"))) > self.__ttl__(field, values)]
+
+    def is_fresh(self, username: str, fields=PROFILE_FIELDS) -> bool:
+        """Returns if every given field of a user is cached and within its TTL, so get_fields would fetch none of them
+        """
+        cached, fetched_at = self.__load__(username)
+        return not self.stale_fields(fetched_at, fields, values=cached)
+
+    def stale_groups(self, fetched_at: dict, now: float = None, values: dict = None) -> list[str]:
+        """Returns the field groups with a field that was never fetched or is older than its TTL
+        """
+        stale = {FIELD_GROUP[field] for field in self.stale_fields(fetched_at, now=now, values=values)}
+        return [group for group in FIELD_GROUPS if group in stale]
+
+    def touch(self, username: str):
+        with self.lock, self.connection:
+            self.connection.execute("UPDATE profiles SET last_used = ? WHERE username = ?", (time.time(), self.__key__(username)))
+
+    def put(self, username: str, fields: dict, fetched_at: dict):
+        """Stores the fields of a user along with when each field was fetched
+        """
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO profiles (username, fields, fetched_at, last_used) VALUES (?, ?, ?, ?)",
+                (self.__key__(username), json.dumps(fields), json.dumps(fetched_at), time.time())
+            )
+            self.__evict__()
+
+    def get_fields(self, reddit_user: "Redditor", fields=PROFILE_FIELDS, max_workers: int = 1, arctic_shift: ArcticShiftClient = None,
+                   about: dict = None) -> dict:
+        """Returns the given fields of a user keyed by field name, fetching only the ones that are missing or stale
+
+        The other fields of the same requests are fetched and stored with them, as they cost nothing more. about
+        fields just looked up (see AccountHeader.values) replace the cached ones and are stored as fresh.
+        """
+        username = reddit_user.name
+        cached, fetched_at = self.__load__(username)
+        if about:
+            cached.update(about)
+            fetched_at.update({field: time.time() for field in about})
+        stale = self.stale_fields(fetched_at, fields, values=cached)
+        if not stale:
+            self.__count__("hits")
+            self.touch(username)
+            return {field: cached[field] for field in fields}
+
+        self.__count__("partial_hits" if cached else "misses")
+        sources = {FIELD_SOURCES[field] for field in stale}
+        fetch = [field for field in PROFILE_FIELDS if FIELD_SOURCES[field] in sources]
+        listing_history = None
+        if self.incremental and "listings" in sources:
+            listing_history = self.get_listing_history(username)
+            if listing_history is not None:
+                self.__count__("incremental_refreshes")
+        now = time.time()
+        fetcher = UserDataFetcher(reddit_user, max_workers=max_workers, listing_history=listing_history, arctic_shift=arctic_shift, about=about)
+        cached.update(fetcher.get_fields(fetch))
+        fetched_at.update({field: now for field in fetch})
+        self.put(username, cached, fetched_at)
+        if self.incremental and fetcher.listings is not None and fetcher.listings.history is not None:
+            self.put_listing_history(username, fetcher.listings.history)
+        return {field: cached[field] for field in fields}
+
+    def get_data(self, reddit_user: "Redditor", max_workers: int = 1, arctic_shift: ArcticShiftClient = None, fields=None,
+                 about: dict = None) -> UserProfile:
+        """Returns the UserProfile of a user, fetching only the fields that are missing or stale
+
+        With fields, only those are looked up now, and any other one the first time it is read (see LazyUserProfile).
+        """
+        if fields is None:
+            return UserProfile.from_dict(self.get_fields(reddit_user, PROFILE_FIELDS, max_workers, arctic_shift, about))
+
+        def load(more: list[str]) -> dict:
+            return self.get_fields(reddit_user, more, max_workers, arctic_shift)
+        #the about fields looked up come with the first load, they are already here
+        about = about or {}
+        return LazyUserProfile(load, self.get_fields(reddit_user, list(dict.fromkeys([*fields, *about])), max_workers, arctic_shift, about))
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+class CachedUserDataFetcher(UserDataFetcher):
+    """This class is a UserDataFetcher that reads through a ProfileCache
+
+        Attributes:
+            reddit_user (praw.Reddit.Redditor): An authenticated PRAW Reddit instance of a Redditor class
+            cache (ProfileCache): Where fetched profiles are kept
+            max_workers (int): The most requests sent at the same time when fields have to be fetched
+            arctic_shift (ArcticShiftClient): Looks up the first activity of the user, the shared default client if not given
+            about (dict): About fields already looked up (see AccountHeader.values), stored in the cache as fresh
+    """
+    def __init__(self, reddit_user: "Redditor", cache: ProfileCache, max_workers: int = 1, arctic_shift: ArcticShiftClient = None,
+                 about: dict = None):
+        super().__init__(reddit_user, max_workers=max_workers, arctic_shift=arctic_shift, about=about)
+        self.cache = cache
+
+    def get_data(self, fields=None) -> UserProfile:
+        return self.cache.get_data(self.reddit_user, max_workers=self.max_workers, arctic_shift=self.arctic_shift, fields=fields,
+                                   about=self.about)
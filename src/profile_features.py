@@ -0,0 +1,93 @@
+from src.user_data_fetcher import UserProfile, PROFILE_FIELDS, FIELD_SOURCES
+from src.account_activity_check import AccountActivityCheck
+from src.account_content_check import AccountContentCheck
+from src.account_subbreddit_content_check import AccountSubbredditContentCheck
+from src.account_general_search import AccountGeneralSearch
+from src.copy_index import CopyIndex
+from src.instrumentation import get_instrumentation
+
+
+DETECTION_RULES = [AccountActivityCheck, AccountContentCheck, AccountSubbredditContentCheck, AccountGeneralSearch]
+
+
+def plan_rules(features=None) -> dict:
+    """Returns the features each rule has to compute for the given features, every feature of every rule if None
+
+    Rules none of the features come from are left out, so they are neither built nor run. Raises ValueError for a
+    feature no rule computes.
+    """
+    if features is None:
+        return {rule: None for rule in DETECTION_RULES}
+    unknown = set(features).difference(*(rule.REQUIRED_FIELDS for rule in DETECTION_RULES))
+    if unknown:
+        raise ValueError(f"No detection rule computes {sorted(unknown)}")
+    plan = {}
+    for rule in DETECTION_RULES:
+        rule_features = [feature for feature in rule.REQUIRED_FIELDS if feature in features]
+        if rule_features:
+            plan[rule] = rule_features
+    return plan
+
+
+def required_fields(features=None) -> list[str]:
+    """Returns the UserProfile fields the given features (every feature if None) are computed from, in PROFILE_FIELDS order
+
+    Pass them to UserDataFetcher.get_data(fields) to fetch only what the features read: name, karma and age
+    features alone, for example, skip the listings, trophies and Arctic Shift requests.
+    """
+    fields = set()
+    for rule, rule_features in plan_rules(features).items():
+        fields |= rule.required_fields(rule_features)
+    return [field for field in PROFILE_FIELDS if field in fields]
+
+
+def features_from_sources(sources, features) -> list[str]:
+    """Returns the given features that are computed only from fields of the given sources (see FIELD_SOURCES)
+
+    features_from_sources(["about"], FEATURE_COLUMNS) are the features one about request is enough for.
+    """
+    return [feature for feature in features if all(FIELD_SOURCES[field] in sources for field in required_fields([feature]))]
+
+
+def get_profile_features(user_info: UserProfile, praw_instance=None, copy_index: CopyIndex = None, now: float = None, features=None) -> dict:
+    """Runs the IDecetionRule checks on a fetched profile and returns their features, only the given ones if features is set
+
+    now is the time the time based features (like age_days) are computed at, the current time if not given. Pass
+    the fetch time when replaying a stored snapshot, so the features come out as they were when it was fetched.
+
+    Only the fields the features are computed from are read (see required_fields), so a LazyUserProfile never
+    fetches the others. Raises ValueError for copy_count of a CompactUserProfile whose comments were trimmed.
+    """
+    all_features = {}
+    instrumentation = get_instrumentation()
+    plan = plan_rules(features)
+    fields = set(required_fields(features))
+
+    def read(field: str):
+        return getattr(user_info, field) if field in fields else None
+
+    if AccountActivityCheck in plan:
+        with instrumentation.stage("features.AccountActivityCheck"):
+            activity_check = AccountActivityCheck(read("comment_karma"), read("link_karma"), read("timestamps_and_karma"), read("oldest_timestamp"), read("account_timestamp"), now=now)
+            all_features.update(activity_check.get_features(plan[AccountActivityCheck]))
+
+    if AccountContentCheck in plan:
+        content_features = plan[AccountContentCheck]
+        if copy_index is not None and getattr(user_info, "comments_trimmed", False) and (content_features is None or "copy_count" in content_features):
+            raise ValueError(f"copy_count of {read('account_name')} cannot be computed, its comments were trimmed (see CompactUserProfile)")
+        with instrumentation.stage("features.AccountContentCheck"):
+            comments = read("comments")
+            content_check = AccountContentCheck(read("account_name"), comments, comments, praw_instance, copy_index=copy_index)
+            all_features.update(content_check.get_features(content_features))
+
+    if AccountSubbredditContentCheck in plan:
+        with instrumentation.stage("features.AccountSubbredditContentCheck"):
+            subreddit_check = AccountSubbredditContentCheck(read("subreddits"))
+            all_features.update(subreddit_check.get_features(plan[AccountSubbredditContentCheck]))
+
+    if AccountGeneralSearch in plan:
+        with instrumentation.stage("features.AccountGeneralSearch"):
+            general_check = AccountGeneralSearch(read("verified_email"), read("trophy_count"), read("account_name"), read("profile_picture"))
+            all_features.update(general_check.get_features(plan[AccountGeneralSearch]))
+
+    return all_features
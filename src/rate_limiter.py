@@ -0,0 +1,173 @@
+import os
+import sqlite3
+import threading
+import time
+
+
+REDDIT = "reddit"
+ARCTIC_SHIFT = "arctic_shift"
+GOOGLE_SEARCH = "google_search"
+
+#(tokens added per second, most tokens saved up) of each upstream while it has not sent its own rate limit headers
+DEFAULT_LIMITS = {
+    REDDIT: (100 / 60, 10), #100 requests a minute per OAuth client
+    ARCTIC_SHIFT: (5, 10),
+    GOOGLE_SEARCH: (1, 1) #the custom search API allows 100 queries a minute at most
+}
+DEFAULT_LIMIT = (1, 1) #upstreams missing from the limits
+RETRY_AFTER = 60 #seconds waited after a 429 that did not say how long to wait
+MAX_SLEEP = 5 #longest single sleep, so a budget freed by other processes is noticed
+
+
+class RateLimiter:
+    """This class schedules requests to every upstream API so they run as fast as their rate limits allow, and no faster
+
+    Each upstream has a token bucket: acquire() takes a token, and waits only when the bucket is empty, for exactly
+    as long as the next token takes. Once an upstream sends X-Ratelimit-Remaining and X-Ratelimit-Reset headers
+    (Reddit does on every response), its real remaining budget is spent instead, at full speed, until the window
+    resets. A 429 empties the budget until Retry-After.
+
+    The buckets live in SQLite. One RateLimiter can be shared by any number of threads, and every process that opens
+    the same file shares the same budgets, so parallel workers together stay under the API ceiling.
+
+        Attributes:
+            path (str): The SQLite file the buckets are kept in, ":memory:" shares them within this process only
+            limits (dict): (tokens per second, most tokens saved up) per upstream, upstreams not given use DEFAULT_LIMITS
+            stats (dict): Counts of acquired tokens, waits, waited_seconds and throttled (429) responses of this process
+    """
+    def __init__(self, path: str = ":memory:", limits: dict = None):
+        self.path = path
+        self.limits = {**DEFAULT_LIMITS, **(limits or {})}
+        self.stats = {"acquired": 0, "waits": 0, "waited_seconds": 0.0, "throttled": 0}
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self.connection.execute(
+            """CREATE TABLE IF NOT EXISTS buckets (
+                upstream TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                remaining REAL,
+                reset_at REAL
+            )"""
+        )
+
+    def __transaction__(self, update):
+        """Runs update() in one write transaction, which also locks out every other process sharing the file"""
+        with self.lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                result = update()
+                self.connection.execute("COMMIT")
+                return result
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+
+    def __load__(self, upstream: str, now: float) -> list:
+        rate, capacity = self.limits.get(upstream, DEFAULT_LIMIT)
+        row = self.connection.execute(
+            "SELECT tokens, updated_at, remaining, reset_at FROM buckets WHERE upstream = ?", (upstream,)
+        ).fetchone()
+        if row is None:
+            return [capacity, now, None, None]
+        tokens, updated_at, remaining, reset_at = row
+        tokens = min(capacity, tokens + max(now - updated_at, 0) * rate)
+        if reset_at is not None and reset_at <= now: #the upstream's window is over, its budget is unknown again
+            remaining = reset_at = None
+        return [tokens, now, remaining, reset_at]
+
+    def __save__(self, upstream: str, state: list):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO buckets (upstream, tokens, updated_at, remaining, reset_at) VALUES (?, ?, ?, ?, ?)",
+            (upstream, *state)
+        )
+
+    def __try_acquire__(self, upstream: str, tokens: float) -> float:
+        """Takes tokens and returns 0 if there are enough, otherwise returns the seconds until there will be"""
+        def update():
+            now = time.time()
+            state = self.__load__(upstream, now)
+            bucket, _, remaining, reset_at = state
+            if remaining is not None:
+                wait = 0.0 if remaining >= tokens else reset_at - now
+                if wait == 0.0:
+                    state[2] = remaining - tokens
+            else:
+                rate, _ = self.limits.get(upstream, DEFAULT_LIMIT)
+                wait = 0.0 if bucket >= tokens else (tokens - bucket) / rate
+                if wait == 0.0:
+                    state[0] = bucket - tokens
+            self.__save__(upstream, state)
+            return wait
+        return self.__transaction__(update)
+
+    def acquire(self, upstream: str, tokens: float = 1):
+        """Blocks until upstream may be sent tokens requests, and takes them from its budget
+        """
+        waited = 0.0
+        while True:
+            wait = self.__try_acquire__(upstream, tokens)
+            if wait <= 0:
+                break
+            wait = min(wait, MAX_SLEEP)
+            time.sleep(wait)
+            waited += wait
+        with self.lock:
+            self.stats["acquired"] += tokens
+            if waited > 0:
+                self.stats["waits"] += 1
+                self.stats["waited_seconds"] += waited
+
+    def update(self, upstream: str, headers, status_code: int = 200):
+        """Updates the budget of upstream from the headers and status code of one of its responses
+        """
+        headers = {key.lower(): value for key, value in (headers or {}).items()}
+        now = time.time()
+        if status_code == 429:
+            retry_after = headers.get("retry-after") or headers.get("x-ratelimit-reset")
+            try:
+                retry_after = float(retry_after)
+            except (TypeError, ValueError):
+                retry_after = RETRY_AFTER
+            with self.lock:
+                self.stats["throttled"] += 1
+            remaining, reset_at = 0.0, now + retry_after
+        elif "x-ratelimit-remaining" in headers and "x-ratelimit-reset" in headers:
+            try:
+                remaining, reset_at = float(headers["x-ratelimit-remaining"]), now + float(headers["x-ratelimit-reset"])
+            except ValueError:
+                return
+        else:
+            return
+
+        def update():
+            state = self.__load__(upstream, now)
+            _, _, stored_remaining, stored_reset_at = state
+            #responses of the same window can arrive out of order and after other requests took tokens, keep the lowest
+            if stored_reset_at is not None and status_code != 429 and reset_at <= stored_reset_at + 1:
+                state[2] = min(stored_remaining, remaining)
+            else:
+                state[2], state[3] = remaining, reset_at
+            self.__save__(upstream, state)
+        self.__transaction__(update)
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+default_limiter = None
+default_limiter_pid = None
+default_limiter_lock = threading.Lock()
+
+
+def get_default_limiter() -> RateLimiter:
+    """Returns the RateLimiter shared by everything that is not given its own, kept in the RATE_LIMIT_FILE
+    environment variable's file so worker processes share it, or in memory if it is not set
+    """
+    global default_limiter, default_limiter_pid
+    with default_limiter_lock:
+        if default_limiter is None or default_limiter_pid != os.getpid(): #a forked worker opens its own connection
+            default_limiter = RateLimiter(os.getenv("RATE_LIMIT_FILE", ":memory:"))
+            default_limiter_pid = os.getpid()
+        return default_limiter
@@ -0,0 +1,49 @@
+import re
+import time
+from prawcore.requestor import Requestor
+
+from src.rate_limiter import RateLimiter, REDDIT, get_default_limiter
+from src.instrumentation import get_instrumentation
+
+
+#(pattern of the URL path, upstream name the request is counted as), the first match wins
+REDDIT_ENDPOINTS = [
+    (re.compile(r"/user/[^/]+/about"), "reddit.about"),
+    (re.compile(r"/user/[^/]+/trophies"), "reddit.trophies"),
+    (re.compile(r"/user/[^/]+/?(overview|comments|submitted)?/?$"), "reddit.listings"), #user/<name>/ is the overview
+    (re.compile(r"/api/user_data_by_account_ids"), "reddit.user_data"),
+    (re.compile(r"/(search|subreddits/search)"), "reddit.search"),
+    (re.compile(r"/r/[^/]+/(comments|new)"), "reddit.streams"),
+    (re.compile(r"/api/v1/access_token"), "reddit.auth")
+]
+
+
+def reddit_endpoint(url: str) -> str:
+    """Returns the upstream name a Reddit request URL is counted as, reddit.other if it is none of REDDIT_ENDPOINTS"""
+    for pattern, name in REDDIT_ENDPOINTS:
+        if pattern.search(url):
+            return name
+    return "reddit.other"
+
+
+class RateLimitedRequestor(Requestor):
+    """A prawcore Requestor that sends every Reddit request through a RateLimiter, pass it to praw.Reddit as
+    requestor_class=RateLimitedRequestor, requestor_kwargs={"rate_limiter": limiter}
+    """
+    def __init__(self, *args, rate_limiter: RateLimiter = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rate_limiter = rate_limiter if rate_limiter is not None else get_default_limiter()
+
+    def request(self, *args, **kwargs):
+        self.rate_limiter.acquire(REDDIT)
+        instrumentation = get_instrumentation()
+        upstream = reddit_endpoint(str(args[1] if len(args) > 1 else kwargs.get("url", ""))) if instrumentation.enabled else None
+        started = time.perf_counter()
+        try:
+            response = super().request(*args, **kwargs)
+        except Exception as e:
+            instrumentation.record_request(upstream, time.perf_counter() - started, error=e)
+            raise
+        instrumentation.record_request(upstream, time.perf_counter() - started, response.status_code, response.headers)
+        self.rate_limiter.update(REDDIT, response.headers, response.status_code)
+        return response
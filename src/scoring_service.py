@@ -0,0 +1,366 @@
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+import numpy as np
+
+from src.bot_detector import BotDetector, SUSPICIOUS_THRESHOLD
+from src.detection_result import DetectionResult
+from src.dataset_journal import to_builtin
+from src.instrumentation import get_instrumentation
+
+
+MAX_BATCH = 64 #most rows scored by one predict_proba call
+MAX_WAIT = 0.002 #seconds a batch waits for more rows once the rows already queued are taken
+LATENCY_WINDOW = 10000 #latest requests per endpoint the percentiles are computed over
+PERCENTILES = (50, 90, 99)
+MAX_BODY = 1024 * 1024 #bytes of the largest accepted request body
+
+
+class MicroBatcher:
+    """This class coalesces the rows of concurrent requests into batches scored by one call
+
+    submit() queues a row and returns a Future. One thread takes the first queued row, every row queued behind it,
+    and waits up to max_wait for more, then scores up to max_batch rows with a single score_batch call. A lone
+    request waits max_wait at most, a burst of them shares one predict_proba call. Callers validate their rows
+    before submitting them; if a batch still fails, its rows are scored one by one, so only the failing row's
+    Future gets the exception.
+
+        Attributes:
+            score_batch (callable): Takes a list of rows and returns their scores, in order
+            max_batch (int): Most rows per call
+            max_wait (float): Seconds a batch waits for more rows
+            stats (dict): Counts of batches and rows scored, and the largest batch
+    """
+    def __init__(self, score_batch, max_batch: int = MAX_BATCH, max_wait: float = MAX_WAIT):
+        self.score_batch = score_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.stats = {"batches": 0, "rows": 0, "max_batch": 0}
+        self.thread = threading.Thread(target=self.__run__, name="micro-batcher", daemon=True)
+        self.thread.start()
+
+    def submit(self, row) -> Future:
+        future = Future()
+        self.queue.put((row, future))
+        return future
+
+    def __next_batch__(self):
+        """Returns the next batch, None once close() was called"""
+        first = self.queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if item is None:
+                self.queue.put(None) #stop after this batch
+                break
+            batch.append(item)
+        return batch
+
+    def __run__(self):
+        while True:
+            batch = self.__next_batch__()
+            if batch is None:
+                return
+            try:
+                scores = self.score_batch([row for row, _ in batch])
+                for (_, future), score in zip(batch, scores):
+                    future.set_result(score)
+            except Exception as e:
+                if len(batch) == 1:
+                    batch[0][1].set_exception(e)
+                else:
+                    self.__score_one_by_one__(batch)
+            with self.lock:
+                self.stats["batches"] += 1
+                self.stats["rows"] += len(batch)
+                self.stats["max_batch"] = max(self.stats["max_batch"], len(batch))
+
+    def __score_one_by_one__(self, batch: list):
+        """Scores the rows of a failed batch alone, so one bad row does not fail the others"""
+        for row, future in batch:
+            try:
+                future.set_result(self.score_batch([row])[0])
+            except Exception as e:
+                future.set_exception(e)
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+
+class SingleFlight:
+    """This class runs a call once for all the callers asking for the same key at the same time
+
+    The first caller of a key runs the function, everyone who asks for the key before it returns waits for and gets
+    the same result (or exception). Later callers run it again.
+
+        Attributes:
+            stats (dict): Counts of calls run and calls that shared a running one
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = {}
+        self.stats = {"runs": 0, "shared": 0}
+
+    def do(self, key, function):
+        with self.lock:
+            future = self.running.get(key)
+            leader = future is None
+            if leader:
+                future = self.running[key] = Future()
+                self.stats["runs"] += 1
+            else:
+                self.stats["shared"] += 1
+        if leader:
+            try:
+                future.set_result(function())
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                with self.lock:
+                    del self.running[key]
+        return future.result()
+
+
+class LatencyTracker:
+    """This class keeps the latencies of the latest LATENCY_WINDOW requests per endpoint and their percentiles"""
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.window = window
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.counts = {}
+
+    def record(self, endpoint: str, seconds: float):
+        with self.lock:
+            self.latencies.setdefault(endpoint, deque(maxlen=self.window)).append(seconds)
+            self.counts[endpoint] = self.counts.get(endpoint, 0) + 1
+
+    def percentiles(self) -> dict:
+        """Returns {endpoint: {requests, p50_ms, p90_ms, p99_ms, max_ms}}"""
+        with self.lock:
+            latencies = {endpoint: np.array(values) * 1000 for endpoint, values in self.latencies.items()}
+            counts = dict(self.counts)
+        summary = {}
+        for endpoint, values in latencies.items():
+            summary[endpoint] = {"requests": counts[endpoint]}
+            summary[endpoint].update({f"p{percentile}_ms": round(float(np.percentile(values, percentile)), 3) for percentile in PERCENTILES})
+            summary[endpoint]["max_ms"] = round(float(values.max()), 3)
+        return summary
+
+
+class ScoringService:
+    """This class scores users for many concurrent callers with one loaded model
+
+    Concurrent requests for the same user share one fetch (SingleFlight), and the feature rows of all requests
+    are scored together in micro-batches (MicroBatcher), whether they were fetched or sent precomputed. Every
+    row is converted to floats in the caller's thread first, so a bad value fails only its own request.
+
+        Attributes:
+            detector (BotDetector): Fetches users and holds the model
+            batcher (MicroBatcher): Scores the feature rows
+            single_flight (SingleFlight): Deduplicates concurrent requests for the same user
+            latencies (LatencyTracker): Per request latency of every endpoint
+    """
+    def __init__(self, detector: BotDetector, max_batch: int = MAX_BATCH, max_wait: float = MAX_WAIT):
+        self.detector = detector
+        self.detector.model #loaded now, not by the first request
+        self.batcher = MicroBatcher(detector.score_vectors, max_batch=max_batch, max_wait=max_wait)
+        self.single_flight = SingleFlight()
+        self.latencies = LatencyTracker()
+        self.started_at = time.time()
+
+    def __score_user__(self, username: str) -> DetectionResult:
+        result = self.detector.fetch_user(username)
+        if result.error is None:
+            result.score = self.batcher.submit(self.detector.feature_vector(result.features)).result()
+            result.is_suspicious = result.score > SUSPICIOUS_THRESHOLD
+        get_instrumentation().log_trace(result.trace)
+        return result
+
+    def __to_result__(self, username: str, features: dict, score: float) -> DetectionResult:
+        return DetectionResult(username, score=score, is_suspicious=score > SUSPICIOUS_THRESHOLD, features=features)
+
+    def score_user(self, username: str) -> DetectionResult:
+        """Fetches and scores one user, callers asking for the same user at the same time share the result
+        """
+        return self.single_flight.do(username.lower(), lambda: self.__score_user__(username))
+
+    def score_features(self, rows: list[dict]) -> list[DetectionResult]:
+        """Scores precomputed features dicts (keyed by FEATURE_COLUMNS, missing features are nan), raises ValueError or
+        TypeError before anything is queued if a value is not a number
+        """
+        rows = [dict.fromkeys(self.detector.feature_cols_order) | features for features in rows]
+        vectors = [self.detector.feature_vector(features) for features in rows]
+        futures = [self.batcher.submit(vector) for vector in vectors]
+        return [self.__to_result__(features.get("username"), features, future.result()) for features, future in zip(rows, futures)]
+
+    def metrics(self) -> dict:
+        with self.batcher.lock:
+            batches = dict(self.batcher.stats)
+        with self.single_flight.lock:
+            fetches = dict(self.single_flight.stats)
+        batches["mean_batch"] = round(batches["rows"] / batches["batches"], 2) if batches["batches"] else 0.0
+        metrics = {"uptime_seconds": round(time.time() - self.started_at, 1), "latency": self.latencies.percentiles(),
+                   "batches": batches, "user_fetches": fetches}
+        if get_instrumentation().enabled:
+            metrics["instrumentation"] = get_instrumentation().snapshot()
+        return metrics
+
+    def close(self):
+        self.batcher.close()
+
+
+def result_to_dict(result: DetectionResult) -> dict:
+    return {"username": result.username, "score": result.score, "is_suspicious": result.is_suspicious,
+            "features": result.features, "error": result.error, "trace": result.trace.to_dict() if result.trace is not None else None}
+
+
+class ScoringRequestHandler(BaseHTTPRequestHandler):
+    """Serves the ScoringService of its server
+
+    GET /score/<username>    scores a user, fetched through the detector
+    POST /score              scores {"features": {...}} or {"rows": [{...}, ...]} of precomputed features
+    GET /metrics             latency percentiles per endpoint, batching and fetch deduplication counts, and the
+                             instrumentation totals when it is enabled
+    GET /metrics/prometheus  the instrumentation totals in the Prometheus text format
+    GET /health              {"status": "ok"}
+    """
+    protocol_version = "HTTP/1.1" #keeps connections open between requests of the same client
+
+    def __send_json__(self, status: int, body: dict):
+        data = json.dumps(body, default=to_builtin).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def __timed__(self, endpoint: str, handle):
+        started = time.perf_counter()
+        try:
+            status, body = handle()
+        except Exception as e:
+            status, body = 500, {"error": f"{type(e).__name__}: {e}"}
+        self.__send_json__(status, body)
+        self.server.service.latencies.record(endpoint, time.perf_counter() - started)
+
+    def do_GET(self):
+        service = self.server.service
+        if self.path.startswith("/score/") and len(self.path) > len("/score/"):
+            username = unquote(self.path[len("/score/"):])
+            self.__timed__("score_user", lambda: (200, result_to_dict(service.score_user(username))))
+        elif self.path == "/metrics":
+            self.__send_json__(200, service.metrics())
+        elif self.path == "/metrics/prometheus":
+            data = get_instrumentation().prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        elif self.path == "/health":
+            self.__send_json__(200, {"status": "ok"})
+        else:
+            self.__send_json__(404, {"error": f"Unknown path {self.path}"})
+
+    def __score_body__(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY:
+            return 413, {"error": f"The body is larger than {MAX_BODY} bytes"}
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError as e:
+            return 400, {"error": f"The body is not JSON: {e}"}
+        if isinstance(body, dict) and isinstance(body.get("features"), dict):
+            rows = [body["features"]]
+        elif isinstance(body, dict) and isinstance(body.get("rows"), list) and all(isinstance(row, dict) for row in body["rows"]):
+            rows = body["rows"]
+        else:
+            return 400, {"error": 'Expected {"features": {...}} or {"rows": [{...}, ...]}'}
+        try:
+            results = self.server.service.score_features(rows)
+        except (TypeError, ValueError) as e: #a feature value that is not a number
+            return 400, {"error": f"{type(e).__name__}: {e}"}
+        if "features" in body:
+            return 200, result_to_dict(results[0])
+        return 200, {"results": [result_to_dict(result) for result in results]}
+
+    def do_POST(self):
+        if self.path == "/score":
+            self.__timed__("score_features", self.__score_body__)
+        else:
+            self.__send_json__(404, {"error": f"Unknown path {self.path}"})
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class ScoringServer(ThreadingHTTPServer):
+    """A ThreadingHTTPServer, one thread per connection, serving a ScoringService"""
+    daemon_threads = True
+
+    def __init__(self, address: tuple, service: ScoringService, verbose: bool = False):
+        super().__init__(address, ScoringRequestHandler)
+        self.service = service
+        self.verbose = verbose
+
+
+def main():
+    import praw
+    from dotenv import load_dotenv
+    from src.profile_cache import ProfileCache
+    from src.copy_index import CopyIndex
+    from src.reddit_requestor import RateLimitedRequestor
+
+    parser = argparse.ArgumentParser(description="Serve bot scores over HTTP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH, help="most rows scored by one predict_proba call")
+    parser.add_argument("--max-wait-ms", type=float, default=MAX_WAIT * 1000, help="milliseconds a batch waits for more rows")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args()
+
+    load_dotenv()
+    reddit = praw.Reddit(client_id=os.getenv("REDDIT_CLIENT_ID"),
+                         client_secret=os.getenv("REDDIT_CLIENT_SECRET"),
+                         username=os.getenv("REDDIT_USERNAME"),
+                         password=os.getenv("REDDIT_PASSWORD"),
+                         user_agent=os.getenv("REDDIT_USER_AGENT"),
+                         requestor_class=RateLimitedRequestor)
+    detector = BotDetector(reddit, profile_cache=ProfileCache(), copy_index=CopyIndex("copy_index.sqlite"))
+    service = ScoringService(detector, max_batch=args.max_batch, max_wait=args.max_wait_ms / 1000)
+    server = ScoringServer((args.host, args.port), service, verbose=args.verbose)
+    print(f"Scoring on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import glob
+import gzip
+import json
+import os
+import threading
+import time
+import zlib
+
+from src.user_data_fetcher import UserProfile
+from src.dataset_journal import to_builtin
+
+
+SEGMENT_BYTES = 64 * 1024 * 1024 #a new segment file is started once the current one is this big
+SEGMENT_PATTERN = "snapshots-{:05d}.jsonl.gz"
+GZIP_MAGIC = b"\x1f\x8b\x08" #how every gzip member starts
+READ_CHUNK = 1024 * 1024 #compressed bytes decompressed at a time while reading a segment
+
+
+class ProfileSnapshot():
+    """ This class stores one fetched profile as it was when it was fetched
+
+    Attributes:
+        username (str): The name the profile was fetched for
+        label (int): 1 for a known bot, 0 for a known human, None if not labeled
+        fetched_at (float): Unix timestamp of when the profile was fetched
+        profile (UserProfile): The fetched profile
+    """
+    def __init__(self, username: str, label: int, fetched_at: float, profile: UserProfile):
+        self.username = username
+        self.label = label
+        self.fetched_at = fetched_at
+        self.profile = profile
+
+    def to_dict(self) -> dict:
+        return {"username": self.username, "label": self.label, "fetched_at": self.fetched_at, "profile": self.profile.to_dict()}
+
+    @classmethod
+    def from_dict(cls, values: dict) -> "ProfileSnapshot":
+        return cls(values["username"], values["label"], values["fetched_at"], UserProfile.from_dict(values["profile"]))
+
+
+class SnapshotStore:
+    """This class keeps every fetched UserProfile in gzip compressed JSON lines files, so features can be recomputed offline
+
+    Each append adds one gzip member to the segment file of this store (gzip readers read concatenated members as
+    one stream), and a new segment is started every SEGMENT_BYTES. Every SnapshotStore starts its own segment on
+    its first append instead of adding to the newest one, so a member a crash cut short is always the last of
+    its segment. Segments are read independently, so they can be replayed in parallel, one per process.
+
+    Reading decompresses one member at a time: a broken member (cut short, or corrupted) and any line that is
+    not valid JSON only lose their own snapshots, reading goes on with the next member.
+
+    Only one process should append, any number of threads in it may.
+
+        Attributes:
+            path (str): The directory the segments are kept in
+            segment_bytes (int): The size after which a new segment is started
+    """
+    def __init__(self, path: str = "snapshots", segment_bytes: int = SEGMENT_BYTES):
+        self.path = path
+        self.segment_bytes = segment_bytes
+        self.lock = threading.Lock()
+        self.segment = None #the segment this store appends to, started on the first append
+        os.makedirs(path, exist_ok=True)
+
+    def segments(self) -> list[str]:
+        """Returns the paths of every segment, oldest first"""
+        return sorted(glob.glob(os.path.join(self.path, SEGMENT_PATTERN.replace("{:05d}", "*"))))
+
+    def __current_segment__(self) -> str:
+        if self.segment is None or os.path.getsize(self.segment) >= self.segment_bytes:
+            number = len(self.segments()) + 1
+            while os.path.exists(os.path.join(self.path, SEGMENT_PATTERN.format(number))):
+                number += 1
+            self.segment = os.path.join(self.path, SEGMENT_PATTERN.format(number))
+            open(self.segment, "ab").close()
+        return self.segment
+
+    def append(self, username: str, profile: UserProfile, label: int = None, fetched_at: float = None):
+        """Stores one profile, fetched_at defaults to now
+        """
+        self.append_many([ProfileSnapshot(username, label, time.time() if fetched_at is None else fetched_at, profile)])
+
+    def append_many(self, snapshots: list[ProfileSnapshot]):
+        """Stores the snapshots as one gzip member
+        """
+        lines = "".join(json.dumps(snapshot.to_dict(), default=to_builtin) + "\n" for snapshot in snapshots)
+        data = gzip.compress(lines.encode("utf-8"))
+        with self.lock:
+            with open(self.__current_segment__(), "ab") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def __members__(self, segment: str):
+        """Yields the decompressed bytes of every complete gzip member of a segment, skipping broken ones"""
+        with open(segment, "rb") as f:
+            data = f.read()
+        view = memoryview(data)
+        start = 0
+        while start < len(data):
+            decompressor = zlib.decompressobj(wbits=31) #31 reads one gzip member
+            chunks = []
+            position = start
+            try:
+                #fed a chunk at a time, so unused_data (the start of the next member) stays small
+                while not decompressor.eof and position < len(data):
+                    chunks.append(decompressor.decompress(view[position:position + READ_CHUNK]))
+                    position += READ_CHUNK
+            except zlib.error:
+                chunks = None
+            if chunks is not None and decompressor.eof:
+                yield b"".join(chunks)
+                start = min(position, len(data)) - len(decompressor.unused_data)
+                continue
+            #a broken member, the next one starts at the next gzip header after its own
+            start = data.find(GZIP_MAGIC, start + 1)
+            if start == -1:
+                return
+
+    def read_segment(self, segment: str, part: int = 0, parts: int = 1):
+        """Yields every complete ProfileSnapshot of one segment, or with parts > 1 every parts-th one starting at part,
+        so several processes can share a segment
+        """
+        index = 0
+        for member in self.__members__(segment):
+            for line in member.decode("utf-8", errors="replace").splitlines():
+                if index % parts == part:
+                    try:
+                        snapshot = ProfileSnapshot.from_dict(json.loads(line))
+                    except (json.JSONDecodeError, KeyError, TypeError):
+                        snapshot = None #a corrupted line, only its own snapshot is lost
+                    if snapshot is not None:
+                        yield snapshot
+                index += 1
+
+    def __iter__(self):
+        for segment in self.segments():
+            yield from self.read_segment(segment)
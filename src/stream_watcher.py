@@ -0,0 +1,249 @@
+import argparse
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+import praw
+from dotenv import load_dotenv
+
+from src.bot_detector import BotDetector, USER_WORKERS
+from src.cascade_detector import CascadeDetector, UNCERTAINTY_BAND
+from src.detection_result import DetectionResult
+from src.profile_cache import ProfileCache
+from src.copy_index import CopyIndex
+from src.reddit_requestor import RateLimitedRequestor
+
+
+QUEUE_SIZE = 200 #authors waiting to be scored before the streams stop being read
+RESCORE_AFTER = 6 * 60 * 60 #seconds an author is skipped for after being queued
+RECENT_AUTHORS = 100000 #most authors remembered for skipping
+STREAM_KINDS = ("comments", "submissions")
+RETRY_DELAY = 10 #seconds a stream waits after an error before it is opened again
+
+
+class StreamWatcher:
+    """This class scores the authors of new comments and submissions of subreddits as they are posted
+
+    One producer thread per stream kind reads the new items of every watched subreddit (as one "a+b+c" subreddit)
+    and puts their authors in a bounded queue. A pool of workers takes authors off the queue and scores each one
+    with BotDetector.check_users. Authors queued in the last rescore_after seconds are skipped, so a busy thread
+    does not get its regulars scored over and over. When the workers fall behind, the queue fills up and the
+    producers wait for room instead of reading further: the growing queue_depth and lag_seconds in metrics()
+    show it, and the fix is more workers. With a CascadeDetector most authors are scored from one about request,
+    so each worker gets through more of them; its cascade_stats() are part of metrics().
+
+        Attributes:
+            detector (BotDetector | CascadeDetector): The detector authors are scored with, its praw instance reads the streams
+            subreddits (list[str]): The names of the subreddits watched
+            kinds (tuple[str]): The streams read, "comments" and/or "submissions"
+            workers (int): Authors scored at the same time
+            rescore_after (float): Seconds an author is not queued again for
+            trigger_phrase (str): If given, only authors of comments containing it are scored (the !CheckForBot mode)
+            on_result (callable): Called with every DetectionResult and the item that queued its author
+    """
+    def __init__(self, detector: BotDetector | CascadeDetector, subreddits: list[str], kinds: tuple = STREAM_KINDS, workers: int = USER_WORKERS,
+                 queue_size: int = QUEUE_SIZE, rescore_after: float = RESCORE_AFTER, trigger_phrase: str = None, on_result=None):
+        for kind in kinds:
+            if kind not in STREAM_KINDS:
+                raise ValueError(f"Unknown stream kind {kind}, expected one of {STREAM_KINDS}")
+        self.detector = detector
+        self.subreddits = subreddits
+        self.kinds = kinds
+        self.workers = workers
+        self.rescore_after = rescore_after
+        self.trigger_phrase = trigger_phrase
+        self.on_result = on_result if on_result is not None else print_result
+
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.stop_event = threading.Event()
+        self.threads = []
+        self.lock = threading.Lock()
+        self.recent_authors = OrderedDict() #lowercased name -> when it was queued, oldest first
+        self.started_at = None
+        self.counts = {"seen": 0, "skipped_recent": 0, "skipped_no_author": 0, "skipped_no_trigger": 0,
+                       "queued": 0, "scored": 0, "suspicious": 0, "failed": 0, "stream_errors": 0}
+        self.producer_wait_seconds = 0.0
+        self.max_queue_depth = 0
+        self.last_lag = 0.0
+        self.total_lag = 0.0
+
+    def __count__(self, stat: str):
+        with self.lock:
+            self.counts[stat] += 1
+
+    def __should_queue__(self, name: str) -> bool:
+        """Remembers name as queued and returns True, unless it was queued in the last rescore_after seconds"""
+        key = name.lower()
+        now = time.time()
+        with self.lock:
+            queued_at = self.recent_authors.get(key)
+            if queued_at is not None and now - queued_at < self.rescore_after:
+                self.counts["skipped_recent"] += 1
+                return False
+            self.recent_authors[key] = now
+            self.recent_authors.move_to_end(key)
+            while len(self.recent_authors) > RECENT_AUTHORS:
+                self.recent_authors.popitem(last=False)
+            return True
+
+    def __stream__(self, kind: str):
+        subreddit = self.detector.praw_instance.subreddit("+".join(self.subreddits))
+        #pause_after=-1 yields None whenever a poll had nothing new, so stop() is noticed on quiet subreddits
+        return getattr(subreddit.stream, kind)(skip_existing=True, pause_after=-1)
+
+    def __handle_item__(self, item):
+        self.__count__("seen")
+        if item.author is None: #deleted account
+            self.__count__("skipped_no_author")
+            return
+        if self.trigger_phrase is not None and self.trigger_phrase not in getattr(item, "body", ""):
+            self.__count__("skipped_no_trigger")
+            return
+        name = item.author.name
+        if not self.__should_queue__(name):
+            return
+
+        waited_from = time.perf_counter()
+        queued = False
+        while not queued and not self.stop_event.is_set():
+            try:
+                self.queue.put((name, item), timeout=1)
+                queued = True
+            except queue.Full:
+                continue
+        if not queued: #stopped while the queue was full, the item was dropped
+            return
+        with self.lock:
+            self.producer_wait_seconds += time.perf_counter() - waited_from
+            self.counts["queued"] += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.queue.qsize())
+
+    def __produce__(self, kind: str):
+        while not self.stop_event.is_set():
+            try:
+                for item in self.__stream__(kind):
+                    if self.stop_event.is_set():
+                        return
+                    if item is not None:
+                        self.__handle_item__(item)
+            except Exception as e:
+                self.__count__("stream_errors")
+                print(f"Error reading the {kind} stream: {type(e).__name__}: {e}")
+                self.stop_event.wait(RETRY_DELAY)
+
+    def __work__(self):
+        while not self.stop_event.is_set():
+            try:
+                name, item = self.queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            try:
+                result = self.detector.check_users([name], max_workers=1)[0]
+                lag = max(time.time() - item.created_utc, 0.0)
+                with self.lock:
+                    self.last_lag = lag
+                    self.total_lag += lag
+                    if result.error is not None:
+                        self.counts["failed"] += 1
+                    else:
+                        self.counts["scored"] += 1
+                        self.counts["suspicious"] += result.is_suspicious
+                self.on_result(result, item)
+            except Exception as e:
+                self.__count__("failed")
+                print(f"Error scoring {name}: {type(e).__name__}: {e}")
+            finally:
+                self.queue.task_done()
+
+    def start(self):
+        """Starts the producers and workers in the background"""
+        self.stop_event.clear()
+        self.started_at = time.time()
+        self.threads = [threading.Thread(target=self.__produce__, args=(kind,), name=f"stream-{kind}", daemon=True) for kind in self.kinds]
+        self.threads += [threading.Thread(target=self.__work__, name=f"scorer-{index}", daemon=True) for index in range(self.workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self, timeout: float = 30):
+        """Stops reading the streams and scoring, authors still queued are dropped"""
+        self.stop_event.set()
+        for thread in self.threads:
+            thread.join(timeout)
+        self.threads = []
+
+    def run(self, duration: float = None, report_every: float = 60):
+        """Watches until duration seconds passed (or forever) printing metrics() every report_every seconds"""
+        self.start()
+        deadline = None if duration is None else time.time() + duration
+        try:
+            while deadline is None or time.time() < deadline:
+                wait = report_every if deadline is None else min(report_every, deadline - time.time())
+                if self.stop_event.wait(max(wait, 0)):
+                    break
+                print(f"Stream metrics: {self.metrics()}")
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def metrics(self) -> dict:
+        """Returns the counters plus backpressure: queue_depth, max_queue_depth, producer_wait_seconds (time the
+        streams waited for room in the queue), lag_seconds (how far behind the newest items the last scored author
+        was) and mean_lag_seconds, and the cascade_stats() of a CascadeDetector as cascade
+        """
+        with self.lock:
+            metrics = dict(self.counts)
+            finished = metrics["scored"] + metrics["failed"]
+            metrics.update({
+                "queue_depth": self.queue.qsize(),
+                "max_queue_depth": self.max_queue_depth,
+                "producer_wait_seconds": round(self.producer_wait_seconds, 3),
+                "lag_seconds": round(self.last_lag, 3),
+                "mean_lag_seconds": round(self.total_lag / finished, 3) if finished else 0.0,
+                "scored_per_minute": round(finished / max(time.time() - self.started_at, 1e-9) * 60, 1) if self.started_at else 0.0
+            })
+        if isinstance(self.detector, CascadeDetector):
+            metrics["cascade"] = self.detector.cascade_stats()
+        return metrics
+
+
+def print_result(result: DetectionResult, item):
+    if result.error is not None:
+        print(f"{result.username}: Error: {result.error}")
+    else:
+        print(f"{result.username}: Suspicious: {result.is_suspicious}, Confidence Score: {result.score:.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score the authors of new comments and submissions of subreddits")
+    parser.add_argument("subreddits", nargs="+", help="subreddits to watch")
+    parser.add_argument("--kinds", nargs="+", default=list(STREAM_KINDS), choices=STREAM_KINDS)
+    parser.add_argument("--workers", type=int, default=USER_WORKERS, help="authors scored at the same time")
+    parser.add_argument("--queue-size", type=int, default=QUEUE_SIZE)
+    parser.add_argument("--rescore-after", type=float, default=RESCORE_AFTER, help="seconds before an author is scored again")
+    parser.add_argument("--trigger", default=None, help="only score authors of comments containing this, e.g. !CheckForBot")
+    parser.add_argument("--report-every", type=float, default=60, help="seconds between metrics reports")
+    parser.add_argument("--cascade", action="store_true", help="score from the about fields first, fetch the rest only for uncertain authors")
+    parser.add_argument("--band", nargs=2, type=float, default=list(UNCERTAINTY_BAND), metavar=("LOW", "HIGH"),
+                        help="stage one scores from LOW to HIGH go on to the full fetch (with --cascade)")
+    args = parser.parse_args()
+
+    load_dotenv()
+    reddit = praw.Reddit(client_id=os.getenv("REDDIT_CLIENT_ID"),
+                         client_secret=os.getenv("REDDIT_CLIENT_SECRET"),
+                         username=os.getenv("REDDIT_USERNAME"),
+                         password=os.getenv("REDDIT_PASSWORD"),
+                         user_agent=os.getenv("REDDIT_USER_AGENT"),
+                         requestor_class=RateLimitedRequestor)
+    detector = BotDetector(reddit, profile_cache=ProfileCache(), copy_index=CopyIndex("copy_index.sqlite"))
+    if args.cascade:
+        detector = CascadeDetector(detector, band=tuple(args.band))
+    watcher = StreamWatcher(detector, args.subreddits, kinds=tuple(args.kinds), workers=args.workers, queue_size=args.queue_size,
+                            rescore_after=args.rescore_after, trigger_phrase=args.trigger)
+    watcher.run(report_every=args.report_every)
+    print(f"Stream metrics: {watcher.metrics()}")
+
+
+if __name__ == "__main__":
+    main()
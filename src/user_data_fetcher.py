@@ -1,6 +1,14 @@
-from praw.models import Redditor
+from typing import TYPE_CHECKING
+from concurrent.futures import ThreadPoolExecutor
 import datetime
-import requests
+import threading
+
+from src.listing_harvester import ListingHarvester, HarvestedListings, ListingHistory
+from src.arctic_shift_client import ArcticShiftClient, get_default_client
+from src.instrumentation import get_instrumentation
+
+if TYPE_CHECKING: #praw is only needed by whoever creates the Redditor
+    from praw.models import Redditor
 
 
 class UserProfile():
@@ -34,62 +42,114 @@ class UserProfile():
         self.verified_email = verified_email
         self.trophy_count = trophy_count
         self.profile_picture = profile_picture
-        
+
+    def to_dict(self) -> dict:
+        return {field: getattr(self, field) for field in PROFILE_FIELDS}
+
+    @classmethod
+    def from_dict(cls, values: dict) -> "UserProfile":
+        values = dict(values)
+        values["timestamps_and_karma"] = [tuple(pair) for pair in values["timestamps_and_karma"]]
+        return cls(**values)
+
+
+#which request each UserProfile field comes from, fields with the same source are fetched together
+FIELD_SOURCES = {
+    "account_name": "about",
+    "account_timestamp": "about",
+    "comment_karma": "about",
+    "link_karma": "about",
+    "verified_email": "about",
+    "profile_picture": "about",
+    "timestamps_and_karma": "listings",
+    "comments": "listings",
+    "subreddits": "listings",
+    "trophy_count": "trophies",
+    "oldest_timestamp": "arctic_shift"
+}
+PROFILE_FIELDS = list(FIELD_SOURCES)
+
+
+class LazyUserProfile(UserProfile):
+    """ This class is a UserProfile that only holds the fields fetched so far, and fetches any other field the first
+    time it is read
+
+    The fields features need (see profile_features.required_fields) are fetched up front, concurrently, and a
+    field read later costs only its own request: the checks of a cheap deployment never pay for the listings,
+    trophies or Arctic Shift history they do not read. Fields of the same request are fetched together.
+
+    Attributes:
+        load (callable): Takes a list of fields and returns them fetched, keyed by field name
+        fetched_fields (list[str]): The fields fetched so far
+    """
+    def __init__(self, load, values: dict):
+        self.__dict__.update(values)
+        self.load = load
+        self.lock = threading.Lock()
+
+    @property
+    def fetched_fields(self) -> list[str]:
+        return [field for field in PROFILE_FIELDS if field in self.__dict__]
+
+    def fetch(self, fields):
+        """Fetches the given fields that are still missing, all with one load call so their requests run concurrently"""
+        with self.lock:
+            missing = [field for field in fields if field not in self.__dict__]
+            if missing:
+                self.__dict__.update(self.load(missing))
+
+    def __getattr__(self, attribute):
+        #only called for attributes not set yet, so every fetched field is read like a plain attribute
+        if attribute not in FIELD_SOURCES:
+            raise AttributeError(attribute)
+        with self.lock:
+            if attribute not in self.__dict__:
+                source = FIELD_SOURCES[attribute]
+                missing = [field for field in PROFILE_FIELDS if FIELD_SOURCES[field] == source and field not in self.__dict__]
+                self.__dict__.update(self.load(missing))
+        return self.__dict__[attribute]
+
+
 class UserDataFetcher:
     """This class makes the API calls with praw to fetch the related reddit users information
 
         Attributes: 
             reddit_user (praw.Reddit.Redditor): An authenticated PRAW Reddit instance of a Redditor class
+            max_workers (int): The most requests sent at the same time. 1 fetches every field one after another,
+                               anything higher sends the independent requests (about, listings, trophies, Arctic Shift) concurrently
+            listing_history (ListingHistory): The listings of an earlier fetch of this user, only newer items are paged when given
+            arctic_shift (ArcticShiftClient): Looks up the first activity of the user, the shared default client if not given
+            about (dict): About fields already looked up (see AccountHeader.values), they are used instead of fetched
 
     """
-    def __init__(self, reddit_user: Redditor):
+    def __init__(self, reddit_user: "Redditor", max_workers: int = 1, listing_history: ListingHistory = None,
+                 arctic_shift: ArcticShiftClient = None, about: dict = None):
         self.reddit_user = reddit_user
+        self.max_workers = max_workers
+        self.listing_history = listing_history
+        self.arctic_shift = arctic_shift if arctic_shift is not None else get_default_client()
+        self.about = dict(about) if about is not None else {}
+        self.listings = None
     def __get_name__(self):
         return self.reddit_user.name
     def __get_timestamp__(self):
         timestamp = self.reddit_user.created_utc
         return timestamp
+    def __get_listings__(self) -> HarvestedListings:
+        """Walks the user's listings once, every later call reuses the same harvest
+        """
+        if self.listings is None:
+            self.listings = ListingHarvester(self.reddit_user, previous=self.listing_history).harvest()
+        return self.listings
     def __get_timestamps_and_karma__(self):
-        all_timestamps_and_karma = []
-        try:
-            for item in self.reddit_user.new(limit=900):
-                all_timestamps_and_karma.append((item.created_utc, item.score))
-        except Exception as e:
-            print(f"Debug: Error fetching user.new(): {e}")
-            return []
-        return all_timestamps_and_karma
-    
+        return self.__get_listings__().timestamps_and_karma
 
     def __get_oldest_timestamp__(self):
-        base = "https://arctic-shift.photon-reddit.com/api/{}/search"
-        params = {"author": self.reddit_user.name, "sort": "asc", "limit": 1}
-
-        oldest_activity = float("inf") 
-
-        for kind in ("comments", "submissions"):
-            try:
-                r = requests.get(base.format(kind), params=params, timeout=5)
-                r.raise_for_status()
-                data = r.json().get("data") or []
-                if data:
-                    ts = data[0].get("created_utc")
-                    if ts is not None:
-                        oldest_activity = min(oldest_activity, float(ts)) 
-            except requests.RequestException:
-                continue
-        return -1 if oldest_activity == float("inf") else int(oldest_activity)
+        return self.arctic_shift.get_oldest_timestamp(self.reddit_user.name)
     def __get_comments__(self):
-        all_comments = []
-        for comment in self.reddit_user.comments.new(limit=500):
-            all_comments.append(comment.body)
-        return all_comments
+        return self.__get_listings__().comments
     def __get_user_post_and_comments_subreddits__(self):
-        subreddits = set()
-        for submission in self.reddit_user.submissions.new(limit=200):
-            subreddits.add(submission.subreddit.display_name.lower())
-        for comment in self.reddit_user.comments.new(limit=200):
-            subreddits.add(comment.subreddit.display_name.lower())
-        return list(subreddits)
+        return self.__get_listings__().subreddits
     def __get_comment_karma__(self):
         return self.reddit_user.comment_karma
     def __get_link_karma__(self):
@@ -100,20 +160,59 @@ class UserDataFetcher:
         return len(self.reddit_user.trophies())
     def __get_profile_picture__(self):
         return self.reddit_user.icon_img
-    def get_data(self) -> UserProfile:
-        results = UserProfile(
-            account_name = self.__get_name__(),
-            account_timestamp = self.__get_timestamp__(),
-            timestamps_and_karma = self.__get_timestamps_and_karma__(),
-            oldest_timestamp = self.__get_oldest_timestamp__(),
-            comments = self.__get_comments__(),
-            subreddits = self.__get_user_post_and_comments_subreddits__(),
-            comment_karma = self.__get_comment_karma__(),
-            link_karma = self.__get_link_karma__(),
-            verified_email = self.__check_verified_email__(),
-            trophy_count = self.__get_trophy_amount__(),
-            profile_picture = self.__get_profile_picture__()
-        )
-        return results
-
-    
\ No newline at end of file
+    def __get_about__(self):
+        """Reads every field that comes from the user's about page, which praw loads with a single request
+        """
+        return {
+            "account_name": self.__get_name__(),
+            "account_timestamp": self.__get_timestamp__(),
+            "comment_karma": self.__get_comment_karma__(),
+            "link_karma": self.__get_link_karma__(),
+            "verified_email": self.__check_verified_email__(),
+            "profile_picture": self.__get_profile_picture__()
+        }
+    def __get_listing_fields__(self):
+        return {
+            "timestamps_and_karma": self.__get_timestamps_and_karma__(),
+            "comments": self.__get_comments__(),
+            "subreddits": self.__get_user_post_and_comments_subreddits__()
+        }
+    def __get_trophy_fields__(self):
+        return {"trophy_count": self.__get_trophy_amount__()}
+    def __get_history_fields__(self):
+        return {"oldest_timestamp": self.__get_oldest_timestamp__()}
+    def __get_source_fields__(self, source: str) -> dict:
+        sources = {
+            "about": self.__get_about__,
+            "listings": self.__get_listing_fields__,
+            "trophies": self.__get_trophy_fields__,
+            "arctic_shift": self.__get_history_fields__
+        }
+        with get_instrumentation().stage(f"fetch.{source}"):
+            return sources[source]()
+    def get_fields(self, fields) -> dict:
+        """Fetches only the given UserProfile fields and returns them keyed by field name
+
+        Fields that come from the same request (see FIELD_SOURCES) are fetched together, and when max_workers
+        is above 1 the requests for different sources are sent concurrently. Fields given as about are not fetched.
+        """
+        sources = sorted({FIELD_SOURCES[field] for field in fields if field not in self.about})
+        if self.max_workers > 1 and len(sources) > 1:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(sources))) as executor:
+                fetched = list(executor.map(get_instrumentation().bind(self.__get_source_fields__), sources))
+        else:
+            fetched = [self.__get_source_fields__(source) for source in sources]
+        values = dict(self.about)
+        for source_values in fetched:
+            values.update(source_values)
+        return {field: values[field] for field in fields}
+    def get_data(self, fields=None) -> UserProfile:
+        """Fetches every field, or with fields only those now and any other on first read (see LazyUserProfile)
+        """
+        if fields is None:
+            return UserProfile(**self.get_fields(PROFILE_FIELDS))
+        sources = {FIELD_SOURCES[field] for field in fields if field not in self.about}
+        #the other fields of the same requests come for free, and so do the about fields already looked up
+        return LazyUserProfile(self.get_fields, self.get_fields([field for field in PROFILE_FIELDS
+                                                                 if field in self.about or FIELD_SOURCES[field] in sources]))
+